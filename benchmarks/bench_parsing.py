@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+DealNews parsing benchmark
+
+Feeds saved DealNews pages into DealnewsSpider.extract_deals, parse and
+parse_related_deal as HtmlResponse objects (no network, no database) and
+reports cards/sec, items/sec, peak RSS and per-field extraction time.
+
+Pages come from benchmarks/fixtures/ by default, or from any directory of
+*.html files such as the SAVE_HTML_SNAPSHOTS output:
+
+    python benchmarks/bench_parsing.py
+    python benchmarks/bench_parsing.py --pages exports/html_snapshots --iterations 50
+
+Every run is appended as one JSON line to benchmarks/results/parsing.jsonl
+so runs can be compared over time.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Add the project directory to the Python path
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import scrapy
+from lxml import etree
+from scrapy.http import HtmlResponse
+
+from dealnews_scraper.spiders.dealnews_spider import DealnewsSpider
+
+DEFAULT_PAGES_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'fixtures')
+DEFAULT_OUTPUT = os.path.join(PROJECT_DIR, 'benchmarks', 'results', 'parsing.jsonl')
+BASE_URL = 'https://www.dealnews.com/'
+
+
+def load_pages(pages_dir):
+    """Read every *.html file in pages_dir as (name, bytes)"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def make_response(name, body):
+    url = BASE_URL + name
+    return HtmlResponse(url=url, body=body, encoding='utf-8', request=scrapy.Request(url))
+
+
+def make_spider():
+    spider = DealnewsSpider()
+    # Treat every related deal as new so each iteration emits the same items
+    spider.is_new_deal = lambda deal_url, dealid='': True
+    return spider
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return ''
+
+
+def bench_callback(spider, pages, callback_name, iterations):
+    """Run one spider callback over every page `iterations` times"""
+    cards = items = requests = 0
+    elapsed = 0.0
+    for _ in range(iterations):
+        for name, body in pages:
+            # Build the response outside the timed region so only parsing counts
+            response = make_response(name, body)
+            cards += len(spider.card_extractor.select_cards(response))
+            callback = getattr(spider, callback_name)
+            start = time.perf_counter()
+            result = callback(response)
+            if callback_name == 'extract_deals':
+                items += len(result)
+            else:
+                for output in result:
+                    if isinstance(output, scrapy.Request):
+                        requests += 1
+                    else:
+                        items += 1
+            elapsed += time.perf_counter() - start
+    return {
+        'seconds': round(elapsed, 4),
+        'cards': cards,
+        'items': items,
+        'requests': requests,
+        'cards_per_sec': round(cards / elapsed, 1) if elapsed else None,
+        'items_per_sec': round(items / elapsed, 1) if elapsed else None,
+    }
+
+
+def bench_fields(spider, pages, iterations):
+    """Time each compiled selector of the card extractor in isolation.
+
+    Returns microseconds per card for every selector plus the single
+    text-node pass that fills price/promo/store/published/popularity.
+    """
+    extractor = spider.card_extractor
+    roots = []
+    for name, body in pages:
+        roots.extend(extractor.select_cards(make_response(name, body)))
+    if not roots:
+        return {}
+
+    selectors = {
+        attr: value for attr, value in vars(extractor).items()
+        # Page-level selectors run once per response, not per card
+        if isinstance(value, etree.XPath) and attr not in ('cards', 'json_scripts')
+    }
+    timings = {}
+    for attr, xpath in sorted(selectors.items()):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for root in roots:
+                xpath(root)
+        timings[attr] = (time.perf_counter() - start) / (iterations * len(roots))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for root in roots:
+            extractor.classify_text(root)
+    timings['classify_text'] = (time.perf_counter() - start) / (iterations * len(roots))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for root in roots:
+            extractor.extract(root, BASE_URL)
+    timings['extract_total'] = (time.perf_counter() - start) / (iterations * len(roots))
+
+    return {attr: round(seconds * 1e6, 2) for attr, seconds in timings.items()}
+
+
+def previous_result(output_path):
+    """Return the last recorded run from the results file, if any"""
+    if not os.path.exists(output_path):
+        return None
+    last = None
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                last = line
+    return json.loads(last) if last else None
+
+
+def print_report(result, previous):
+    print(f"📊 Parsing benchmark ({result['pages']} pages x {result['iterations']} iterations)")
+    for name, stats in result['callbacks'].items():
+        line = (f"   {name:<20} {stats['cards_per_sec'] or 0:>10.1f} cards/s"
+                f" {stats['items_per_sec'] or 0:>10.1f} items/s")
+        if previous and name in previous.get('callbacks', {}):
+            before = previous['callbacks'][name].get('cards_per_sec')
+            if before and stats['cards_per_sec']:
+                line += f"  ({(stats['cards_per_sec'] / before - 1) * 100:+.1f}% vs {previous.get('git_revision') or 'last run'})"
+        print(line)
+    print("⏱️  Per-field extraction time (µs/card):")
+    for field, micros in sorted(result['fields_us_per_card'].items(), key=lambda kv: -kv[1]):
+        print(f"   {field:<20} {micros:>8.2f}")
+    print(f"💾 Peak RSS: {result['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DealNews parsing over saved HTML pages")
+    parser.add_argument('--pages', default=DEFAULT_PAGES_DIR,
+                        help="Directory of *.html pages (fixtures or SAVE_HTML_SNAPSHOTS output)")
+    parser.add_argument('--iterations', type=int, default=20, help="Passes over every page")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON lines file to append results to")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        print(f"❌ No *.html pages found in {args.pages}")
+        return 1
+
+    spider = make_spider()
+    callbacks = {}
+    for callback_name in ('extract_deals', 'parse', 'parse_related_deal'):
+        callbacks[callback_name] = bench_callback(spider, pages, callback_name, args.iterations)
+
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'scrapy': scrapy.__version__,
+        'pages_dir': os.path.relpath(os.path.abspath(args.pages), PROJECT_DIR),
+        'pages': len(pages),
+        'page_bytes': sum(len(body) for _, body in pages),
+        'iterations': args.iterations,
+        'callbacks': callbacks,
+        'fields_us_per_card': bench_fields(spider, pages, args.iterations),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    previous = previous_result(args.output)
+    print_report(result, previous)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+    print(f"📁 Results appended to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
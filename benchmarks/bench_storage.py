@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+DealNews storage benchmark
+
+Parses the saved pages once, then feeds the resulting items through
+StoragePipeline for each storage backend and reports items/sec, rows/sec and
+flush latency. Each backend gets two passes over the same items: `cold`
+inserts everything, `warm` is a re-crawl where every deal is unchanged and
+every child row already stored.
+
+    python benchmarks/bench_storage.py                          # SQLite only
+    python benchmarks/bench_storage.py --backends sqlite,mysql --copies 20
+
+SQLite writes to a fresh file in a temporary directory. MySQL writes to the
+configured MYSQL_DATABASE, so point it at a scratch database: the cold pass is
+only cold on an empty one. Writes run on the calling thread
+(MYSQL_ASYNC_WRITES=false) so the numbers measure the backend, not the
+scheduling.
+
+Every run is appended as one JSON line to benchmarks/results/storage.jsonl.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# bench_parsing puts the project directory on the path
+from bench_parsing import (DEFAULT_PAGES_DIR, PROJECT_DIR, git_revision, load_pages,
+                           make_response, make_spider, previous_result)
+
+import scrapy
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from dealnews_scraper.items import DealnewsItem, DealPageItem
+
+DEFAULT_OUTPUT = os.path.join(PROJECT_DIR, 'benchmarks', 'results', 'storage.jsonl')
+
+
+def build_items(pages, copies):
+    """Items the spider emits for every page, repeated as `copies` distinct sets of deals"""
+    spider = make_spider()
+    items = []
+    for name, body in pages:
+        items.extend(output for output in spider.parse(make_response(name, body))
+                     if isinstance(output, scrapy.Item))
+    batches = []
+    for copy in range(copies):
+        for item in items:
+            if copy and isinstance(item, DealPageItem):
+                continue
+            item = item.copy()
+            if copy:
+                # A distinct deal (and distinct child rows) per copy
+                if isinstance(item, DealnewsItem):
+                    item['url'] = f"{item['url']}#copy{copy}"
+                item['dealid'] = f"{item.get('dealid', '')}-{copy}"
+            batches.append(item)
+    return batches
+
+
+def make_stats_spider():
+    stats = MemoryStatsCollector(SimpleNamespace(settings=Settings()))
+    return SimpleNamespace(logger=logging.getLogger('bench_storage'), crawler=SimpleNamespace(stats=stats))
+
+
+def run_pass(items):
+    """One StoragePipeline lifetime over `items`; returns timings and the backend's stats"""
+    from dealnews_scraper.pipelines import StoragePipeline
+
+    spider = make_stats_spider()
+    pipeline = StoragePipeline()
+    start = time.perf_counter()
+    pipeline.open_spider(spider)
+    if not pipeline.storage_enabled:
+        raise RuntimeError(f"{pipeline.storage.describe()} is not reachable")
+    opened = time.perf_counter()
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    elapsed = time.perf_counter() - opened
+    stats = spider.crawler.stats.get_stats()
+    prefix = pipeline.storage.name
+    rows = stats.get(f'{prefix}/batch/rows', 0)
+    return {
+        'open_seconds': round(opened - start, 4),
+        'seconds': round(elapsed, 4),
+        'items': len(items),
+        'rows_written': rows,
+        'items_per_sec': round(len(items) / elapsed, 1) if elapsed else None,
+        'flushes': stats.get(f'{prefix}/batch/flushes', 0),
+        'flush_ms_avg': stats.get(f'{prefix}/batch/flush_ms_avg'),
+        'flush_ms_max': stats.get(f'{prefix}/batch/flush_ms_max'),
+        'rows_per_sec': stats.get(f'{prefix}/batch/rows_per_sec'),
+        'deals': {key: stats.get(f'{prefix}/deals/{key}', 0) for key in ('new', 'changed', 'unchanged')},
+        'file_mb': stats.get('sqlite/file_mb'),
+    }
+
+
+def bench_backend(backend, items, batch_size):
+    os.environ['STORAGE_BACKEND'] = backend
+    os.environ['MYSQL_ASYNC_WRITES'] = 'false'
+    os.environ['MYSQL_BATCH_SIZE'] = str(batch_size)
+    scratch = None
+    if backend == 'sqlite':
+        scratch = tempfile.mkdtemp(prefix='dealnews-bench-')
+        os.environ['SQLITE_PATH'] = os.path.join(scratch, 'bench.sqlite')
+    try:
+        return {
+            'cold': run_pass(items),
+            'warm': run_pass(items),
+        }
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def print_report(result, previous):
+    print(f"📊 Storage benchmark ({result['items']} items, batch size {result['batch_size']})")
+    for backend, passes in result['backends'].items():
+        for name, stats in passes.items():
+            line = (f"   {backend:<7} {name:<5} {stats['items_per_sec'] or 0:>10.1f} items/s"
+                    f" {stats['rows_per_sec'] or 0:>11.1f} rows/s (in flushes)"
+                    f"  flush avg {stats['flush_ms_avg'] or 0:.2f} ms, max {stats['flush_ms_max'] or 0:.2f} ms")
+            before = ((previous or {}).get('backends', {}).get(backend, {}).get(name) or {}).get('items_per_sec')
+            if before and stats['items_per_sec']:
+                line += f"  ({(stats['items_per_sec'] / before - 1) * 100:+.1f}% vs {previous.get('git_revision') or 'last run'})"
+            print(line)
+        cold = passes['cold']['deals']
+        print(f"           deals cold {cold['new']} new; warm {passes['warm']['deals']['unchanged']} unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare storage backends on items parsed from saved pages")
+    parser.add_argument('--pages', default=DEFAULT_PAGES_DIR,
+                        help="Directory of *.html pages (fixtures or SAVE_HTML_SNAPSHOTS output)")
+    parser.add_argument('--backends', default='sqlite', help="Comma-separated: sqlite, mysql")
+    parser.add_argument('--copies', type=int, default=10, help="Distinct copies of the parsed deals to write")
+    parser.add_argument('--batch-size', type=int, default=200, help="MYSQL_BATCH_SIZE for the pipeline")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON lines file to append results to")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        print(f"❌ No *.html pages found in {args.pages}")
+        return 1
+    items = build_items(pages, args.copies)
+
+    backends = {}
+    for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+        try:
+            backends[backend] = bench_backend(backend, items, args.batch_size)
+        except Exception as e:
+            print(f"❌ {backend}: {e}")
+    if not backends:
+        return 1
+
+    result = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'pages_dir': os.path.relpath(os.path.abspath(args.pages), PROJECT_DIR),
+        'items': len(items),
+        'copies': args.copies,
+        'batch_size': args.batch_size,
+        'backends': backends,
+    }
+
+    previous = previous_result(args.output)
+    print_report(result, previous)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+    print(f"📁 Results appended to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
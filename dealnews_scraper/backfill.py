@@ -0,0 +1,174 @@
+"""
+One-off backfills for columns added to the deals table after rows were stored.
+
+    python -m dealnews_scraper.backfill prices [--batch-size 1000]
+    python -m dealnews_scraper.backfill published_at [--batch-size 1000]
+    python -m dealnews_scraper.backfill dimensions [--batch-size 1000]
+
+Rows are walked in primary-key order in batches (keyset pagination), each
+batch is updated with executemany and committed on its own, so the job can
+be interrupted and re-run; rows that are already filled are skipped.
+Like the other maintenance CLIs (compaction, history, migrations, bulk) it
+works on the MySQL database only.
+"""
+import sys
+import time
+import argparse
+
+from dealnews_scraper.db import get_manager
+from dealnews_scraper.prices import parse_prices
+from dealnews_scraper.storage import require_mysql
+from dealnews_scraper.timestamps import resolve_published
+
+
+def connect():
+    """A pooled MySQL connection for the maintenance CLIs; close() hands it back"""
+    require_mysql()
+    return get_manager().acquire()
+
+
+def run_batches(conn, select_sql, update_sql, convert, batch_size):
+    """Generic keyset-paginated backfill; returns (rows scanned, rows updated)"""
+    cursor = conn.cursor()
+    last_id = 0
+    scanned = updated = 0
+    while True:
+        cursor.execute(select_sql, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+        params = [values for values in (convert(row) for row in rows) if values is not None]
+        if params:
+            cursor.executemany(update_sql, params)
+            updated += len(params)
+        conn.commit()
+        print(f"   ... up to id {last_id}: {scanned} scanned, {updated} updated")
+    cursor.close()
+    return scanned, updated
+
+
+def backfill_prices(conn, batch_size=1000):
+    """Fill price_cents/original_price_cents/discount_pct/currency from the text columns"""
+    def convert(row):
+        deal_id, price, promo = row
+        prices = parse_prices(price, promo)
+        if prices['price_cents'] is None and prices['discount_pct'] is None:
+            return None
+        return (prices['price_cents'], prices['original_price_cents'],
+                prices['discount_pct'], prices['currency'], deal_id)
+
+    return run_batches(
+        conn,
+        """
+            SELECT id, price, promo FROM deals
+            WHERE id > %s AND price_cents IS NULL AND discount_pct IS NULL
+            ORDER BY id LIMIT %s
+        """,
+        """
+            UPDATE deals SET price_cents = %s, original_price_cents = %s,
+                discount_pct = %s, currency = %s
+            WHERE id = %s
+        """,
+        convert,
+        batch_size,
+    )
+
+
+def backfill_published_at(conn, batch_size=1000):
+    """Resolve `published` against the row's created_at into published_at (UTC).
+
+    created_at is when the row was inserted, shortly after the page was
+    fetched, so backfilled values carry that extra lag on top of the usual
+    one-unit precision of relative ages.
+    """
+    cursor = conn.cursor()
+    # TIMESTAMP columns are returned in the session time zone
+    cursor.execute("SET time_zone = '+00:00'")
+    cursor.close()
+
+    def convert(row):
+        deal_id, published, created_at = row
+        published_at = resolve_published(published, created_at) if created_at else None
+        if published_at is None:
+            return None
+        return (published_at, deal_id)
+
+    return run_batches(
+        conn,
+        """
+            SELECT id, published, created_at FROM deals
+            WHERE id > %s AND published_at IS NULL AND published <> ''
+            ORDER BY id LIMIT %s
+        """,
+        "UPDATE deals SET published_at = %s WHERE id = %s",
+        convert,
+        batch_size,
+    )
+
+
+def backfill_dimensions(conn, batch_size=1000):
+    """Fill stores/categories from existing names and set the surrogate keys.
+
+    Set-based: distinct names are inserted once, then each id range of the
+    fact tables is joined against the dimension table in one UPDATE.
+    """
+    cursor = conn.cursor()
+    for table, source_sql in (
+        ('stores', "SELECT DISTINCT store FROM deals WHERE store <> ''"),
+        ('categories', "SELECT DISTINCT category FROM deals WHERE category <> '' "
+                       "UNION SELECT DISTINCT category_name FROM deal_categories WHERE category_name <> ''"),
+    ):
+        cursor.execute(f"INSERT IGNORE INTO {table} (name) {source_sql}")
+        conn.commit()
+        print(f"   ... {table}: {cursor.rowcount} new names")
+
+    scanned = updated = 0
+    for fact, key, name_column, table in (
+        ('deals', 'store_id', 'store', 'stores'),
+        ('deals', 'category_id', 'category', 'categories'),
+        ('deal_categories', 'category_id', 'category_name', 'categories'),
+    ):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {fact}")
+        max_id = cursor.fetchone()[0]
+        for low in range(0, max_id, batch_size):
+            cursor.execute(f"""
+                UPDATE {fact} f JOIN {table} d ON d.name = f.{name_column}
+                SET f.{key} = d.id
+                WHERE f.id > %s AND f.id <= %s AND f.{key} IS NULL
+            """, (low, low + batch_size))
+            updated += cursor.rowcount
+            conn.commit()
+        scanned += max_id
+        print(f"   ... {fact}.{key}: done up to id {max_id}, {updated} updated so far")
+    cursor.close()
+    return scanned, updated
+
+
+BACKFILLS = {
+    'prices': backfill_prices,
+    'published_at': backfill_published_at,
+    'dimensions': backfill_dimensions,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill derived columns of the deals table")
+    parser.add_argument('job', choices=sorted(BACKFILLS), help="Which columns to backfill")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Rows per batch/commit")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        start = time.time()
+        print(f"🔄 Backfilling {args.job} in batches of {args.batch_size}...")
+        scanned, updated = BACKFILLS[args.job](conn, batch_size=args.batch_size)
+        print(f"✅ {args.job}: {updated}/{scanned} rows updated in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
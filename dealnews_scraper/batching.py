@@ -0,0 +1,115 @@
+"""
+Write-behind buffering for StoragePipeline.
+
+Rows are queued per table and written together, one executemany (which
+mysql.connector turns into a multi-row INSERT) per table inside a single
+transaction, once MYSQL_BATCH_SIZE rows are waiting in any table or the
+oldest waiting row is MYSQL_FLUSH_INTERVAL_MS old, and on close_spider. The pipeline hands detached batches to writer threads
+(see StoragePipeline.flush), so `write` must not touch shared state.
+"""
+import time
+import logging
+
+
+class TableBuffer:
+    """Rows waiting to be written to one table"""
+
+    def __init__(self, table, columns, verb='INSERT', suffix='', placeholder='%s'):
+        self.table = table
+        self.columns = columns
+        self.rows = []
+        placeholders = ', '.join([placeholder] * len(columns))
+        self.sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders}){suffix}"
+
+    def __len__(self):
+        return len(self.rows)
+
+    def take(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class WriteBehind:
+    """Per-table buffers flushed together in one transaction"""
+
+    def __init__(self, buffers, batch_size=200, flush_interval=1.0, stats=None, prefix='mysql'):
+        # Flush order follows `buffers` (parents before children)
+        self.buffers = {buffer.table: buffer for buffer in buffers}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.prefix = prefix
+        self.oldest = None
+
+    def add(self, table, row):
+        """Queue a row; True when a flush is due"""
+        self.buffers[table].rows.append(row)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        return self.due()
+
+    def pending(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def due(self):
+        if self.oldest is None:
+            return False
+        if any(len(buffer) >= self.batch_size for buffer in self.buffers.values()):
+            return True
+        return time.monotonic() - self.oldest >= self.flush_interval
+
+    def take(self):
+        """Detach every waiting row: {table: rows}"""
+        self.oldest = None
+        return {table: buffer.take() for table, buffer in self.buffers.items() if len(buffer)}
+
+    def write(self, conn, batch, after=None):
+        """Write a detached batch in one transaction; returns ({table: affected rows}, seconds).
+
+        `after(cursor)` runs once the rows are written, before the commit.
+        Safe to call from a writer thread: stats are left to `record`, which
+        the pipeline calls back on the reactor thread.
+        """
+        start = time.monotonic()
+        # Pipeline connections run in autocommit mode; group the batch explicitly
+        # (a caller may already have opened the transaction)
+        if not conn.in_transaction:
+            conn.start_transaction()
+        cursor = conn.cursor()
+        affected = {}
+        try:
+            for table, rows in batch.items():
+                cursor.executemany(self.buffers[table].sql, rows)
+                affected[table] = cursor.rowcount
+            if after is not None:
+                after(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return affected, time.monotonic() - start
+
+    def record(self, batch, seconds):
+        rows = sum(len(table_rows) for table_rows in batch.values())
+        logging.info(f"Flushed {rows} rows to {', '.join(batch)} in {seconds * 1000:.1f} ms")
+        if self.stats is None:
+            return
+        stats = self.stats
+        prefix = self.prefix
+        stats.inc_value(f'{prefix}/batch/flushes')
+        stats.inc_value(f'{prefix}/batch/rows', rows)
+        stats.max_value(f'{prefix}/batch/size_max', rows)
+        stats.set_value(f'{prefix}/batch/flush_ms_total',
+                        round(stats.get_value(f'{prefix}/batch/flush_ms_total', 0) + seconds * 1000, 3))
+        stats.max_value(f'{prefix}/batch/flush_ms_max', round(seconds * 1000, 3))
+        for table, table_rows in batch.items():
+            stats.inc_value(f'{prefix}/rows/{table}', len(table_rows))
+        flushes = stats.get_value(f'{prefix}/batch/flushes')
+        total_ms = stats.get_value(f'{prefix}/batch/flush_ms_total')
+        stats.set_value(f'{prefix}/batch/size_avg', round(stats.get_value(f'{prefix}/batch/rows') / flushes, 1))
+        stats.set_value(f'{prefix}/batch/flush_ms_avg', round(total_ms / flushes, 3))
+        if total_ms:
+            stats.set_value(f'{prefix}/batch/rows_per_sec',
+                            round(stats.get_value(f'{prefix}/batch/rows') / (total_ms / 1000), 1))
@@ -0,0 +1,289 @@
+"""
+Bulk-ingest mode for replays and historical imports.
+
+BulkLoadPipeline takes the place of StoragePipeline (`python run.py --bulk`,
+or BULK_LOAD=true). Items become the same rows the MySQL backend would write,
+but they are streamed into one TSV file per table instead of the database.
+When the spider closes, each file is loaded with LOAD DATA LOCAL INFILE into
+a temporary staging table and merged with set-based SQL in one transaction:
+- store/category names are added to the dimension tables;
+- deals are upserted with the same content-hash guard as the pipeline;
+- pages, images, categories and related deals are appended.
+
+Load and merge times and rows/sec are logged and published as bulk/* stats.
+
+Historical JSON exports go through the same path:
+
+    python -m dealnews_scraper.bulk import exports/deals.json [more.json ...]
+    python -m dealnews_scraper.bulk load /tmp/dealnews-bulk-xxxx   # retry a failed load
+
+The server must allow it (`SET GLOBAL local_infile = 1`). Files are only
+readable by the client from the spool directory (BULK_LOAD_DIR, default the
+system temp dir). No price history points are written in bulk mode: the
+observation time of replayed data is not known.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+import mysql.connector
+
+from dealnews_scraper import migrations
+from dealnews_scraper.db import ConnectionManager
+from dealnews_scraper.items import DealnewsItem, DealImageItem, DealCategoryItem, RelatedDealItem, DealPageItem
+from dealnews_scraper.pipelines import StoragePipeline
+from dealnews_scraper.storage import DEAL_UPSERT, TABLE_COLUMNS, MySQLStorage, require_mysql
+
+# Staged columns loaded as hex (see tsv_field)
+HEX_COLUMNS = {'pages': ('body_zlib',)}
+
+
+def tsv_field(value):
+    """One field in LOAD DATA's default format (tab-separated, backslash escapes, \\N for NULL)"""
+    # Unresolved (name, source_id) key placeholders are filled in by the merge
+    if value is None or isinstance(value, tuple):
+        return '\\N'
+    if isinstance(value, bytes):
+        return value.hex()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+            .replace('\r', '\\r').replace('\0', '\\0'))
+
+
+class TsvSpool:
+    """Stands in for StoragePipeline's write-behind buffers: rows go to one TSV file per table"""
+
+    def __init__(self, directory, resume=False):
+        self.directory = directory
+        self.files = {}
+        self.counts = dict.fromkeys(TABLE_COLUMNS, 0)
+        if resume:
+            # Files left behind by a failed load
+            for table in TABLE_COLUMNS:
+                if os.path.exists(self.path(table)):
+                    with open(self.path(table), encoding='utf-8') as f:
+                        self.counts[table] = sum(1 for _ in f)
+            return
+        for table in TABLE_COLUMNS:
+            self.files[table] = open(self.path(table), 'w', encoding='utf-8', newline='')
+
+    def path(self, table):
+        return os.path.join(self.directory, f'{table}.tsv')
+
+    def add(self, table, row):
+        self.files[table].write('\t'.join(tsv_field(value) for value in row) + '\n')
+        self.counts[table] += 1
+        return False
+
+    def due(self):
+        return False
+
+    def close(self):
+        for handle in self.files.values():
+            handle.close()
+
+
+def load_spool(spool):
+    """LOAD DATA every spooled table into staging and merge it; returns throughput figures"""
+    db = ConnectionManager(pool_size=1, allow_local_infile_in_path=spool.directory)
+    conn = db.acquire()
+    try:
+        migrations.migrate(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT @@GLOBAL.local_infile")
+        if not cursor.fetchone()[0]:
+            raise mysql.connector.errors.NotSupportedError(
+                "LOAD DATA LOCAL INFILE is disabled on the server; run SET GLOBAL local_infile = 1")
+
+        start = time.monotonic()
+        for table, columns in TABLE_COLUMNS.items():
+            # Same keys as the target, so REPLACE keeps the last row per URL hash/page hash
+            cursor.execute(f"CREATE TEMPORARY TABLE stage_{table} LIKE {table}")
+            if not spool.counts[table]:
+                continue
+            hex_columns = HEX_COLUMNS.get(table, ())
+            targets = ', '.join(f'@{column}' if column in hex_columns else column for column in columns)
+            assignments = ', '.join(f'{column} = UNHEX(@{column})' for column in hex_columns)
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE stage_{table} CHARACTER SET utf8mb4 ({targets})"
+                + (f" SET {assignments}" if assignments else ""),
+                (spool.path(table),)
+            )
+        load_seconds = time.monotonic() - start
+
+        start = time.monotonic()
+        counts = merge_staged(conn, cursor)
+        merge_seconds = time.monotonic() - start
+
+        for table in TABLE_COLUMNS:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS stage_{table}")
+        cursor.close()
+    finally:
+        conn.close()
+
+    rows = sum(spool.counts.values())
+    counts.update({
+        'rows': rows,
+        'load_seconds': round(load_seconds, 3),
+        'merge_seconds': round(merge_seconds, 3),
+        'rows_per_sec': round(rows / (load_seconds + merge_seconds), 1) if rows else 0.0,
+    })
+    for table, table_rows in spool.counts.items():
+        counts[f'{table}/rows'] = table_rows
+    return counts
+
+
+def merge_staged(conn, cursor):
+    """Set-based merge of the staging tables into the real ones, in one transaction"""
+    deal_columns = ', '.join(TABLE_COLUMNS['deals'])
+    conn.start_transaction()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*), SUM(d.id IS NULL),
+                   SUM(d.id IS NOT NULL AND s.content_hash IS NOT NULL AND d.content_hash <=> s.content_hash)
+            FROM stage_deals s LEFT JOIN deals d ON d.url_hash = s.url_hash
+        """)
+        staged, new, unchanged = (int(value or 0) for value in cursor.fetchone())
+
+        # Dimension names first, then surrogate keys for the staged rows
+        cursor.execute("INSERT IGNORE INTO stores (name) SELECT DISTINCT store FROM stage_deals WHERE store <> ''")
+        cursor.execute("INSERT IGNORE INTO categories (name) SELECT DISTINCT category FROM stage_deals WHERE category <> ''")
+        cursor.execute("INSERT IGNORE INTO categories (name) "
+                       "SELECT DISTINCT category_name FROM stage_deal_categories WHERE category_name <> ''")
+        cursor.execute("""
+            UPDATE stage_deals s
+            LEFT JOIN stores st ON st.name = s.store
+            LEFT JOIN categories c ON c.name = s.category
+            SET s.store_id = st.id, s.category_id = c.id
+        """)
+        cursor.execute("""
+            UPDATE stage_deal_categories s JOIN categories c ON c.name = s.category_name
+            SET s.category_id = c.id
+        """)
+
+        cursor.execute(f"INSERT IGNORE INTO deals ({deal_columns}) "
+                       f"SELECT {deal_columns} FROM stage_deals{DEAL_UPSERT}")
+        # Pages and child rows already stored are skipped on their unique keys
+        growth = {'deals/growth': new}
+        for table in ('pages', 'deal_images', 'deal_categories', 'related_deals'):
+            columns = ', '.join(TABLE_COLUMNS[table])
+            cursor.execute(f"INSERT IGNORE INTO {table} ({columns}) SELECT {columns} FROM stage_{table}")
+            growth[f'{table}/growth'] = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {'deals/new': new, 'deals/changed': staged - new - unchanged, 'deals/unchanged': unchanged, **growth}
+
+
+class BulkLoadPipeline(StoragePipeline):
+    """StoragePipeline that spools rows to TSV and loads them into MySQL when the spider closes"""
+
+    def open_spider(self, spider):
+        # Only for its name and error type; load_spool opens its own connection
+        self.storage = MySQLStorage()
+        if os.getenv('DISABLE_MYSQL', 'false').lower() in ('1', 'true', 'yes'):
+            logging.info("Bulk load pipeline disabled by DISABLE_MYSQL flag")
+            self.storage_enabled = False
+            return
+        self.storage_enabled = True
+        self.save_html_snapshots = os.getenv('SAVE_HTML_SNAPSHOTS', 'false').lower() in ('1', 'true', 'yes')
+        self.snapshots_dir = os.getenv('SNAPSHOTS_DIR', 'exports/html_snapshots')
+        if self.save_html_snapshots and not os.path.isdir(self.snapshots_dir):
+            os.makedirs(self.snapshots_dir, exist_ok=True)
+        self.stored_pages = set()
+        # Nothing is ever in flight, so process_item never holds items back
+        self.inflight = set()
+        self.max_pending = 1
+        self.writes = TsvSpool(tempfile.mkdtemp(prefix='dealnews-bulk-', dir=os.getenv('BULK_LOAD_DIR') or None))
+        logging.info(f"Bulk load mode: spooling rows to {self.writes.directory}")
+
+    def close_spider(self, spider):
+        if not getattr(self, 'storage_enabled', False):
+            return
+        self.writes.close()
+        try:
+            self.result = load_spool(self.writes)
+        except mysql.connector.Error as err:
+            # Keep the files so the load can be retried by hand
+            logging.error(f"Bulk load failed, TSV files kept in {self.writes.directory}: {err}")
+            self.result = None
+            if spider is not None:
+                spider.crawler.stats.set_value('bulk/load_failed', self.writes.directory)
+            return
+        shutil.rmtree(self.writes.directory, ignore_errors=True)
+        logging.info(f"Bulk load: {self.result}")
+        if spider is not None:
+            for key, value in self.result.items():
+                spider.crawler.stats.set_value(f'bulk/{key}', value)
+
+
+def item_from_record(record):
+    """Rebuild an item from one record of a JSON feed export"""
+    if 'imageurl' in record:
+        item_class = DealImageItem
+    elif 'category_name' in record:
+        item_class = DealCategoryItem
+    elif 'relatedurl' in record:
+        item_class = RelatedDealItem
+    elif 'body' in record:
+        item_class = DealPageItem
+    else:
+        item_class = DealnewsItem
+    return item_class({key: value for key, value in record.items() if key in item_class.fields})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load JSON feed exports into MySQL")
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="Load exported items (e.g. exports/deals.json)")
+    importer.add_argument('paths', nargs='+')
+    retry = commands.add_parser('load', help="Load TSV files kept by a failed bulk load")
+    retry.add_argument('directory')
+    args = parser.parse_args(argv)
+    require_mysql()
+
+    if args.command == 'load':
+        spool = TsvSpool(args.directory, resume=True)
+        print(f"🔄 Loading {sum(spool.counts.values())} spooled rows from {args.directory}...")
+        result = load_spool(spool)
+        shutil.rmtree(args.directory, ignore_errors=True)
+        print_result(result)
+        return 0
+
+    pipeline = BulkLoadPipeline()
+    pipeline.open_spider(None)
+    if not pipeline.storage_enabled:
+        print("❌ MySQL is disabled (DISABLE_MYSQL)")
+        return 1
+    records = 0
+    for path in args.paths:
+        with open(path, encoding='utf-8') as f:
+            for record in json.load(f):
+                pipeline.process_item(item_from_record(record), None)
+                records += 1
+        print(f"📄 {path}: {records} records spooled so far")
+
+    print(f"🔄 Loading {records} records...")
+    pipeline.close_spider(None)
+    if pipeline.result is None:
+        print(f"❌ Bulk load failed; TSV files kept in {pipeline.writes.directory}")
+        return 1
+    print_result(pipeline.result)
+    return 0
+
+
+def print_result(result):
+    print(f"✅ {result['rows']} rows loaded in {result['load_seconds']}s + merged in {result['merge_seconds']}s "
+          f"({result['rows_per_sec']} rows/sec)")
+    print(f"   deals: {result['deals/new']} new, {result['deals/changed']} changed, {result['deals/unchanged']} unchanged")
+    print("📈 Table growth: " + ", ".join(f"{key.split('/')[0]} +{value}"
+                                        for key, value in result.items() if key.endswith('/growth')))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
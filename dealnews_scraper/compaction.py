@@ -0,0 +1,201 @@
+"""
+Natural unique keys for the per-deal child tables.
+
+deal_images, deal_categories and related_deals are keyed on the deal plus an
+MD5 of the URL they hold (a stored generated column, so inserts do not change):
+
+    deal_images      UNIQUE (dealid, imageurl_hash)
+    deal_categories  UNIQUE (dealid, category_url_hash)
+    related_deals    UNIQUE (dealid, relatedurl_hash)
+
+Rows are written with INSERT IGNORE, so a deal seen again on the next run
+adds nothing. Tables created before these keys existed hold duplicates that
+must go before the key can be added. Schema migration 2 does this (see
+migrations.py) when the pipeline next starts; on large tables, run it ahead
+of time:
+
+    python -m dealnews_scraper.compaction [--batch-size 10000]
+    python -m dealnews_scraper.compaction --report
+
+The earliest row (lowest id) of each duplicate group is kept. Deletes are
+committed per id range, so the job can be interrupted and re-run.
+
+compact_deals() does the same for repeated deal URLs before migration 3 adds
+UNIQUE (url_hash); there the latest row (highest id) is kept.
+"""
+import sys
+import time
+import logging
+import argparse
+
+# {table: (hash column, hashed column)}
+CHILD_KEYS = {
+    'deal_images': ('imageurl_hash', 'imageurl'),
+    'deal_categories': ('category_url_hash', 'category_url'),
+    'related_deals': ('relatedurl_hash', 'relatedurl'),
+}
+
+REPORT_TABLES = ('deals', 'pages', 'deal_images', 'deal_categories', 'related_deals', 'deal_price_history')
+
+
+def hash_column(table):
+    """Column definition of a table's URL hash (for CREATE TABLE / ADD COLUMN)"""
+    column, source = CHILD_KEYS[table]
+    return f"{column} BINARY(16) AS (UNHEX(MD5(IFNULL({source}, '')))) STORED"
+
+
+def unique_key(table):
+    """Name and definition of a table's natural unique key"""
+    name = f'uq_dealid_{CHILD_KEYS[table][0]}'
+    return name, f"UNIQUE KEY {name} (dealid, {CHILD_KEYS[table][0]})"
+
+
+def has_column(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def has_index(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def compact(conn, table, batch_size=10000):
+    """Delete all but the earliest row of each (dealid, URL hash) group; returns rows deleted"""
+    column = CHILD_KEYS[table][0]
+    cursor = conn.cursor()
+    # Lowest id per duplicated group, computed once (loose index scan on idx_dedupe)
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS dedupe_keep")
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE dedupe_keep (INDEX (dealid, url_hash))
+        SELECT dealid, {column} AS url_hash, MIN(id) AS keep_id
+        FROM {table} GROUP BY dealid, {column} HAVING COUNT(*) > 1
+    """)
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    max_id = cursor.fetchone()[0]
+    deleted = 0
+    for low in range(0, max_id, batch_size):
+        cursor.execute(f"""
+            DELETE t FROM {table} t
+            JOIN dedupe_keep k ON k.dealid = t.dealid AND k.url_hash = t.{column}
+            WHERE t.id > %s AND t.id <= %s AND t.id > k.keep_id
+        """, (low, low + batch_size))
+        deleted += cursor.rowcount
+        conn.commit()
+    cursor.execute("DROP TEMPORARY TABLE dedupe_keep")
+    cursor.close()
+    return deleted
+
+
+def compact_deals(conn, batch_size=10000):
+    """Delete all but the latest row (highest id) of each url_hash group; returns rows deleted.
+
+    Tables from the old setup_laradock_db.py had no unique URL key and can hold
+    repeated URLs. Price history points of a deleted row move to the kept one
+    (a point at the same observed_at is dropped). Needs an index on url_hash.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS dedupe_keep")
+    cursor.execute("""
+        CREATE TEMPORARY TABLE dedupe_keep (INDEX (url_hash))
+        SELECT url_hash, MAX(id) AS keep_id
+        FROM deals WHERE url_hash IS NOT NULL GROUP BY url_hash HAVING COUNT(*) > 1
+    """)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM deals")
+    max_id = cursor.fetchone()[0]
+    deleted = 0
+    for low in range(0, max_id, batch_size):
+        cursor.execute("""
+            UPDATE IGNORE deal_price_history h
+            JOIN deals d ON d.id = h.deal_id
+            JOIN dedupe_keep k ON k.url_hash = d.url_hash
+            SET h.deal_id = k.keep_id
+            WHERE d.id > %s AND d.id <= %s AND d.id < k.keep_id
+        """, (low, low + batch_size))
+        cursor.execute("""
+            DELETE h FROM deal_price_history h
+            JOIN deals d ON d.id = h.deal_id
+            JOIN dedupe_keep k ON k.url_hash = d.url_hash
+            WHERE d.id > %s AND d.id <= %s AND d.id < k.keep_id
+        """, (low, low + batch_size))
+        cursor.execute("""
+            DELETE d FROM deals d
+            JOIN dedupe_keep k ON k.url_hash = d.url_hash
+            WHERE d.id > %s AND d.id <= %s AND d.id < k.keep_id
+        """, (low, low + batch_size))
+        deleted += cursor.rowcount
+        conn.commit()
+    cursor.execute("DROP TEMPORARY TABLE dedupe_keep")
+    cursor.close()
+    return deleted
+
+
+def ensure_unique_keys(conn, batch_size=10000):
+    """Add the hash columns and unique keys that are missing, compacting first; returns {table: rows deleted}"""
+    cursor = conn.cursor()
+    deleted = {}
+    for table in CHILD_KEYS:
+        column = CHILD_KEYS[table][0]
+        name, definition = unique_key(table)
+        if has_index(cursor, table, name):
+            continue
+        if not has_column(cursor, table, column):
+            logging.info(f"Adding column {table}.{column}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {hash_column(table)}, "
+                           f"ADD INDEX idx_dedupe (dealid, {column})")
+        elif not has_index(cursor, table, 'idx_dedupe'):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX idx_dedupe (dealid, {column})")
+        logging.info(f"Compacting duplicate {table} rows before adding {name}")
+        deleted[table] = compact(conn, table, batch_size=batch_size)
+        logging.info(f"Removed {deleted[table]} duplicate {table} rows")
+        # Fails (and is retried on the next start) if a concurrent writer re-added a duplicate
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX idx_dedupe, ADD {definition}")
+    cursor.close()
+    return deleted
+
+
+def table_report(cursor, tables=REPORT_TABLES):
+    """{table: (rows, MB)}; row counts are InnoDB estimates"""
+    cursor.execute(f"""
+        SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({', '.join(['%s'] * len(tables))})
+    """, tables)
+    return {name: (rows or 0, round((size or 0) / 1024 / 1024, 1)) for name, rows, size in cursor.fetchall()}
+
+
+def main(argv=None):
+    from dealnews_scraper.backfill import connect
+
+    parser = argparse.ArgumentParser(description="Remove duplicate child rows and add their unique keys")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Ids per delete/commit")
+    parser.add_argument('--report', action='store_true', help="Only print table sizes")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if not args.report:
+            start = time.time()
+            print("🔄 Compacting deal_images, deal_categories and related_deals...")
+            deleted = ensure_unique_keys(conn, batch_size=args.batch_size)
+            if not deleted:
+                print("✅ Unique keys already in place, nothing to compact")
+            for table, rows in deleted.items():
+                print(f"✅ {table}: {rows} duplicate rows removed")
+            print(f"   done in {time.time() - start:.1f}s")
+        cursor = conn.cursor()
+        for table, (rows, size) in table_report(cursor).items():
+            print(f"📊 {table:<20} ~{rows:>10,} rows  {size:>8} MB")
+        cursor.close()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
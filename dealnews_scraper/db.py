@@ -0,0 +1,212 @@
+"""
+Shared MySQL connections.
+
+One ConnectionManager per process (`get_manager()`) serves the run.py
+preflight checks, the known-deal preload, the MySQL storage backend and its writer
+threads, and the backfill/history CLIs from a single mysql.connector pool:
+
+    MYSQL_POOL_SIZE=5            connections kept open (max 32)
+    MYSQL_POOL_TIMEOUT=30        seconds to wait for a free connection
+    MYSQL_USE_C_EXTENSION=false  use the C extension driver when it is installed
+
+Connections are health-checked (pinged, and reconnected if needed) when they
+are taken from the pool. `run()` also reconnects and retries once when the
+server goes away mid-query. Closing a connection returns it to the pool.
+Cursors are timed, and `stats()` reports connection and per-query latency
+counters.
+"""
+import os
+import time
+import logging
+import threading
+
+import mysql.connector
+from mysql.connector import errorcode, pooling
+
+DEFAULT_PORT = 3307
+
+# Server gone away / lost connection: worth one reconnect and retry
+RECONNECT_ERRNOS = (
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+)
+
+
+def mysql_settings():
+    """Connection settings from the environment"""
+    return {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'port': int(os.getenv('MYSQL_PORT', str(DEFAULT_PORT))),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', 'root'),
+        'database': os.getenv('MYSQL_DATABASE', 'dealnews'),
+    }
+
+
+class TimedCursor:
+    """Cursor proxy that reports execute/executemany latency to the manager"""
+
+    def __init__(self, cursor, manager):
+        self._cursor = cursor
+        self._manager = manager
+
+    def execute(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            self._manager.record_query(time.monotonic() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            self._manager.record_query(time.monotonic() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class PooledConnection:
+    """A connection checked out of the pool; close() gives it back"""
+
+    def __init__(self, conn, manager):
+        self._conn = conn
+        self._manager = manager
+        self._closed = False
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._manager)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._manager.release(self._conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionManager:
+    """Bounded, health-checked pool of MySQL connections shared by one process"""
+
+    def __init__(self, pool_size=None, timeout=None, use_c_extension=None, **overrides):
+        self.settings = mysql_settings()
+        self.settings.update(overrides)
+        self.pool_size = min(int(pool_size or os.getenv('MYSQL_POOL_SIZE', '5')), pooling.CNX_POOL_MAXSIZE)
+        self.timeout = float(timeout or os.getenv('MYSQL_POOL_TIMEOUT', '30'))
+        if use_c_extension is None:
+            use_c_extension = os.getenv('MYSQL_USE_C_EXTENSION', 'false').lower() in ('1', 'true', 'yes')
+        if use_c_extension and not mysql.connector.HAVE_CEXT:
+            logging.warning("MYSQL_USE_C_EXTENSION is set but the C extension is not installed; using the pure-Python driver")
+            use_c_extension = False
+        self.driver = 'c' if use_c_extension else 'pure'
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0, 'in_use': 0, 'in_use_max': 0, 'reconnects': 0,
+            'queries': 0, 'query_ms_total': 0.0, 'query_ms_max': 0.0,
+        }
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                logging.info(f"Opening MySQL pool: {self.pool_size} connections to "
+                             f"{self.settings['host']}:{self.settings['port']} ({self.driver} driver)")
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name='dealnews',
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    use_pure=self.driver == 'pure',
+                    connection_timeout=30,
+                    autocommit=True,
+                    **self.settings
+                )
+            return self._pool
+
+    def acquire(self):
+        """Check a connection out, waiting up to MYSQL_POOL_TIMEOUT for a free one"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise mysql.connector.errors.PoolError(
+                f"No free MySQL connection after {self.timeout:g}s (MYSQL_POOL_SIZE={self.pool_size})")
+        try:
+            conn = self._get_pool().get_connection()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['in_use_max'] = max(self._stats['in_use_max'], self._stats['in_use'])
+        return PooledConnection(conn, self)
+
+    def release(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def connection(self):
+        """`with manager.connection() as conn:`"""
+        return self.acquire()
+
+    def run(self, work, retries=1):
+        """work(conn) on a pooled connection, reconnecting and retrying if the server went away"""
+        conn = self.acquire()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    return work(conn)
+                except mysql.connector.Error as err:
+                    if err.errno not in RECONNECT_ERRNOS or attempt == retries:
+                        raise
+                    logging.warning(f"MySQL connection lost ({err}), reconnecting...")
+                    with self._lock:
+                        self._stats['reconnects'] += 1
+                    conn.reconnect(attempts=3, delay=1)
+        finally:
+            conn.close()
+
+    def record_query(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['query_ms_total'] += ms
+            self._stats['query_ms_max'] = max(self._stats['query_ms_max'], ms)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pool_size'] = self.pool_size
+        stats['driver'] = self.driver
+        stats['query_ms_total'] = round(stats['query_ms_total'], 3)
+        stats['query_ms_max'] = round(stats['query_ms_max'], 3)
+        stats['query_ms_avg'] = round(stats['query_ms_total'] / stats['queries'], 3) if stats['queries'] else 0.0
+        return stats
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """The process-wide ConnectionManager (created on first use)"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ConnectionManager()
+        return _manager
@@ -0,0 +1,106 @@
+"""
+Store and category dimension tables for the item pipeline.
+
+`stores` and `categories` hold one row per distinct name with a small integer
+surrogate key; deals and deal_categories rows reference them through
+store_id / category_id. DimensionResolver keeps an in-process LRU of
+name -> id. Misses are upserted in bulk (one multi-row INSERT ... ON DUPLICATE
+KEY UPDATE plus one SELECT for the whole batch), so a name costs a round trip
+only the first time this process sees it.
+"""
+from collections import OrderedDict
+
+DIMENSION_TABLES = ('stores', 'categories')
+
+
+def create_dimension_table(cursor, table):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            source_id VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_name (name),
+            INDEX idx_source_id (source_id)
+        )
+    """)
+
+
+class DimensionResolver:
+    """LRU-cached name -> surrogate key lookup for one dimension table.
+
+    `source_id` is the DealNews data-store / data-category ID the name came
+    from, when known; it is recorded on first sight so IDs can be mapped to
+    keys later.
+    """
+
+    def __init__(self, table, maxsize=10000):
+        self.table = table
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, name, key):
+        self.cache[name] = key
+        self.cache.move_to_end(name)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def preload(self, cursor):
+        """Warm the cache with the most recently added names"""
+        cursor.execute(f"SELECT name, id FROM {self.table} ORDER BY id DESC LIMIT %s", (self.maxsize,))
+        for name, key in reversed(cursor.fetchall()):
+            self._remember(name, key)
+
+    def resolve_many(self, cursor, names):
+        """Map names (or (name, source_id) pairs) to keys, upserting unseen ones in bulk"""
+        result = {}
+        missing = {}
+        for entry in names:
+            name, source_id = entry if isinstance(entry, tuple) else (entry, None)
+            name = (name or '').strip()[:100]
+            if not name:
+                continue
+            if name in self.cache:
+                self.cache.move_to_end(name)
+                result[name] = self.cache[name]
+                self.hits += 1
+            elif name not in missing or source_id:
+                missing[name] = source_id or None
+
+        if missing:
+            self.misses += len(missing)
+            rows = list(missing.items())
+            stored = self._store(cursor, rows)
+            for name, _ in rows:
+                key = stored.get(name.casefold())
+                if key is not None:
+                    self._remember(name, key)
+                    result[name] = key
+        return result
+
+    def _store(self, cursor, rows):
+        """Upsert (name, source_id) rows; returns {casefolded name: key}"""
+        placeholders = ', '.join(['(%s, %s)'] * len(rows))
+        cursor.execute(
+            f"INSERT INTO {self.table} (name, source_id) VALUES {placeholders} "
+            f"ON DUPLICATE KEY UPDATE source_id = COALESCE(source_id, VALUES(source_id))",
+            [value for row in rows for value in row]
+        )
+        cursor.execute(
+            f"SELECT name, id FROM {self.table} WHERE name IN ({', '.join(['%s'] * len(rows))})",
+            [name for name, _ in rows]
+        )
+        # Name columns use a case-insensitive collation: match results the same way
+        return {name.casefold(): key for name, key in cursor.fetchall()}
+
+    def resolve(self, cursor, name, source_id=None):
+        """Surrogate key for one name, or None for an empty name"""
+        name = (name or '').strip()[:100]
+        if not name:
+            return None
+        return self.resolve_many(cursor, [(name, source_id)]).get(name)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'cached': len(self.cache)}
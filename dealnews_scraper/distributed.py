@@ -0,0 +1,334 @@
+"""
+Shared crawl queue for running several scraper nodes against one frontier.
+
+SharedScheduler replaces Scrapy's in-memory scheduler when SHARED_QUEUE_URL
+is set. Requests are serialized into a shared backend; nodes claim them
+under a lease (SHARED_QUEUE_VISIBILITY_TIMEOUT) and acknowledge them once
+they leave the downloader, so requests held by a node that dies become
+claimable again when the lease expires. Requests that never reach the
+downloader (IgnoreRequest or a response from a middleware's process_request,
+or dropped by the scheduler) are acknowledged by SharedQueueAckMiddleware and
+the request_dropped signal. A shared seen-set deduplicates requests across
+nodes.
+
+Backends:
+    redis://host:6379/0            Redis (requires the `redis` package)
+    exports/shared_queue.sqlite    SQLite file, for several processes on one box
+
+All keys/rows are namespaced by SHARED_CRAWL_ID (default: today's date), so
+nodes started for the same daily run share one frontier.
+"""
+import os
+import time
+import pickle
+import socket
+import sqlite3
+import logging
+from datetime import date
+
+from scrapy import signals
+from scrapy.utils.request import request_from_dict
+
+from dealnews_scraper.dupefilters import PersistentDupeFilter
+from dealnews_scraper.sharding import FrontierShard
+
+logger = logging.getLogger(__name__)
+
+# Sent by SharedQueueAckMiddleware when a request finished the middleware chain
+request_finished = object()
+
+
+class SQLiteQueueBackend:
+    """Shared queue and seen-set in one SQLite file (file-locked transactions)"""
+
+    def __init__(self, path, crawl_id):
+        self.crawl_id = crawl_id
+        queue_dir = os.path.dirname(path)
+        if queue_dir:
+            os.makedirs(queue_dir, exist_ok=True)
+        # Autocommit mode; claims take an explicit write lock with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                crawl_id TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_queue_claim ON queue (crawl_id, priority DESC, id)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                crawl_id TEXT NOT NULL,
+                fingerprint BLOB NOT NULL,
+                PRIMARY KEY (crawl_id, fingerprint)
+            )
+        """)
+
+    def push(self, data, priority):
+        cursor = self.db.execute(
+            "INSERT INTO queue (crawl_id, priority, data) VALUES (?, ?, ?)",
+            (self.crawl_id, priority, data)
+        )
+        return cursor.lastrowid
+
+    def claim(self, owner, lease_seconds):
+        """Lease the highest-priority request that is queued or whose lease expired"""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("""
+                SELECT id, data FROM queue
+                WHERE crawl_id = ? AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY priority DESC, id
+                LIMIT 1
+            """, (self.crawl_id, now)).fetchone()
+            if row:
+                self.db.execute(
+                    "UPDATE queue SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                    (owner, now + lease_seconds, row[0])
+                )
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return row
+
+    def ack(self, queue_id):
+        self.db.execute("DELETE FROM queue WHERE id = ?", (queue_id,))
+
+    def seen_add(self, fingerprint):
+        """Add to the shared seen-set; True if it was not there before"""
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO seen (crawl_id, fingerprint) VALUES (?, ?)",
+            (self.crawl_id, fingerprint)
+        )
+        return cursor.rowcount == 1
+
+    def pending_count(self):
+        """Queued plus leased requests across all nodes"""
+        return self.db.execute(
+            "SELECT COUNT(*) FROM queue WHERE crawl_id = ?", (self.crawl_id,)
+        ).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+# Requeue expired leases, then move the best queued id into the lease set
+_REDIS_CLAIM = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('ZADD', KEYS[1], -tonumber(redis.call('HGET', KEYS[3], id) or 0), id)
+end
+local item = redis.call('ZPOPMIN', KEYS[1])
+if #item == 0 then
+    return nil
+end
+redis.call('ZADD', KEYS[2], ARGV[2], item[1])
+return item[1]
+"""
+
+
+class RedisQueueBackend:
+    """Shared queue and seen-set in Redis (sorted sets + hashes, Lua claim)"""
+
+    def __init__(self, url, crawl_id):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARED_QUEUE_URL is a redis:// URL but the `redis` package is not installed (pip install redis)")
+        self.redis = redis.Redis.from_url(url)
+        prefix = f'dealnews:{crawl_id}'
+        self.keys = {
+            'queue': f'{prefix}:queue',
+            'leases': f'{prefix}:leases',
+            'priority': f'{prefix}:priority',
+            'data': f'{prefix}:data',
+            'seen': f'{prefix}:seen',
+            'counter': f'{prefix}:counter',
+        }
+        self._claim = self.redis.register_script(_REDIS_CLAIM)
+
+    def push(self, data, priority):
+        # Zero-padded ids keep FIFO order among equal priorities
+        queue_id = '%012d' % self.redis.incr(self.keys['counter'])
+        pipe = self.redis.pipeline()
+        pipe.hset(self.keys['data'], queue_id, data)
+        pipe.hset(self.keys['priority'], queue_id, priority)
+        pipe.zadd(self.keys['queue'], {queue_id: -priority})
+        pipe.execute()
+        return queue_id
+
+    def claim(self, owner, lease_seconds):
+        now = time.time()
+        queue_id = self._claim(
+            keys=[self.keys['queue'], self.keys['leases'], self.keys['priority']],
+            args=[now, now + lease_seconds]
+        )
+        if queue_id is None:
+            return None
+        queue_id = queue_id.decode() if isinstance(queue_id, bytes) else queue_id
+        data = self.redis.hget(self.keys['data'], queue_id)
+        if data is None:
+            # Acked by another node after its lease expired
+            self.redis.zrem(self.keys['leases'], queue_id)
+            return None
+        return queue_id, data
+
+    def ack(self, queue_id):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.keys['leases'], queue_id)
+        pipe.hdel(self.keys['data'], queue_id)
+        pipe.hdel(self.keys['priority'], queue_id)
+        pipe.execute()
+
+    def seen_add(self, fingerprint):
+        return self.redis.sadd(self.keys['seen'], fingerprint) == 1
+
+    def pending_count(self):
+        return self.redis.zcard(self.keys['queue']) + self.redis.zcard(self.keys['leases'])
+
+    def close(self):
+        self.redis.close()
+
+
+def open_backend(url, crawl_id):
+    """Pick the backend from the SHARED_QUEUE_URL scheme"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisQueueBackend(url, crawl_id)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteQueueBackend(url, crawl_id)
+
+
+class SharedDupeFilter(PersistentDupeFilter):
+    """PersistentDupeFilter whose in-run seen-set is shared by all nodes"""
+
+    def __init__(self, backend, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backend = backend
+
+    @classmethod
+    def from_crawler(cls, crawler, backend=None):
+        settings = crawler.settings
+        dupefilter = cls(
+            backend,
+            settings.get('DUPEFILTER_STORE', 'exports/request_fingerprints.sqlite'),
+            revisit_windows=settings.getdict('DUPEFILTER_REVISIT_WINDOWS'),
+            stats=crawler.stats,
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            shard=FrontierShard.from_settings(settings),
+        )
+        crawler.signals.connect(dupefilter.response_received, signal=signals.response_received)
+        return dupefilter
+
+    def seen_in_run(self, fp):
+        return not self.backend.seen_add(fp)
+
+
+class SharedScheduler:
+    """Scrapy scheduler backed by a shared, lease-based request queue"""
+
+    def __init__(self, crawler, backend, visibility_timeout):
+        self.crawler = crawler
+        self.backend = backend
+        self.visibility_timeout = visibility_timeout
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.df = None
+        self.spider = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        crawl_id = settings.get('SHARED_CRAWL_ID') or date.today().isoformat()
+        backend = open_backend(settings.get('SHARED_QUEUE_URL'), crawl_id)
+        scheduler = cls(crawler, backend, settings.getint('SHARED_QUEUE_VISIBILITY_TIMEOUT', 300))
+        for signal in (signals.request_left_downloader, signals.request_dropped, request_finished):
+            crawler.signals.connect(scheduler.ack_request, signal=signal)
+        return scheduler
+
+    def _inc(self, key):
+        self.crawler.stats.inc_value(key)
+
+    def open(self, spider):
+        self.spider = spider
+        self.df = SharedDupeFilter.from_crawler(self.crawler, backend=self.backend)
+        logger.info(f"Shared queue opened as {self.owner} ({type(self.backend).__name__})")
+
+    def close(self, reason):
+        if self.df:
+            self.df.close(reason)
+        self.backend.close()
+
+    def has_pending_requests(self):
+        # Leased requests on other nodes may still add to the frontier
+        return self.backend.pending_count() > 0
+
+    def enqueue_request(self, request):
+        # Every node yields the start URLs; only the first to enqueue one keeps it
+        if request.meta.pop('start_request', False):
+            if not self.backend.seen_add(b'start:' + self.df.fingerprinter.fingerprint(request)):
+                return False
+        elif not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        request.meta.pop('shared_queue_id', None)
+        data = pickle.dumps(request.to_dict(spider=self.spider), protocol=pickle.HIGHEST_PROTOCOL)
+        self.backend.push(data, request.priority)
+        self._inc('scheduler/enqueued/shared')
+        return True
+
+    def next_request(self):
+        claimed = self.backend.claim(self.owner, self.visibility_timeout)
+        if not claimed:
+            return None
+        queue_id, data = claimed
+        request = request_from_dict(pickle.loads(data), spider=self.spider)
+        request.meta['shared_queue_id'] = queue_id
+        self._inc('scheduler/dequeued/shared')
+        return request
+
+    def ack_request(self, request, spider):
+        """Acknowledge a claimed request once its download finished, failed or was skipped"""
+        queue_id = request.meta.pop('shared_queue_id', None)
+        if queue_id is not None:
+            self.backend.ack(queue_id)
+            self._inc('shared_queue/acked')
+
+    def __len__(self):
+        return self.backend.pending_count()
+
+
+class SharedQueueAckMiddleware:
+    """Downloader middleware acknowledging claimed requests that end inside the middleware chain
+
+    Enabled outermost (lowest order), so its process_response/process_exception
+    also see responses returned and exceptions raised (e.g. IgnoreRequest) by
+    another middleware's process_request, where request_left_downloader never
+    fires. A no-op for requests that were not claimed from a shared queue.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _finished(self, request, spider):
+        if 'shared_queue_id' in request.meta:
+            self.crawler.signals.send_catch_log(signal=request_finished, request=request, spider=spider)
+
+    def process_response(self, request, response, spider):
+        self._finished(request, spider)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._finished(request, spider)
+        return None
@@ -0,0 +1,126 @@
+"""
+Persistent request dupefilter for DealnewsSpider.
+
+Fingerprints of successfully fetched requests are kept in a SQLite file so
+they survive across runs. A request is filtered when it was already seen in
+this run, or when it was fetched in a previous run less than its URL type's
+revisit window ago (DUPEFILTER_REVISIT_WINDOWS, keyed by request.meta
+['url_type']). In a sharded crawl requests owned by another worker's shard
+are dropped as well (see sharding.py).
+"""
+import os
+import time
+import sqlite3
+
+from scrapy import signals
+from scrapy.dupefilters import RFPDupeFilter
+
+from dealnews_scraper.sharding import FrontierShard
+
+DEFAULT_REVISIT_WINDOWS = {
+    'listing': 0,           # listing pages are re-crawled every run
+    'deal': 3 * 24 * 3600,  # deal pages at most every 3 days
+    'default': 0,
+}
+
+
+class PersistentDupeFilter(RFPDupeFilter):
+    """RFPDupeFilter backed by a SQLite fingerprint store with revisit windows"""
+
+    def __init__(self, store_path, revisit_windows=None, stats=None, debug=False, fingerprinter=None, shard=None):
+        super().__init__(debug=debug, fingerprinter=fingerprinter)
+        self.revisit_windows = dict(DEFAULT_REVISIT_WINDOWS, **(revisit_windows or {}))
+        self.stats = stats
+        self.shard = shard or FrontierShard()
+        self.run_fingerprints = set()
+        store_dir = os.path.dirname(store_path)
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        # WAL + per-write commits so several crawler processes can share the store
+        self.db = sqlite3.connect(store_path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                fingerprint BLOB PRIMARY KEY,
+                url_type TEXT,
+                seen_at REAL
+            )
+        """)
+        # Rows past the longest window can never filter anything again
+        horizon = time.time() - max(self.revisit_windows.values())
+        self.db.execute("DELETE FROM fingerprints WHERE seen_at < ?", (horizon,))
+        self.db.commit()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        dupefilter = cls(
+            settings.get('DUPEFILTER_STORE', 'exports/request_fingerprints.sqlite'),
+            revisit_windows=settings.getdict('DUPEFILTER_REVISIT_WINDOWS'),
+            stats=crawler.stats,
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            shard=FrontierShard.from_settings(settings),
+        )
+        crawler.signals.connect(dupefilter.response_received, signal=signals.response_received)
+        return dupefilter
+
+    def _inc(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(f'dupefilter/{key}')
+
+    def _window(self, request):
+        url_type = request.meta.get('url_type', 'default')
+        return self.revisit_windows.get(url_type, self.revisit_windows['default'])
+
+    def seen_in_run(self, fp):
+        """Record fp for this crawl; True if it was already there"""
+        if fp in self.run_fingerprints:
+            return True
+        self.run_fingerprints.add(fp)
+        return False
+
+    def request_seen(self, request):
+        if not self.shard.owns(request):
+            if self.stats is not None:
+                self.stats.inc_value('shard/requests_dropped')
+            return True
+        self._inc('checked')
+        fp = self.fingerprinter.fingerprint(request)
+        if self.seen_in_run(fp):
+            self._inc('run_hits')
+            return True
+
+        window = self._window(request)
+        if window > 0:
+            row = self.db.execute(
+                "SELECT seen_at FROM fingerprints WHERE fingerprint = ?", (fp,)
+            ).fetchone()
+            if row and row[0] > time.time() - window:
+                self._inc('persistent_hits')
+                return True
+        return False
+
+    def log(self, request, spider):
+        # Requests of other shards are counted in shard/requests_dropped, not as duplicates
+        if self.shard.owns(request):
+            super().log(request, spider)
+
+    def response_received(self, response, request, spider):
+        """Persist fingerprints only once a page was actually fetched"""
+        if response.status != 200:
+            return
+        self.db.execute(
+            "INSERT OR REPLACE INTO fingerprints (fingerprint, url_type, seen_at) VALUES (?, ?, ?)",
+            (self.fingerprinter.fingerprint(request), request.meta.get('url_type', 'default'), time.time())
+        )
+        self.db.commit()
+
+    def close(self, reason):
+        self.db.commit()
+        self.db.close()
+        if self.stats is not None:
+            checked = self.stats.get_value('dupefilter/checked', 0)
+            hits = self.stats.get_value('dupefilter/run_hits', 0) + self.stats.get_value('dupefilter/persistent_hits', 0)
+            self.stats.set_value('dupefilter/hit_ratio', round(hits / checked, 4) if checked else 0.0)
+        super().close(reason)
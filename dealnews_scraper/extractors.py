@@ -0,0 +1,347 @@
+"""
+Compiled card extraction for DealNews listing pages.
+
+All CSS selectors are translated to XPath and compiled once when the
+extractor is created. Fields are filled in tiers, cheapest first:
+
+1. `jsonld`: JSON-LD / application/json blocks on the page, parsed once per
+   page and matched to cards by deal URL or content ID.
+2. `data_attr`: the card's data-* attributes, collected in a single pass.
+3. `text`: the card's text nodes walked once, classifying each node into
+   price, promo, store, published and popularity; only run for fields the
+   first two tiers left empty.
+
+`deal['field_sources']` records which tier supplied each of those fields.
+"""
+import json
+from urllib.parse import urljoin, urlparse, parse_qs
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+# Map DealNews data-store IDs to store names
+STORE_ID_NAMES = {
+    '313': 'Amazon',
+    '1': 'Walmart',
+    '2': 'Target',
+    '3': 'Best Buy',
+    '4': 'eBay',
+    '5': 'Home Depot',
+    '6': 'Macy\'s',
+    '7': 'Nike',
+    '8': 'adidas',
+    '9': 'REI',
+    '10': 'Dick\'s Sporting Goods'
+}
+
+# Map DealNews data-category IDs to category names
+CATEGORY_ID_NAMES = {
+    '196': 'Home & Garden',
+    '280': 'Clothing & Accessories',
+    '202': 'Clothing & Accessories',
+    '1': 'Electronics',
+    '2': 'Clothing',
+    '3': 'Computers',
+    '4': 'Health & Beauty',
+    '5': 'Sports & Outdoors'
+}
+
+# Relative-time markers used in the card byline (e.g. "Amazon · 16 hrs ago")
+TIME_MARKERS = ('hrs ago', 'days ago', 'mins ago', 'hr ago', 'day ago', 'min ago')
+
+# Fields resolved by the tiered lookup, in card text order
+TIERED_FIELDS = ('price', 'promo', 'store', 'published', 'popularity')
+
+# Card data-* attributes that carry a tiered field directly
+DATA_ATTRIBUTE_FIELDS = {
+    'price': ('data-price', 'data-sale-price'),
+    'promo': ('data-promo', 'data-discount'),
+    'store': ('data-store-name', 'data-merchant'),
+    'published': ('data-published', 'data-date-published'),
+    'popularity': ('data-popularity',),
+}
+
+# JSON-LD keys that identify the deal an object describes
+JSONLD_ID_KEYS = ('@id', 'sku', 'productID', 'identifier')
+
+_translator = HTMLTranslator()
+
+
+def compile_css(query):
+    """Translate a parsel CSS query (incl. ::text/::attr) into a compiled XPath"""
+    return etree.XPath(_translator.css_to_xpath(query), smart_strings=False)
+
+
+def _first(nodes):
+    return nodes[0] if nodes else None
+
+
+def _is_price(text):
+    return '$' in text and len(text) < 20 and any(char.isdigit() for char in text)
+
+
+def _is_promo(text):
+    if len(text) >= 50:
+        return False
+    lowered = text.lower()
+    return '%' in text or 'off' in lowered or 'save' in lowered
+
+
+def _is_published(text):
+    return any(marker in text for marker in TIME_MARKERS)
+
+
+def _format_price(price, currency):
+    if price in (None, ''):
+        return ''
+    if not currency or currency == 'USD':
+        return f'${price}'
+    return f'{price} {currency}'
+
+
+def _jsonld_fields(obj):
+    """Tiered fields described by one JSON-LD object (Product, Offer, ...)"""
+    fields = {}
+    offers = obj.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    offer = offers if isinstance(offers, dict) else obj
+    price = offer.get('price', offer.get('lowPrice'))
+    if price not in (None, ''):
+        fields['price'] = _format_price(price, offer.get('priceCurrency'))
+    seller = offer.get('seller')
+    if isinstance(seller, dict):
+        seller = seller.get('name')
+    if isinstance(seller, str) and seller.strip():
+        fields['store'] = seller.strip()
+    published = obj.get('datePublished') or offer.get('validFrom')
+    if isinstance(published, str) and published.strip():
+        fields['published'] = published.strip()
+    return fields
+
+
+def _walk_json(node):
+    """Yield every dict nested anywhere in a decoded JSON document"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk_json(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk_json(value)
+
+
+class CardExtractor:
+    """Extracts deal dicts from `.content-card` elements.
+
+    Build one per spider; the compiled selectors are reused for every card.
+    """
+
+    def __init__(self):
+        self.cards = compile_css('.content-card')
+        self.text_nodes = compile_css('::text')
+        self.json_scripts = etree.XPath(
+            '//script[@type="application/ld+json" or @type="application/json"]/text()',
+            smart_strings=False
+        )
+        # Smart strings keep .attrname so one query returns every data-* attribute
+        self.data_attributes = etree.XPath('descendant-or-self::*/@*[starts-with(name(), "data-")]')
+        self.link_href = compile_css('a::attr(href)')
+        self.link_label = compile_css('a::attr(aria-label)')
+        self.title_text = compile_css('.title::text')
+        self.title_attr = compile_css('.title::attr(title)')
+        self.snippet_text = compile_css('.snippet::text')
+        self.callout_text = compile_css('.callout::text')
+        self.cta_text = compile_css('.btn-cta::text')
+        self.staff_pick = compile_css('.badges .icon[href="#ic-staff-pick"]')
+        self.image_src = compile_css('img::attr(src)')
+        self.chip_href = compile_css('.chip::attr(href)')
+        self.chip_title = compile_css('.chip::attr(title)')
+        self.breadcrumb_text = compile_css('.breadcrumb a::text')
+
+    def select_cards(self, response):
+        """Return the lxml elements of every content card on the page"""
+        return self.cards(response.selector.root)
+
+    def page_data(self, response):
+        """Index the page's JSON-LD / application/json objects by deal URL and ID.
+
+        Call once per response and pass the result to extract().
+        """
+        index = {}
+        for script in self.json_scripts(response.selector.root):
+            try:
+                document = json.loads(script)
+            except ValueError:
+                continue
+            for obj in _walk_json(document):
+                fields = _jsonld_fields(obj)
+                if not fields:
+                    continue
+                keys = [f'id:{obj[key]}' for key in JSONLD_ID_KEYS if isinstance(obj.get(key), (str, int))]
+                if isinstance(obj.get('url'), str):
+                    keys.append(f'url:{urljoin(response.url, obj["url"])}')
+                for key in keys:
+                    index.setdefault(key, fields)
+        return index
+
+    def card_attributes(self, root):
+        """All data-* attributes of the card and its descendants (first one wins)"""
+        attributes = {}
+        for value in self.data_attributes(root):
+            attributes.setdefault(value.attrname, str(value))
+        return attributes
+
+    def classify_text(self, root, wanted=TIERED_FIELDS):
+        """Walk the card's text nodes once and pick the first match per wanted field"""
+        found = dict.fromkeys(TIERED_FIELDS, '')
+        remaining = set(wanted)
+        for text in self.text_nodes(root):
+            text = text.strip()
+            if 'price' in remaining and _is_price(text):
+                found['price'] = text
+                remaining.discard('price')
+            if 'promo' in remaining and _is_promo(text):
+                found['promo'] = text
+                remaining.discard('promo')
+            if ('published' in remaining or 'store' in remaining) and _is_published(text):
+                if 'published' in remaining:
+                    found['published'] = text
+                    remaining.discard('published')
+                # Store name precedes the "·" in the byline
+                if 'store' in remaining and '·' in text:
+                    found['store'] = text.split('·')[0].strip()
+                    remaining.discard('store')
+            if 'popularity' in remaining and 'Popularity:' in text:
+                found['popularity'] = text
+                remaining.discard('popularity')
+            if not remaining:
+                break
+        return found
+
+    def tiered_fields(self, root, attributes, structured):
+        """Fill TIERED_FIELDS from JSON-LD, then data-*, then the text walk"""
+        fields = dict.fromkeys(TIERED_FIELDS, '')
+        sources = dict.fromkeys(TIERED_FIELDS, '')
+        for field in TIERED_FIELDS:
+            if structured.get(field):
+                fields[field], sources[field] = structured[field], 'jsonld'
+                continue
+            for name in DATA_ATTRIBUTE_FIELDS[field]:
+                if attributes.get(name, '').strip():
+                    fields[field], sources[field] = attributes[name].strip(), 'data_attr'
+                    break
+
+        missing = [field for field in TIERED_FIELDS if not fields[field]]
+        if missing:
+            text_fields = self.classify_text(root, missing)
+            for field in missing:
+                if text_fields[field]:
+                    fields[field], sources[field] = text_fields[field], 'text'
+        return fields, sources
+
+    def extract(self, element, base_url, page_data=None):
+        """Extract a deal dict from a card (parsel Selector or lxml element)"""
+        root = getattr(element, 'root', element)
+        attributes = self.card_attributes(root)
+        deal = {}
+
+        deal['dealid'] = attributes.get('data-content-id', '')
+
+        # URL from data attributes, falling back to the first link
+        first_href = _first(self.link_href(root))
+        url = attributes.get('data-offer-url') or first_href
+        if url and not url.startswith('#') and len(url) > 10:
+            deal['url'] = urljoin(base_url, url)
+            query_params = parse_qs(urlparse(deal['url']).query)
+            deal['recid'] = query_params.get('recid', [''])[0]
+        else:
+            deal['url'] = ''
+            deal['recid'] = ''
+
+        # Title text, then the title attribute
+        title = _first(self.title_text(root))
+        if not (title and len(title.strip()) > 5):
+            title = _first(self.title_attr(root))
+        deal['title'] = title.strip() if title and len(title.strip()) > 5 else ''
+
+        structured = {}
+        if page_data:
+            structured = page_data.get(f'url:{deal["url"]}') or page_data.get(f'id:{deal["dealid"]}') or {}
+        fields, sources = self.tiered_fields(root, attributes, structured)
+        deal['price'] = fields['price']
+        deal['promo'] = fields['promo']
+
+        # Fallback to the data-store ID map if no tier named the store
+        store = fields['store']
+        if not store:
+            store_id = attributes.get('data-store')
+            if store_id:
+                store = STORE_ID_NAMES.get(store_id, f'Store_{store_id}')
+                sources['store'] = 'store_id'
+        deal['store'] = store.strip() if store else ''
+
+        snippet = _first(self.snippet_text(root))
+        if snippet and len(snippet.strip()) > 10:
+            deal['deal'] = snippet.strip()
+        else:
+            deal['deal'] = deal['title']
+
+        dealplus = _first(self.callout_text(root))
+        deal['dealplus'] = dealplus.strip() if dealplus else ''
+
+        if first_href and not first_href.startswith('#') and len(first_href) > 10:
+            deal['deallink'] = urljoin(base_url, first_href)
+        else:
+            deal['deallink'] = deal['url']
+
+        dealtext = _first(self.cta_text(root))
+        deal['dealtext'] = dealtext.strip() if dealtext else ''
+
+        dealhover = _first(self.link_label(root))
+        deal['dealhover'] = dealhover.strip() if dealhover else ''
+
+        deal['published'] = fields['published']
+        deal['popularity'] = fields['popularity']
+        deal['staffpick'] = 'Yes' if self.staff_pick(root) else 'No'
+        deal['detail'] = snippet.strip() if snippet else ''
+
+        img_url = _first(self.image_src(root))
+        if img_url and not img_url.startswith('data:') and len(img_url) > 10:
+            deal['images'] = [urljoin(base_url, img_url)]
+        else:
+            deal['images'] = []
+
+        # Categories from chips (href and title lists are index-aligned)
+        categories = []
+        chip_titles = self.chip_title(root)
+        for i, link in enumerate(self.chip_href(root)):
+            if link and i < len(chip_titles):
+                categories.append({
+                    'name': chip_titles[i].strip(),
+                    'url': urljoin(base_url, link),
+                    'title': chip_titles[i].strip()
+                })
+        deal['categories'] = categories
+
+        # Related deals are not available in the card structure
+        deal['related_deals'] = []
+
+        # Keep the card's own markup rather than a prefix of the whole page
+        deal['raw_html'] = etree.tostring(root, method='html', encoding='unicode', with_tail=False)
+
+        # Category from the last breadcrumb item, then data-category
+        breadcrumb_links = self.breadcrumb_text(root)
+        category = breadcrumb_links[-1].strip() if breadcrumb_links else ''
+        if not category:
+            category_id = attributes.get('data-category')
+            if category_id:
+                category = CATEGORY_ID_NAMES.get(category_id, f'Category_{category_id}')
+        deal['category'] = category.strip() if category else 'general'
+
+        # DealNews IDs behind store/category, kept for the dimension tables
+        deal['store_ref'] = attributes.get('data-store', '')
+        deal['category_ref'] = attributes.get('data-category', '')
+
+        deal['field_sources'] = sources
+        return deal
@@ -0,0 +1,92 @@
+"""
+Bounded, deduplicated pagination frontier for DealNews listing pages.
+
+Each section (a listing URL with its `page=` parameter removed) keeps its
+own set of canonical page URLs and deal IDs. Next pages are only scheduled
+while the section is below PAGINATION_MAX_DEPTH and the current page still
+produced deal IDs the section had not seen before.
+"""
+from urllib.parse import parse_qs, urlparse
+
+from w3lib.url import canonicalize_url, url_query_cleaner
+
+
+def section_key(url):
+    """Canonical URL of the listing with pagination parameters stripped"""
+    return canonicalize_url(url_query_cleaner(url, ('page',), remove=True))
+
+
+def page_number(url):
+    """Value of the `page=` query parameter, or None"""
+    value = parse_qs(urlparse(url).query).get('page', [''])[0]
+    return int(value) if value.isdigit() else None
+
+
+class PaginationFrontier:
+    """Per-section pagination state shared by all listing callbacks"""
+
+    def __init__(self, max_depth=5, stats=None):
+        self.max_depth = max_depth
+        self.stats = stats
+        self.seen_pages = set()
+        self.section_deals = {}
+        self.exhausted = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Stats are attached by the spider once the crawl has started
+        return cls(max_depth=crawler.settings.getint('PAGINATION_MAX_DEPTH', 5))
+
+    def _inc(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(f'pagination/{key}')
+
+    def section_for(self, response):
+        return response.meta.get('pagination_section') or section_key(response.url)
+
+    def record_deals(self, response, dealids):
+        """Register the deal IDs found on a page; return how many were new to its section.
+
+        A follow-up page (depth > 0) that adds nothing marks the section
+        exhausted so no further pages are scheduled for it.
+        """
+        section = self.section_for(response)
+        self.seen_pages.add(canonicalize_url(response.url))
+        known = self.section_deals.setdefault(section, set())
+        new_ids = {dealid for dealid in dealids if dealid} - known
+        known.update(new_ids)
+        if not new_ids and response.meta.get('page_depth', 0) > 0:
+            self.exhausted.add(section)
+            self._inc('exhausted')
+        return len(new_ids)
+
+    def follow(self, response, href, callback):
+        """Build the request for a next-page link, or None if it should not be crawled"""
+        section = self.section_for(response)
+        if section in self.exhausted:
+            return None
+
+        url = response.urljoin(href)
+        canonical = canonicalize_url(url)
+        if canonical in self.seen_pages:
+            self._inc('duplicate')
+            return None
+
+        # Depth is the page offset when the link says so, else one past the parent
+        number = page_number(url)
+        depth = number - 1 if number else response.meta.get('page_depth', 0) + 1
+        if depth < 1:
+            return None
+        if depth > self.max_depth:
+            self._inc('max_depth_reached')
+            return None
+
+        self.seen_pages.add(canonical)
+        self._inc('scheduled')
+        return response.follow(
+            url,
+            callback,
+            # Earlier pages are fetched first
+            priority=-depth,
+            meta={'pagination_section': section, 'page_depth': depth, 'url_type': 'listing'}
+        )
@@ -0,0 +1,193 @@
+"""
+Append-only price history for deals.
+
+`deal_price_history` gets one row per deal each time its price, promo or
+popularity changes (StoragePipeline writes it in the same transaction as the
+deal upsert). Rows are clustered on (deal_id, observed_at), so a deal's
+series is a single primary-key range scan. Columns are numeric: prices in
+cents, the promo as a CRC32 of its normalized text (enough to tell that it
+changed; the current text stays on `deals`), popularity as N of "N/5".
+
+    python -m dealnews_scraper.history series 1234 [--bucket day] [--since 2026-01-01]
+    python -m dealnews_scraper.history series --url https://www.dealnews.com/...
+    python -m dealnews_scraper.history downsample --older-than-days 90 [--bucket day]
+
+Downsampling keeps the last point per deal and bucket for points older than
+the cut-off and deletes the rest, one deal-id range per transaction.
+"""
+import re
+import sys
+import zlib
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from dealnews_scraper.prices import parse_prices
+
+HISTORY_COLUMNS = (
+    'deal_id', 'observed_at', 'price_cents', 'original_price_cents',
+    'discount_pct', 'popularity', 'promo_crc',
+)
+
+# SQL expression naming each downsampling bucket
+BUCKETS = {
+    'hour': "DATE_FORMAT(observed_at, '%Y-%m-%d %H')",
+    'day': "DATE(observed_at)",
+    'week': "YEARWEEK(observed_at, 3)",
+}
+
+_POPULARITY = re.compile(r'(\d+)\s*/\s*\d+')
+
+
+def create_history_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deal_price_history (
+            deal_id INT NOT NULL,
+            observed_at DATETIME NOT NULL,
+            price_cents INT UNSIGNED,
+            original_price_cents INT UNSIGNED,
+            discount_pct DECIMAL(5,2),
+            popularity TINYINT UNSIGNED,
+            promo_crc INT UNSIGNED,
+            PRIMARY KEY (deal_id, observed_at)
+        )
+    """)
+
+
+def normalize(text):
+    return ' '.join((text or '').split())
+
+
+def parse_popularity(text):
+    """N of "Popularity: N/5", or None"""
+    match = _POPULARITY.search(text or '')
+    return int(match.group(1)) if match else None
+
+
+def tracked_values(price, promo, popularity):
+    """What a history point records a change of"""
+    return normalize(price), normalize(promo), normalize(popularity)
+
+
+def history_row(deal_id, observed_at, price, promo, popularity):
+    """A deal_price_history row (in HISTORY_COLUMNS order)"""
+    prices = parse_prices(price, promo)
+    promo = normalize(promo)
+    return (
+        deal_id,
+        observed_at,
+        prices['price_cents'],
+        prices['original_price_cents'],
+        prices['discount_pct'],
+        parse_popularity(popularity),
+        zlib.crc32(promo.encode('utf-8')) if promo else None,
+    )
+
+
+def record_points(cursor, rows):
+    """Append history rows; a second point for the same deal and second is ignored"""
+    if not rows:
+        return 0
+    cursor.executemany(
+        f"INSERT IGNORE INTO deal_price_history ({', '.join(HISTORY_COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(HISTORY_COLUMNS))})",
+        rows
+    )
+    return cursor.rowcount
+
+
+def now():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def fetch_series(cursor, deal_id, since=None, bucket=None):
+    """A deal's points, oldest first, as dicts; with `bucket`, the last point per bucket"""
+    cursor.execute(f"""
+        SELECT {', '.join(HISTORY_COLUMNS)} FROM deal_price_history
+        WHERE deal_id = %s AND observed_at >= %s
+        ORDER BY observed_at
+    """, (deal_id, since or datetime(1970, 1, 1)))
+    points = [dict(zip(HISTORY_COLUMNS, row)) for row in cursor.fetchall()]
+    if bucket is None:
+        return points
+    formats = {'hour': '%Y-%m-%d %H', 'day': '%Y-%m-%d', 'week': '%G-%V'}
+    latest = {}
+    for point in points:
+        latest[point['observed_at'].strftime(formats[bucket])] = point
+    return list(latest.values())
+
+
+def deal_id_for_url(cursor, url):
+    from dealnews_scraper.migrations import URL_HASH
+
+    cursor.execute(f"SELECT id FROM deals WHERE url_hash = {URL_HASH}", (url,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def downsample(conn, older_than, bucket='day', batch_size=1000):
+    """Keep the last point per deal and bucket before `older_than`; returns rows deleted"""
+    expression = BUCKETS[bucket]
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(deal_id), 0) FROM deal_price_history")
+    max_id = cursor.fetchone()[0]
+    deleted = 0
+    for low in range(0, max_id, batch_size):
+        cursor.execute(f"""
+            DELETE h FROM deal_price_history h
+            JOIN (
+                SELECT deal_id, {expression} AS bucket, MAX(observed_at) AS keep_at
+                FROM deal_price_history
+                WHERE deal_id > %s AND deal_id <= %s AND observed_at < %s
+                GROUP BY deal_id, bucket
+            ) k ON k.deal_id = h.deal_id AND k.bucket = {expression.replace('observed_at', 'h.observed_at')}
+            WHERE h.observed_at < k.keep_at
+        """, (low, low + batch_size, older_than))
+        deleted += cursor.rowcount
+        conn.commit()
+    cursor.close()
+    return deleted
+
+
+def main(argv=None):
+    from dealnews_scraper.backfill import connect
+
+    parser = argparse.ArgumentParser(description="Read or downsample deal price history")
+    commands = parser.add_subparsers(dest='command', required=True)
+    series = commands.add_parser('series', help="Print a deal's price series")
+    series.add_argument('deal_id', nargs='?', type=int, help="deals.id")
+    series.add_argument('--url', help="Look the deal up by URL instead")
+    series.add_argument('--since', type=datetime.fromisoformat, help="Only points at or after this UTC time")
+    series.add_argument('--bucket', choices=sorted(BUCKETS), help="Last point per hour/day/week")
+    compact = commands.add_parser('downsample', help="Thin out old points")
+    compact.add_argument('--older-than-days', type=int, default=90)
+    compact.add_argument('--bucket', choices=sorted(BUCKETS), default='day')
+    compact.add_argument('--batch-size', type=int, default=1000, help="Deal ids per transaction")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        if args.command == 'series':
+            deal_id = deal_id_for_url(cursor, args.url) if args.url else args.deal_id
+            if deal_id is None:
+                print("❌ Deal not found")
+                return 1
+            points = fetch_series(cursor, deal_id, since=args.since, bucket=args.bucket)
+            print(f"📈 Deal {deal_id}: {len(points)} points")
+            for point in points:
+                price = f"${point['price_cents'] / 100:,.2f}" if point['price_cents'] is not None else '-'
+                discount = f"{point['discount_pct']}% off" if point['discount_pct'] is not None else ''
+                print(f"   {point['observed_at']}  {price:>12}  {discount:<12} popularity {point['popularity'] or '-'}")
+        else:
+            cutoff = now() - timedelta(days=args.older_than_days)
+            print(f"🔄 Downsampling points before {cutoff} to one per {args.bucket}...")
+            deleted = downsample(conn, cutoff, bucket=args.bucket, batch_size=args.batch_size)
+            print(f"✅ {deleted} points removed")
+        cursor.close()
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,9 +9,11 @@ class DealnewsItem(scrapy.Item):
     price = scrapy.Field()
     promo = scrapy.Field()
     category = scrapy.Field()
+    category_ref = scrapy.Field()  # DealNews data-category ID, if any
     
     # Store and vendor information
     store = scrapy.Field()
+    store_ref = scrapy.Field()  # DealNews data-store ID, if any
     
     # Deal details
     deal = scrapy.Field()  # e.g., "Up to 80% off"
@@ -24,6 +26,7 @@ class DealnewsItem(scrapy.Item):
     
     # Timestamps
     published = scrapy.Field()
+    published_at = scrapy.Field()  # UTC "YYYY-MM-DD HH:MM:SS" resolved from `published`
     created_at = scrapy.Field()
     
     # Ratings and picks
@@ -32,7 +35,15 @@ class DealnewsItem(scrapy.Item):
     
     # Additional data
     detail = scrapy.Field()  # Full deal description
-    raw_html = scrapy.Field()
+    raw_html = scrapy.Field()  # The deal card's own outerHTML
+    page_hash = scrapy.Field()  # SHA-1 of the page body stored in `pages`
+    content_hash = scrapy.Field()  # SHA-1 of the normalized content fields; the row is rewritten only when it changes
+
+class DealPageItem(scrapy.Item):
+    # Full page body, stored once per content hash
+    page_hash = scrapy.Field()
+    url = scrapy.Field()
+    body = scrapy.Field()
 
 class DealImageItem(scrapy.Item):
     dealid = scrapy.Field()
@@ -0,0 +1,94 @@
+"""
+In-memory index of deals already stored by the storage backend.
+
+The spider bulk-loads every known deal URL and dealid once when it opens,
+from the backend chosen with STORAGE_BACKEND (see storage.py), and checks
+this index instead of querying the database per deal. Keys are stored as
+64-bit BLAKE2b digests, either in an exact set or, when
+KNOWN_DEALS_BLOOM_FP_RATE is set, in a Bloom filter sized for that
+false-positive rate (a false positive makes a new deal look known).
+"""
+import math
+import os
+import time
+import hashlib
+import logging
+
+from dealnews_scraper.storage import storage_backend
+
+
+def _digest(kind, value):
+    data = f'{kind}:{value}'.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit digests (double hashing)"""
+
+    def __init__(self, capacity, fp_rate):
+        capacity = max(int(capacity), 1)
+        self.size = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        h1 = digest & 0xFFFFFFFF
+        h2 = (digest >> 32) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest):
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+
+class KnownDealIndex:
+    """Set of known deal URLs and dealids, exact or probabilistic"""
+
+    def __init__(self, bloom_fp_rate=0.0, capacity=100000):
+        self.bloom_fp_rate = bloom_fp_rate
+        self.count = 0
+        # Each deal contributes two keys (url and dealid)
+        self._keys = BloomFilter(capacity * 2, bloom_fp_rate) if bloom_fp_rate else set()
+
+    def add(self, url='', dealid=''):
+        if url:
+            self._keys.add(_digest('url', url))
+        if dealid:
+            self._keys.add(_digest('id', dealid))
+        self.count += 1
+
+    def contains_url(self, url):
+        return bool(url) and _digest('url', url) in self._keys
+
+    def contains_dealid(self, dealid):
+        return bool(dealid) and _digest('id', dealid) in self._keys
+
+    @classmethod
+    def from_storage(cls, storage, bloom_fp_rate=0.0, batch_size=10000):
+        """Stream every stored (url, dealid) into a new index"""
+        total = storage.count_deals()
+        # Leave headroom for deals added during this run
+        index = cls(bloom_fp_rate=bloom_fp_rate, capacity=max(total * 2, 100000))
+        for url, dealid in storage.iter_deals(batch_size):
+            index.add(url, dealid)
+        return index
+
+    @classmethod
+    def preload(cls, bloom_fp_rate=0.0, logger=None, storage=None):
+        """Load the index from the storage backend, or return an empty one if it is unavailable"""
+        logger = logger or logging.getLogger(__name__)
+        storage = storage or storage_backend()
+        if storage.name == 'mysql' and os.getenv('DISABLE_MYSQL', 'false').lower() in ('1', 'true', 'yes'):
+            return cls(bloom_fp_rate=bloom_fp_rate)
+        start = time.time()
+        try:
+            index = cls.from_storage(storage, bloom_fp_rate=bloom_fp_rate)
+        except storage.Error as err:
+            logger.warning(f"Could not preload known deals from {storage.describe()}, treating all deals as new: {err}")
+            return cls(bloom_fp_rate=bloom_fp_rate)
+        logger.info(f"Preloaded {index.count} known deals from {storage.describe()} in {time.time() - start:.2f}s")
+        return index
@@ -1,15 +1,22 @@
 import os
+import time
 import base64
 import random
+import sqlite3
 import hashlib
+import logging
 from urllib.parse import urlparse
-from typing import List, Optional
+from typing import Optional
 from dotenv import load_dotenv
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+from dealnews_scraper.proxy_pool import ProxyPool, detect_soft_ban, proxy_key
 
 load_dotenv()
 
 class ProxyMiddleware:
-    def __init__(self):
+    def __init__(self, pool: ProxyPool):
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15",
@@ -17,22 +24,14 @@ class ProxyMiddleware:
             "Mozilla/5.0 (iPhone; CPU iPhone OS 16_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Mobile/15E148 Safari/604.1",
             "Mozilla/5.0 (iPad; CPU OS 16_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Mobile/15E148 Safari/604.1",
         ]
-
-        # Optional explicit proxy pool (comma or newline separated)
-        raw_list = os.getenv("PROXY_LIST", "").strip()
-        self.proxy_pool: List[str] = []
-        if raw_list:
-            for line in raw_list.replace("\r", "\n").split("\n"):
-                line = line.strip().strip(',')
-                if not line:
-                    continue
-                if not line.startswith("http://") and not line.startswith("https://"):
-                    line = f"http://{line}"
-                self.proxy_pool.append(line)
+        # Parsed once from PROXY_LIST or the PROXY_HOST/PROXY_PORT gateway
+        self.pool = pool
 
     @classmethod
     def from_crawler(cls, crawler):
-        return cls()
+        pool = ProxyPool.from_env(crawler.settings, logger=logging.getLogger(__name__))
+        pool.stats = crawler.stats
+        return cls(pool)
 
     def process_request(self, request, spider):
         # Rotate UA on every request
@@ -40,61 +39,201 @@ class ProxyMiddleware:
         request.headers.setdefault('Accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8')
         request.headers.setdefault('Accept-Language', 'en-US,en;q=0.9')
 
-        # Check if proxy should be disabled (for local testing)
-        if os.getenv('DISABLE_PROXY', '').lower() in ('1', 'true', 'yes'):
-            spider.logger.debug("Proxy disabled for local testing")
+        # No proxies configured, or disabled for local testing
+        if not self.pool:
             return None
-            
+
         # Skip robots.txt requests to avoid proxy auth issues
         if 'robots.txt' in request.url:
             spider.logger.debug(f"Skipping robots.txt request: {request.url}")
             return None
-            
-        # Proxy selection
-        self._apply_proxy(request, spider)
+
+        # Proxy selection; a request coming back for a retry avoids its last proxy
+        self._apply_proxy(request, spider, force_rotate='proxy_key' in request.meta)
 
     def process_exception(self, request, exception, spider):
-        # On network errors/timeouts: rotate UA and proxy, then retry
-        spider.logger.warning(f"Request exception: {type(exception).__name__} for {request.url}; rotating proxy/UA and retrying")
-        request.headers['User-Agent'] = random.choice(self.user_agents)
-        self._apply_proxy(request, spider, force_rotate=True)
-        request.dont_filter = True
-        return request
+        # Network errors/timeouts count against the proxy; BackoffRetryMiddleware
+        # retries them and the retry rotates proxy/UA in process_request
+        spider.logger.warning(f"Request exception: {type(exception).__name__} for {request.url} via {request.meta.get('proxy_key')}")
+        self.pool.record_failure(request.meta.get('proxy_key'), 'exception')
+        return None
 
     def process_response(self, request, response, spider):
-        # Handle 429 Too Many Requests by rotating proxy and retrying
-        if response.status == 429:
-            spider.logger.info(f"Received 429 for {request.url}. Rotating proxy and retrying.")
-            self._apply_proxy(request, spider, force_rotate=True)
-            request.dont_filter = True
-            return request
+        key = request.meta.get('proxy_key')
+        ban = detect_soft_ban(request, response) if key else None
+
+        if response.status == 429 or ban:
+            reason = ban or '429'
+            spider.logger.info(f"Received {reason} for {request.url} via {key}. Rotating proxy on retry.")
+            self.pool.record_failure(key, reason)
+            # 403/429 are in RETRY_HTTP_CODES; flag soft-banned 200s for a retry too
+            if ban in ('captcha', 'empty_listing'):
+                request.meta['soft_ban'] = f'soft ban ({ban})'
+            return response
+
+        if response.status < 500:
+            self.pool.record_success(key, request.meta.get('download_latency'))
+        else:
+            self.pool.record_failure(key, str(response.status))
         return response
 
     def _apply_proxy(self, request, spider, force_rotate: bool = False):
-        proxy_user = os.getenv("PROXY_USER")
-        proxy_pass = os.getenv("PROXY_PASS")
-        proxy_auth_header: Optional[str] = None
-
-        # Debug proxy configuration
-        if not proxy_user or not proxy_pass:
-            spider.logger.warning("Proxy credentials not found - running without proxy")
-            return
-
-        # Prefer explicit proxy pool if provided
-        if self.proxy_pool:
-            proxy = random.choice(self.proxy_pool)
-            spider.logger.debug(f"Using proxy from pool: {proxy}")
-        else:
-            # Webshare rotating gateway
-            proxy_host = os.getenv("PROXY_HOST", "p.webshare.io")
-            proxy_port = os.getenv("PROXY_PORT", "80")
-            proxy = f"http://{proxy_host}:{proxy_port}"
-
-        if proxy_user and proxy_pass:
-            # For Webshare proxy, use the credentials in the URL
-            proxy = f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}"
-
-        prior_proxy = request.meta.get('proxy')
-        if force_rotate or prior_proxy != proxy:
-            request.meta['proxy'] = proxy
-            spider.logger.info(f"Using proxy {proxy}")
+        previous = request.meta.get('proxy_key')
+        proxy = self.pool.choose(exclude=previous if force_rotate else None)
+        request.meta['proxy'] = proxy
+        request.meta['proxy_key'] = proxy_key(proxy)
+        spider.logger.debug(f"Using proxy {request.meta['proxy_key']}")
+
+
+class ConditionalGetMiddleware:
+    """Incremental crawling backed by a local HTTP validator cache.
+
+    Enabled with INCREMENTAL_CRAWL=true. For every URL the cache keeps the
+    ETag, Last-Modified, Cache-Control expiry and a SHA-1 of the body. On the
+    next run requests carry If-None-Match/If-Modified-Since; 304 responses and
+    bodies identical to the cached hash are dropped before parsing, and URLs
+    still fresh per max-age are not requested at all.
+
+    New validators are held in memory and only written when the spider
+    closes with reason `finished` and no storage batch was lost, so a page
+    whose items never reached the database is fetched and parsed again.
+    """
+
+    def __init__(self, stats, cache_path: str):
+        self.stats = stats
+        self.cache_path = cache_path
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # Shared by sharded worker processes: WAL plus a long busy timeout
+        self.db = sqlite3.connect(cache_path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                body_size INTEGER,
+                fetched_at REAL,
+                expires_at REAL
+            )
+        """)
+        self.db.commit()
+        # url -> validators of a 200 response, written on a clean close
+        self.pending = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if os.getenv('INCREMENTAL_CRAWL', 'false').lower() not in ('1', 'true', 'yes'):
+            raise NotConfigured
+        middleware = cls(crawler.stats, os.getenv('HTTP_VALIDATOR_CACHE', 'exports/http_validators.sqlite'))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.spider_error, signal=signals.spider_error)
+        return middleware
+
+    def spider_error(self, failure, response, spider):
+        # The callback failed, so the page's items may be incomplete
+        self.pending.pop(response.url, None)
+
+    def spider_closed(self, spider, reason):
+        if self.pending:
+            if reason == 'finished' and not self._items_lost():
+                self.db.executemany("""
+                    INSERT OR REPLACE INTO validators
+                        (url, etag, last_modified, body_hash, body_size, fetched_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [(url,) + validators for url, validators in self.pending.items()])
+                self.db.commit()
+                self.stats.set_value('incremental/validators_saved', len(self.pending))
+            else:
+                spider.logger.warning(f"Discarding {len(self.pending)} new validators "
+                                      f"(close reason {reason!r} or storage errors); those pages will be refetched")
+                self.stats.set_value('incremental/validators_discarded', len(self.pending))
+            self.pending.clear()
+        self.db.close()
+
+    def _items_lost(self) -> bool:
+        """Whether a storage batch was dead-lettered or dropped, or a bulk load failed"""
+        return any(key.endswith(('/batch/dead_letter_rows', '/batch/dropped_rows')) or key == 'bulk/load_failed'
+                   for key in self.stats.get_stats())
+
+    def _lookup(self, url: str):
+        return self.db.execute(
+            "SELECT etag, last_modified, body_hash, body_size, expires_at FROM validators WHERE url = ?",
+            (url,)
+        ).fetchone()
+
+    def process_request(self, request, spider):
+        if request.method != 'GET':
+            return None
+        cached = self._lookup(request.url)
+        if not cached:
+            return None
+        etag, last_modified, _, body_size, expires_at = cached
+
+        # Still fresh per the last response's max-age: skip the download entirely
+        if expires_at and expires_at > time.time():
+            self.stats.inc_value('incremental/proxy_requests_saved')
+            self.stats.inc_value('incremental/bytes_saved', body_size or 0)
+            raise IgnoreRequest(f"Fresh in validator cache: {request.url}")
+
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        if etag or last_modified:
+            self.stats.inc_value('incremental/conditional_requests')
+        return None
+
+    def process_response(self, request, response, spider):
+        if request.method != 'GET':
+            return response
+
+        if response.status == 304:
+            cached = self._lookup(request.url)
+            self.db.execute(
+                "UPDATE validators SET fetched_at = ?, expires_at = ? WHERE url = ?",
+                (time.time(), self._expires_at(response), request.url)
+            )
+            self.db.commit()
+            self.stats.inc_value('incremental/not_modified')
+            self.stats.inc_value('incremental/bytes_saved', (cached[3] if cached else 0) or 0)
+            raise IgnoreRequest(f"Not modified: {request.url}")
+
+        if response.status != 200:
+            return response
+
+        body_hash = hashlib.sha1(response.body).hexdigest()
+        cached = self._lookup(request.url)
+        self.pending[request.url] = (
+            self._header(response, 'ETag'),
+            self._header(response, 'Last-Modified'),
+            body_hash,
+            len(response.body),
+            time.time(),
+            self._expires_at(response)
+        )
+
+        # Server ignored the validators but the content did not change
+        if cached and cached[2] == body_hash:
+            self.stats.inc_value('incremental/unchanged_body')
+            raise IgnoreRequest(f"Body unchanged since last run: {request.url}")
+
+        return response
+
+    @staticmethod
+    def _header(response, name: str) -> Optional[str]:
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+    def _expires_at(self, response) -> Optional[float]:
+        """Absolute expiry from Cache-Control max-age, if the response allows caching"""
+        cache_control = (self._header(response, 'Cache-Control') or '').lower()
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return None
+        for directive in cache_control.split(','):
+            name, _, value = directive.strip().partition('=')
+            if name in ('s-maxage', 'max-age') and value.isdigit() and int(value) > 0:
+                return time.time() + int(value)
+        return None
@@ -0,0 +1,288 @@
+"""
+Versioned schema migrations: the one definition of the MySQL schema.
+
+Each migration runs once per database and is recorded in `schema_version`.
+The MySQL storage backend, the bulk loader and setup_laradock_db.py call `migrate()`;
+on an up-to-date database that is a single SELECT. Migrations are idempotent
+(every step checks information_schema first), so a run interrupted half-way
+is completed by the next one. Concurrent workers serialize on a named lock.
+
+    python -m dealnews_scraper.migrations            # apply pending migrations
+    python -m dealnews_scraper.migrations status     # applied / pending versions
+
+Add a migration by appending a `step(conn, cursor)` function to MIGRATIONS
+(its docstring is the recorded description); never edit one that has shipped.
+"""
+import sys
+import logging
+import argparse
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from dealnews_scraper import compaction, history
+from dealnews_scraper.compaction import has_column, has_index
+from dealnews_scraper.dimensions import DIMENSION_TABLES, create_dimension_table
+
+LOCK_NAME = 'dealnews_migrations'
+LOCK_TIMEOUT = 300
+
+# Deals are keyed on this hash rather than the URL itself. LOWER() keeps the
+# case-insensitive matching of the old UNIQUE (url) key.
+URL_HASH = "UNHEX(MD5(LOWER(%s)))"
+
+
+def ensure_column(cursor, table, column, alter_clause):
+    """Add a column to a table created by an older schema version"""
+    if not has_column(cursor, table, column):
+        logging.info(f"Adding column {table}.{column}")
+        cursor.execute(f"ALTER TABLE {table} {alter_clause}")
+
+
+def drop_index(cursor, table, index):
+    """Drop an index left behind by an older schema version"""
+    if has_index(cursor, table, index):
+        logging.info(f"Dropping index {table}.{index}")
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+
+
+def drop_unique_index(cursor, table, column):
+    """Drop any single-column UNIQUE index on `column`"""
+    cursor.execute("""
+        SELECT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0
+        GROUP BY INDEX_NAME HAVING COUNT(*) = 1 AND MAX(COLUMN_NAME) = %s
+    """, (table, column))
+    for (index,) in cursor.fetchall():
+        drop_index(cursor, table, index)
+
+
+def m001_baseline(conn, cursor):
+    """Tables as MySQLPipeline created them, upgrading older layouts"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deals (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            dealid VARCHAR(100),
+            recid VARCHAR(100),
+            url VARCHAR(500) UNIQUE,
+            title TEXT,
+            price VARCHAR(100),
+            price_cents INT UNSIGNED,
+            original_price_cents INT UNSIGNED,
+            discount_pct DECIMAL(5,2),
+            currency CHAR(3),
+            promo VARCHAR(255),
+            category VARCHAR(100),
+            category_id INT UNSIGNED,
+            store VARCHAR(100),
+            store_id INT UNSIGNED,
+            deal VARCHAR(255),
+            dealplus VARCHAR(255),
+            deallink VARCHAR(500),
+            dealtext VARCHAR(255),
+            dealhover VARCHAR(255),
+            published VARCHAR(100),
+            published_at DATETIME,
+            popularity VARCHAR(50),
+            staffpick VARCHAR(50),
+            detail TEXT,
+            raw_html TEXT,
+            page_hash CHAR(40),
+            content_hash CHAR(40),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+            INDEX idx_dealid (dealid),
+            INDEX idx_category (category),
+            INDEX idx_store (store),
+            INDEX idx_created_at (created_at),
+            INDEX idx_page_hash (page_hash),
+            INDEX idx_category_id_price (category_id, price_cents),
+            INDEX idx_store_id_discount (store_id, discount_pct),
+            INDEX idx_published_at (published_at)
+        )
+    """)
+    # The old setup_laradock_db.py table made dealid UNIQUE; a deal id is not a key
+    drop_unique_index(cursor, 'deals', 'dealid')
+    ensure_column(cursor, 'deals', 'page_hash',
+                  "ADD COLUMN page_hash CHAR(40) AFTER raw_html, ADD INDEX idx_page_hash (page_hash)")
+    ensure_column(cursor, 'deals', 'content_hash', "ADD COLUMN content_hash CHAR(40) AFTER page_hash")
+    # Rows stored before the typed price columns: `python -m dealnews_scraper.backfill prices`
+    ensure_column(cursor, 'deals', 'price_cents', """
+        ADD COLUMN price_cents INT UNSIGNED AFTER price,
+        ADD COLUMN original_price_cents INT UNSIGNED AFTER price_cents,
+        ADD COLUMN discount_pct DECIMAL(5,2) AFTER original_price_cents,
+        ADD COLUMN currency CHAR(3) AFTER discount_pct
+    """)
+    # The string prefix index on price cannot serve range queries
+    drop_index(cursor, 'deals', 'idx_price')
+    # Backfill with `... backfill published_at`
+    ensure_column(cursor, 'deals', 'published_at',
+                  "ADD COLUMN published_at DATETIME AFTER published, ADD INDEX idx_published_at (published_at)")
+
+    # Store/category dimension tables (rows stored before the keys: `... backfill dimensions`)
+    for table in DIMENSION_TABLES:
+        create_dimension_table(cursor, table)
+    history.create_history_table(cursor)
+    ensure_column(cursor, 'deals', 'store_id', """
+        ADD COLUMN category_id INT UNSIGNED AFTER category,
+        ADD COLUMN store_id INT UNSIGNED AFTER store,
+        ADD INDEX idx_category_id_price (category_id, price_cents),
+        ADD INDEX idx_store_id_discount (store_id, discount_pct)
+    """)
+    # Superseded by the key-based composite indexes above
+    drop_index(cursor, 'deals', 'idx_category_price')
+    drop_index(cursor, 'deals', 'idx_store_discount')
+
+    # Content-addressed page bodies (zlib-compressed, stored once per hash)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pages (
+            page_hash CHAR(40) PRIMARY KEY,
+            url VARCHAR(500),
+            body_zlib MEDIUMBLOB,
+            body_size INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deal_images (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            dealid VARCHAR(100),
+            imageurl VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_dealid (dealid)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deal_categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            dealid VARCHAR(100),
+            category_id INT UNSIGNED,
+            category_name VARCHAR(100),
+            category_url VARCHAR(500),
+            category_title VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_dealid (dealid),
+            INDEX idx_category_id (category_id)
+        )
+    """)
+    ensure_column(cursor, 'deal_categories', 'category_id',
+                  "ADD COLUMN category_id INT UNSIGNED AFTER dealid, ADD INDEX idx_category_id (category_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS related_deals (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            dealid VARCHAR(100),
+            relatedurl VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_dealid (dealid)
+        )
+    """)
+
+
+def m002_child_unique_keys(conn, cursor):
+    """(dealid, URL hash) unique keys on the child tables, compacting duplicates first"""
+    compaction.ensure_unique_keys(conn)
+
+
+def m003_deal_url_hash(conn, cursor):
+    """Key deals on a fixed-width url_hash instead of the 500-character url index"""
+    ensure_column(cursor, 'deals', 'url_hash',
+                  f"ADD COLUMN url_hash BINARY(16) AS ({URL_HASH % 'url'}) STORED AFTER url")
+    if not has_index(cursor, 'deals', 'uq_url_hash'):
+        # Old setup_laradock_db.py tables had no unique URL key; keep the latest row per URL
+        if not has_index(cursor, 'deals', 'idx_dedupe'):
+            cursor.execute("ALTER TABLE deals ADD INDEX idx_dedupe (url_hash)")
+        deleted = compaction.compact_deals(conn)
+        logging.info(f"Removed {deleted} duplicate deals rows")
+        cursor.execute("ALTER TABLE deals DROP INDEX idx_dedupe, ADD UNIQUE KEY uq_url_hash (url_hash)")
+    drop_unique_index(cursor, 'deals', 'url')
+
+
+MIGRATIONS = [
+    (1, m001_baseline),
+    (2, m002_child_unique_keys),
+    (3, m003_deal_url_hash),
+]
+
+
+def current_version(cursor):
+    """Highest applied version; 0 for a database that has never been migrated"""
+    try:
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except mysql.connector.Error as err:
+        if err.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        return 0
+    return cursor.fetchone()[0]
+
+
+def pending(cursor):
+    version = current_version(cursor)
+    return [(number, step) for number, step in MIGRATIONS if number > version]
+
+
+def migrate(conn):
+    """Apply pending migrations in order; returns the versions applied"""
+    cursor = conn.cursor()
+    applied = []
+    try:
+        if not pending(cursor):
+            return applied
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise mysql.connector.errors.OperationalError(
+                f"Timed out waiting for another process to finish migrating ({LOCK_NAME})")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255),
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Another worker may have migrated while this one waited for the lock
+            for number, step in pending(cursor):
+                description = step.__doc__.strip()
+                logging.info(f"Applying schema migration {number}: {description}")
+                step(conn, cursor)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                               (number, description[:255]))
+                conn.commit()
+                applied.append(number)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+    return applied
+
+
+def main(argv=None):
+    from dealnews_scraper.backfill import connect
+
+    parser = argparse.ArgumentParser(description="Apply or list MySQL schema migrations")
+    parser.add_argument('command', nargs='?', choices=('migrate', 'status'), default='migrate')
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == 'status':
+            cursor = conn.cursor()
+            version = current_version(cursor)
+            cursor.close()
+            print(f"📋 Schema version {version} of {MIGRATIONS[-1][0]}")
+            for number, step in MIGRATIONS:
+                print(f"   {'✅' if number <= version else '⏳'} {number:03d} {step.__doc__.strip()}")
+            return 0
+        applied = migrate(conn)
+        if applied:
+            print(f"✅ Applied migrations {', '.join(str(number) for number in applied)}")
+        else:
+            print("✅ Schema is up to date")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
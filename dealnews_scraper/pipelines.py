@@ -1,159 +1,95 @@
 import os
-import mysql.connector
+import time
+import zlib
 import logging
-from dealnews_scraper.items import DealnewsItem, DealImageItem, DealCategoryItem, RelatedDealItem
+from twisted.internet import defer, reactor, task, threads
+from twisted.python.threadpool import ThreadPool
+from dealnews_scraper.batching import WriteBehind
+from dealnews_scraper.prices import parse_prices
+from dealnews_scraper.storage import DEAL_COLUMNS, TABLE_COLUMNS, storage_backend
+from dealnews_scraper.items import DealnewsItem, DealImageItem, DealCategoryItem, RelatedDealItem, DealPageItem
 
-class MySQLPipeline:
-    """Pipeline for storing scraped items in MySQL database.
-    If MySQL connection fails, data will be saved to JSON files as a fallback.
+class StoragePipeline:
+    """Pipeline for storing scraped items through a storage backend (see storage.py).
+    If the store cannot be reached, data will be saved to JSON files as a fallback.
     """
     def open_spider(self, spider):
+        # MySQL unless STORAGE_BACKEND says otherwise
+        self.storage = storage_backend()
         try:
             # Check if MySQL is disabled
             disable_mysql = os.getenv('DISABLE_MYSQL', 'false').lower() in ('1', 'true', 'yes')
-            if disable_mysql:
+            if disable_mysql and self.storage.name == 'mysql':
                 logging.info("MySQL pipeline disabled by DISABLE_MYSQL flag")
                 spider.logger.info("MySQL pipeline disabled by DISABLE_MYSQL flag")
-                self.mysql_enabled = False
+                self.storage_enabled = False
                 return
             
-            self.mysql_enabled = True
-            spider.logger.info("MySQL pipeline enabled - attempting connection...")
+            self.storage_enabled = True
+            spider.logger.info(f"{self.storage.name} storage enabled - attempting connection...")
             self.save_html_snapshots = os.getenv('SAVE_HTML_SNAPSHOTS', 'false').lower() in ('1', 'true', 'yes')
             self.snapshots_dir = os.getenv('SNAPSHOTS_DIR', 'exports/html_snapshots')
             if self.save_html_snapshots and not os.path.isdir(self.snapshots_dir):
                 os.makedirs(self.snapshots_dir, exist_ok=True)
 
-            # Get MySQL connection settings from environment or use defaults
-            mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-            mysql_port = int(os.getenv('MYSQL_PORT', '3307'))  # Use port 3307 as default
-            mysql_user = os.getenv('MYSQL_USER', 'root')  # Use root user by default
-            mysql_password = os.getenv('MYSQL_PASSWORD', 'root')  # Use root password by default
-            mysql_database = os.getenv('MYSQL_DATABASE', 'dealnews')
-            
-            # Log the connection details for debugging
-            logging.info(f"Connecting to MySQL: {mysql_host}:{mysql_port} as {mysql_user} to database {mysql_database}")
-            spider.logger.info(f"Connecting to MySQL: {mysql_host}:{mysql_port} as {mysql_user} to database {mysql_database}")
+            logging.info(f"Connecting to {self.storage.describe()}")
+            spider.logger.info(f"Connecting to {self.storage.describe()}")
             
             try:
-                self.conn = mysql.connector.connect(
-                    host=mysql_host,
-                    port=mysql_port,
-                    user=mysql_user,
-                    password=mysql_password,
-                    database=mysql_database,
-                    # Additional connection parameters for reliability
-                    use_pure=True,  # Use the pure Python implementation
-                    connection_timeout=30,
-                    autocommit=True
-                )
-                logging.info("MySQL connection successful")
-                spider.logger.info("MySQL connection successful")
-            except mysql.connector.Error as err:
-                logging.error(f"MySQL connection error: {err}")
-                spider.logger.error(f"MySQL connection error: {err}")
-                # Try alternative connection without specifying port
-                try:
-                    logging.info("Trying alternative connection without port specification...")
-                    spider.logger.info("Trying alternative connection without port specification...")
-                    self.conn = mysql.connector.connect(
-                        host=mysql_host,
-                        user=mysql_user,
-                        password=mysql_password,
-                        database=mysql_database,
-                        use_pure=True,
-                        connection_timeout=30,
-                        autocommit=True
-                    )
-                    logging.info("Alternative MySQL connection successful")
-                    spider.logger.info("Alternative MySQL connection successful")
-                except mysql.connector.Error as err2:
-                    logging.error(f"Alternative MySQL connection also failed: {err2}")
-                    spider.logger.error(f"Alternative MySQL connection also failed: {err2}")
-                    spider.logger.error("MySQL pipeline will be disabled - data will be saved to JSON only")
-                    self.mysql_enabled = False
-                    return
-            
-            self.cursor = self.conn.cursor()
-            
-            # Create main deals table with all fields from PDF requirements
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS deals (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    dealid VARCHAR(100),
-                    recid VARCHAR(100),
-                    url VARCHAR(500) UNIQUE,
-                    title TEXT,
-                    price VARCHAR(100),
-                    promo VARCHAR(255),
-                    category VARCHAR(100),
-                    store VARCHAR(100),
-                    deal VARCHAR(255),
-                    dealplus VARCHAR(255),
-                    deallink VARCHAR(500),
-                    dealtext VARCHAR(255),
-                    dealhover VARCHAR(255),
-                    published VARCHAR(100),
-                    popularity VARCHAR(50),
-                    staffpick VARCHAR(50),
-                    detail TEXT,
-                    raw_html TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    
-                    INDEX idx_dealid (dealid),
-                    INDEX idx_category (category),
-                    INDEX idx_store (store),
-                    INDEX idx_created_at (created_at),
-                    INDEX idx_price (price(20))
-                )
-            """)
-            
-            # Create deal images table
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS deal_images (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    dealid VARCHAR(100),
-                    imageurl VARCHAR(500),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX idx_dealid (dealid)
-                )
-            """)
+                self.storage.connect()
+                logging.info("Storage connection successful")
+                spider.logger.info("Storage connection successful")
+            except self.storage.Error as err:
+                logging.error(f"Storage connection error: {err}")
+                spider.logger.error(f"Storage connection error: {err}")
+                spider.logger.error("Storage pipeline will be disabled - data will be saved to JSON only")
+                self.storage_enabled = False
+                return
             
-            # Create deal categories table
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS deal_categories (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    dealid VARCHAR(100),
-                    category_name VARCHAR(100),
-                    category_url VARCHAR(500),
-                    category_title VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX idx_dealid (dealid)
-                )
-            """)
+            # Schema and dimension caches; writes then run one batch at a time
+            self.storage.prepare()
+            self.stored_pages = set()
+            # Batches that cannot be written go to a TSV spool (see _dead_letter)
+            self.dead_letters = None
+            logging.info("Storage connection established and schema up to date.")
             
-            # Create related deals table
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS related_deals (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    dealid VARCHAR(100),
-                    relatedurl VARCHAR(500),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    INDEX idx_dealid (dealid)
-                )
-            """)
+            # Write-behind buffers: rows are flushed together, one transaction per batch.
+            # The backend supplies the INSERT/upsert statement of each table.
+            self.writes = WriteBehind(
+                self.storage.table_buffers(),
+                batch_size=int(os.getenv('MYSQL_BATCH_SIZE', '200')),
+                flush_interval=int(os.getenv('MYSQL_FLUSH_INTERVAL_MS', '1000')) / 1000,
+                stats=spider.crawler.stats,
+                prefix=self.storage.name,
+            )
+            self.spider = spider
             
-            self.conn.commit()
-            logging.info("MySQL connection established and all tables ensured.")
-        except mysql.connector.Error as err:
-            logging.error(f"MySQL connection error: {err}")
+            # Asynchronous mode: batches are written by a bounded pool of writer threads,
+            # so DB round trips never block the reactor.
+            # process_item returns a Deferred while MYSQL_MAX_PENDING_FLUSHES batches are
+            # in flight, which holds back the scraper (and with it the downloader).
+            self.writer_pool = None
+            self.inflight = set()
+            self.waiters = []
+            self.max_pending = 1
+            if os.getenv('MYSQL_ASYNC_WRITES', 'true').lower() in ('1', 'true', 'yes'):
+                writer_threads = int(os.getenv('MYSQL_WRITER_THREADS', '2'))
+                self.max_pending = int(os.getenv('MYSQL_MAX_PENDING_FLUSHES', str(writer_threads * 2)))
+                self.writer_pool = ThreadPool(minthreads=1, maxthreads=writer_threads, name=f'{self.storage.name}-writer')
+                self.writer_pool.start()
+                spider.logger.info(f"{self.storage.name} writes off the reactor thread: {writer_threads} writer threads, "
+                                   f"up to {self.max_pending} pending flushes")
+            # Flush on time as well as on size, so a slow crawl does not hold rows back
+            self.flush_timer = task.LoopingCall(self._flush_if_due)
+            self.flush_timer.start(self.writes.flush_interval, now=False)
+        except self.storage.Error as err:
+            logging.error(f"Storage error: {err}")
             raise
 
     def process_item(self, item, spider):
         try:
-            # Skip processing if MySQL is disabled
-            if not getattr(self, 'mysql_enabled', True):
+            # Skip processing if storage is disabled
+            if not getattr(self, 'storage_enabled', True):
                 return item
                 
             if isinstance(item, DealnewsItem):
@@ -165,189 +101,288 @@ class MySQLPipeline:
                     logging.warning(f"Skipping deal missing title/price: {item.get('url')}")
                     return item
                 
+                # Process the main deal item
+                self.process_deal_item(item, spider)
+            
+            elif isinstance(item, DealPageItem):
                 # Save HTML snapshot if enabled
                 if self.save_html_snapshots:
                     self._persist_html_snapshot(item)
                 
-                # Process the main deal item
                 try:
-                    self.process_deal_item(item, spider)
-                except mysql.connector.Error as err:
-                    if err.errno == 1062:  # Duplicate entry error
-                        logging.info(f"Deal already exists (duplicate): {item.get('url')}")
-                    else:
-                        # Try to reconnect if connection lost
-                        if err.errno == 2006:  # MySQL server has gone away
-                            logging.warning("MySQL connection lost, attempting to reconnect...")
-                            self._reconnect()
-                            # Try again after reconnection
-                            self.process_deal_item(item, spider)
-                        else:
-                            logging.error(f"MySQL error processing deal: {err}")
-                            raise
+                    self.process_page_item(item, spider)
+                except self.storage.Error as err:
+                    logging.error(f"Error inserting page: {err}")
             
             # Process related items
             elif isinstance(item, DealImageItem):
                 try:
                     self.process_image_item(item, spider)
-                except mysql.connector.Error as err:
+                except self.storage.Error as err:
                     logging.error(f"Error inserting image: {err}")
             
             elif isinstance(item, DealCategoryItem):
                 try:
                     self.process_category_item(item, spider)
-                except mysql.connector.Error as err:
+                except self.storage.Error as err:
                     logging.error(f"Error inserting category: {err}")
             
             elif isinstance(item, RelatedDealItem):
                 try:
                     self.process_related_item(item, spider)
-                except mysql.connector.Error as err:
+                except self.storage.Error as err:
                     logging.error(f"Error inserting related deal: {err}")
         
+            if self.writes.due():
+                self.flush(spider)
+            
+            if len(self.inflight) >= self.max_pending:
+                # Writers are behind: hand the item back only once a flush completes
+                spider.crawler.stats.inc_value(f'{self.storage.name}/async/backpressure_waits')
+                waiter = defer.Deferred()
+                waiter.addCallback(lambda _: item)
+                self.waiters.append(waiter)
+                return waiter
+        
         except Exception as e:
             logging.error(f"Unexpected error processing item: {e}")
         
         return item
+    
+    def flush(self, spider):
+        """Write every buffered row in one transaction; returns a Deferred"""
+        batch = self.writes.take()
+        if not batch:
+            return defer.succeed(None)
+        if self.writer_pool is None:
+            try:
+                result = self._write_batch(batch)
+            except Exception as err:
+                self._flush_failed(err, batch, spider)
+            else:
+                self._flushed(result, batch, spider)
+            return defer.succeed(None)
         
-    def _reconnect(self):
-        """Reconnect to MySQL if connection is lost"""
+        d = threads.deferToThreadPool(reactor, self.writer_pool, self._write_batch, batch)
+        self.inflight.add(d)
+        spider.crawler.stats.max_value(f'{self.storage.name}/async/pending_flushes_max', len(self.inflight))
+        d.addCallbacks(self._flushed, self._flush_failed,
+                       callbackArgs=(batch, spider), errbackArgs=(batch, spider))
+        d.addBoth(self._release_writer, d)
+        return d
+    
+    def _write_batch(self, batch):
+        """Classify, resolve keys and write a batch (runs in a writer thread in async mode)"""
+        return self.storage.write_batch(self.writes, batch)
+    
+    def _flushed(self, result, batch, spider):
+        affected, seconds, deal_counts = result
+        if batch:
+            self.writes.record(batch, seconds)
+        # Rows each table actually gained; the rest were already stored
+        stats = spider.crawler.stats
+        prefix = self.storage.name
+        stats.inc_value(f'{prefix}/growth/deals', deal_counts['new'])
+        for table, rows in affected.items():
+            if table != 'deals':
+                stats.inc_value(f'{prefix}/growth/{table}', rows)
+                stats.inc_value(f'{prefix}/duplicates/{table}', len(batch[table]) - rows)
+        points = deal_counts.pop('price_points')
+        if points:
+            stats.inc_value(f'{prefix}/history/points', points)
+        if any(deal_counts.values()):
+            for key, value in deal_counts.items():
+                stats.inc_value(f'{prefix}/deals/{key}', value)
+            spider.logger.info(f"✅ NEW DEALS SAVED: {deal_counts['new']}, ♻️ CHANGED: {deal_counts['changed']}, "
+                               f"🔄 UNCHANGED SKIPPED: {deal_counts['unchanged']}")
+    
+    def _flush_failed(self, failure, batch, spider):
+        err = getattr(failure, 'value', failure)
+        rows = sum(len(table_rows) for table_rows in batch.values())
+        stats = spider.crawler.stats
+        prefix = self.storage.name
         try:
-            if hasattr(self, 'conn') and self.conn:
-                self.conn.close()
-            
-            # Get MySQL connection settings from environment
-            mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-            mysql_port = int(os.getenv('MYSQL_PORT', '3307'))
-            mysql_user = os.getenv('MYSQL_USER', 'root')
-            mysql_password = os.getenv('MYSQL_PASSWORD', 'root')
-            mysql_database = os.getenv('MYSQL_DATABASE', 'dealnews')
-            
-            logging.info(f"Reconnecting to MySQL: {mysql_host}:{mysql_port}")
-            self.conn = mysql.connector.connect(
-                host=mysql_host,
-                port=mysql_port,
-                user=mysql_user,
-                password=mysql_password,
-                database=mysql_database,
-                use_pure=True,
-                connection_timeout=30,
-                autocommit=True
-            )
-            self.cursor = self.conn.cursor()
-            logging.info("MySQL reconnection successful")
-        except mysql.connector.Error as err:
-            logging.error(f"Failed to reconnect to MySQL: {err}")
-            raise
+            directory = self._dead_letter(batch)
+        except OSError as e:
+            logging.error(f"Storage error flushing {rows} buffered rows, batch dropped: {err} "
+                          f"(dead-letter write failed: {e})")
+            stats.inc_value(f'{prefix}/batch/dropped_rows', rows)
+            return
+        logging.error(f"Storage error flushing {rows} buffered rows: {err}; batch kept in {directory}")
+        stats.inc_value(f'{prefix}/batch/dead_letter_rows', rows)
+        stats.set_value(f'{prefix}/batch/dead_letter_dir', directory)
+    
+    def _dead_letter(self, batch):
+        """Append a batch that could not be written to this run's TSV spool; returns its directory.
 
-    def _persist_html_snapshot(self, item: DealnewsItem):
+        The spool has the bulk loader's layout, so `python -m dealnews_scraper.bulk load DIR`
+        replays it into MySQL (without price history points).
+        """
+        if self.dead_letters is None:
+            # bulk.py imports this module
+            from dealnews_scraper.bulk import TsvSpool
+            directory = os.path.join(os.getenv('DEAD_LETTER_DIR', 'exports/dead_letter'),
+                                     f"{self.storage.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+            os.makedirs(directory, exist_ok=True)
+            self.dead_letters = TsvSpool(directory)
+        for table, rows in batch.items():
+            for row in rows:
+                self.dead_letters.add(table, row)
+        # On disk now, in case the process dies before close_spider
+        for handle in self.dead_letters.files.values():
+            handle.flush()
+        return self.dead_letters.directory
+    
+    def _release_writer(self, result, d):
+        self.inflight.discard(d)
+        while self.waiters and len(self.inflight) < self.max_pending:
+            self.waiters.pop(0).callback(None)
+        return result
+    
+    def _flush_if_due(self):
+        # Runs from a LoopingCall: an exception here would stop the timer
         try:
-            url = item.get('url', 'unknown')
-            # build deterministic filename
-            safe_name = (
-                url.replace('https://', '').replace('http://', '').replace('/', '_')
-            )
-            if len(safe_name) > 140:
-                safe_name = safe_name[:140]
-            filename = os.path.join(self.snapshots_dir, f"{safe_name}.html")
-            raw_html = item.get('raw_html', '') or ''
+            if self.writes.due():
+                self.flush(self.spider)
+        except Exception as e:
+            logging.error(f"Unexpected error flushing buffered rows: {e}")
+        
+    def _persist_html_snapshot(self, item: DealPageItem):
+        try:
+            # Content-addressed filename: one snapshot per distinct page body
+            filename = os.path.join(self.snapshots_dir, f"{item.get('page_hash', 'unknown')}.html")
+            if os.path.exists(filename):
+                return
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(raw_html)
+                f.write(item.get('body', '') or '')
             logging.info(f"Saved HTML snapshot: {filename}")
         except Exception as e:
             logging.warning(f"Failed to save HTML snapshot: {e}")
 
+    def process_page_item(self, item, spider):
+        """Store a page body once per content hash, zlib-compressed"""
+        page_hash = item.get('page_hash', '')
+        if not page_hash or page_hash in self.stored_pages:
+            return
+        body = (item.get('body', '') or '').encode('utf-8')
+        self.writes.add('pages', (
+            page_hash,
+            item.get('url', '')[:500],
+            zlib.compress(body, 6),
+            len(body)
+        ))
+        self.stored_pages.add(page_hash)
+        logging.info(f"Queued page {page_hash} ({len(body)} bytes)")
+
     def process_deal_item(self, item, spider):
-        """Process main deal item with deduplication"""
-        deal_url = item.get('url', '')
-        deal_title = item.get('title', 'Unknown')[:50]
+        """Queue a deal row; stored deals are rewritten at flush time only if their content changed"""
+        # Typed price/discount values for range queries
+        prices = parse_prices(item.get('price', ''), item.get('promo', ''))
         
-        # Check if deal already exists by URL (deduplication)
-        self.cursor.execute("SELECT id, title FROM deals WHERE url=%s", (deal_url,))
-        existing_deal = self.cursor.fetchone()
+        # Surrogate keys are resolved per batch at flush time (see KEY_SLOTS)
+        category_id = (item.get('category', ''), item.get('category_ref'))
+        store_id = (item.get('store', ''), item.get('store_ref'))
         
-        if existing_deal:
-            spider.logger.info(f"🔄 DUPLICATE SKIPPED: Deal already exists (ID: {existing_deal[0]}) - {deal_title}")
-            logging.info(f"Deal already exists, skipping: {deal_url}")
-            return
-        
-        # Insert new deal
-        try:
-            self.cursor.execute("""
-                INSERT INTO deals (
-                    dealid, recid, url, title, price, promo, category, store,
-                    deal, dealplus, deallink, dealtext, dealhover, published,
-                    popularity, staffpick, detail, raw_html
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                item.get('dealid', ''),
-                item.get('recid', ''),
-                item.get('url', ''),
-                item.get('title', ''),
-                item.get('price', ''),
-                item.get('promo', ''),
-                item.get('category', ''),
-                item.get('store', ''),
-                item.get('deal', ''),
-                item.get('dealplus', ''),
-                item.get('deallink', ''),
-                item.get('dealtext', ''),
-                item.get('dealhover', ''),
-                item.get('published', ''),
-                item.get('popularity', ''),
-                item.get('staffpick', ''),
-                item.get('detail', ''),
-                item.get('raw_html', '')
-            ))
-            self.conn.commit()
-            spider.logger.info(f"✅ NEW DEAL SAVED: {deal_title}")
-            logging.info(f"Inserted deal: {deal_title}")
-        except mysql.connector.Error as err:
-            if err.errno == 1062:  # Duplicate entry error (race condition)
-                spider.logger.info(f"🔄 DUPLICATE SKIPPED: Deal was inserted by another process - {deal_title}")
-                logging.info(f"Deal was inserted by another process, skipping: {deal_url}")
-            else:
-                raise
+        self.writes.add('deals', (
+            item.get('dealid', ''),
+            item.get('recid', ''),
+            item.get('url', ''),
+            item.get('title', ''),
+            item.get('price', ''),
+            prices['price_cents'],
+            prices['original_price_cents'],
+            prices['discount_pct'],
+            prices['currency'],
+            item.get('promo', ''),
+            item.get('category', ''),
+            category_id,
+            item.get('store', ''),
+            store_id,
+            item.get('deal', ''),
+            item.get('dealplus', ''),
+            item.get('deallink', ''),
+            item.get('dealtext', ''),
+            item.get('dealhover', ''),
+            item.get('published', ''),
+            item.get('published_at') or None,
+            item.get('popularity', ''),
+            item.get('staffpick', ''),
+            item.get('detail', ''),
+            item.get('raw_html', ''),
+            item.get('page_hash') or None,
+            item.get('content_hash') or None
+        ))
+        logging.info(f"Queued deal: {item.get('title', 'Unknown')[:50]}")
 
     def process_image_item(self, item, spider):
         """Process deal image item"""
-        self.cursor.execute("""
-            INSERT INTO deal_images (dealid, imageurl) VALUES (%s, %s)
-        """, (
+        self.writes.add('deal_images', (
             item.get('dealid', ''),
             item.get('imageurl', '')
         ))
-        self.conn.commit()
-        logging.info(f"Inserted image for deal {item.get('dealid', '')}")
+        logging.info(f"Queued image for deal {item.get('dealid', '')}")
 
     def process_category_item(self, item, spider):
         """Process deal category item"""
-        self.cursor.execute("""
-            INSERT INTO deal_categories (dealid, category_name, category_url, category_title) 
-            VALUES (%s, %s, %s, %s)
-        """, (
+        self.writes.add('deal_categories', (
             item.get('dealid', ''),
+            (item.get('category_name', ''), None),
             item.get('category_name', ''),
             item.get('category_url', ''),
             item.get('category_title', '')
         ))
-        self.conn.commit()
-        logging.info(f"Inserted category for deal {item.get('dealid', '')}")
+        logging.info(f"Queued category for deal {item.get('dealid', '')}")
 
     def process_related_item(self, item, spider):
         """Process related deal item"""
-        self.cursor.execute("""
-            INSERT INTO related_deals (dealid, relatedurl) VALUES (%s, %s)
-        """, (
+        self.writes.add('related_deals', (
             item.get('dealid', ''),
             item.get('relatedurl', '')
         ))
-        self.conn.commit()
-        logging.info(f"Inserted related deal for deal {item.get('dealid', '')}")
+        logging.info(f"Queued related deal for deal {item.get('dealid', '')}")
 
     def close_spider(self, spider):
-        if hasattr(self, 'cursor') and self.cursor:
-            self.cursor.close()
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
-        logging.info("MySQL connection closed.")
+        if getattr(self, 'flush_timer', None) is not None and self.flush_timer.running:
+            self.flush_timer.stop()
+        if getattr(self, 'writes', None) is None:
+            self._close_connections(spider)
+            return None
+        # Write what is left, wait for the writer threads, then close
+        self.flush(spider)
+        d = defer.DeferredList(list(self.inflight))
+        d.addBoth(lambda _: self._close_connections(spider))
+        return d
+
+    def _close_connections(self, spider):
+        waiters, self.waiters = getattr(self, 'waiters', []), []
+        for waiter in waiters:
+            waiter.callback(None)
+        if getattr(self, 'writer_pool', None) is not None:
+            self.writer_pool.stop()
+        storage = getattr(self, 'storage', None)
+        if storage is None:
+            return
+        if getattr(self, 'storage_enabled', False):
+            for key, value in storage.stats().items():
+                spider.crawler.stats.set_value(key, value)
+        growth = {table: spider.crawler.stats.get_value(f'{storage.name}/growth/{table}', 0) for table in TABLE_COLUMNS}
+        if any(growth.values()):
+            spider.logger.info("📈 Table growth this run: " + ", ".join(
+                f"{table} +{rows} ({spider.crawler.stats.get_value(f'{storage.name}/duplicates/{table}', 0)} duplicates skipped)"
+                if table != 'deals' else f"{table} +{rows}"
+                for table, rows in growth.items()
+            ))
+        storage.close()
+        logging.info("Storage connection closed.")
+        dead_letters = getattr(self, 'dead_letters', None)
+        if dead_letters is not None:
+            dead_letters.close()
+            message = (f"❌ {sum(dead_letters.counts.values())} rows could not be stored and were kept in "
+                       f"{dead_letters.directory} (TSV, one file per table)")
+            if storage.name == 'mysql':
+                message += f"; replay with: python -m dealnews_scraper.bulk load {dead_letters.directory}"
+            spider.logger.error(message)
+
+
+# Name used by existing ITEM_PIPELINES settings
+MySQLPipeline = StoragePipeline
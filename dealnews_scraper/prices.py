@@ -0,0 +1,86 @@
+"""
+Parse DealNews price and promo strings into typed values.
+
+`parse_prices(price, promo)` turns card text such as "$1,299.99",
+"$19.99 $39.99", "Save 40% off", "$20 off" or "was $49" into integer
+cents, a decimal discount percent and an ISO currency code. Recurring
+prices ("$0/mo. when you switch") are left without price_cents. Values that
+cannot be read reliably are returned as None rather than guessed; in
+particular an original price is never inferred from a percentage alone,
+since DealNews promos often describe coupons or extra discounts.
+"""
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+CURRENCY_SYMBOLS = {'$': 'USD', '£': 'GBP', '€': 'EUR'}
+
+_AMOUNT = re.compile(r'([$£€])\s?(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?')
+# "40% off", "Save 40%", "Take up to 15%" - not "20% faster"
+_PERCENT = re.compile(
+    r'(\d{1,2}(?:\.\d+)?|100)\s?%\s*off\b|\b(?:save|take)\s+(?:an\s+extra\s+|extra\s+|up\s+to\s+)?(\d{1,2}(?:\.\d+)?|100)\s?%',
+    re.IGNORECASE
+)
+_WAS = re.compile(r'\b(?:was|list|reg|regularly|orig|originally|msrp)\b\.?\s*(?=[$£€])', re.IGNORECASE)
+# "$0/mo." style subscription prices are not comparable with one-off prices
+_PERIODIC = re.compile(r'\s*(?:/\s*(?:mo|month|yr|year|wk|week)\b|(?:per|a)\s+(?:month|year|week)\b)', re.IGNORECASE)
+_AMOUNT_OFF = re.compile(r'(?:\bsave\s+(?=[$£€]))|(?:(?<=\d)\s+off\b)', re.IGNORECASE)
+
+
+def _cents(match):
+    whole = int(match.group(2).replace(',', ''))
+    fraction = (match.group(3) or '0').ljust(2, '0')
+    return whole * 100 + int(fraction)
+
+
+def parse_price(text):
+    """(cents, currency) of the first amount in `text`; "Free" is 0 cents"""
+    if not text:
+        return None, None
+    match = _AMOUNT.search(text)
+    if match:
+        if _PERIODIC.match(text, match.end()):
+            return None, None
+        return _cents(match), CURRENCY_SYMBOLS[match.group(1)]
+    if text.strip().lower().startswith('free'):
+        return 0, None
+    return None, None
+
+
+def parse_prices(price, promo=''):
+    """Typed price fields for a deal: price_cents, original_price_cents, discount_pct, currency"""
+    price = price or ''
+    promo = promo or ''
+    price_cents, currency = parse_price(price)
+
+    # "$19.99 $39.99": a larger second amount is the struck-through list price
+    original_cents = None
+    amounts = [_cents(match) for match in _AMOUNT.finditer(price)]
+    if price_cents is not None and len(amounts) > 1 and amounts[1] > price_cents:
+        original_cents = amounts[1]
+
+    if original_cents is None:
+        was = _WAS.search(promo)
+        if was:
+            match = _AMOUNT.search(promo, was.end())
+            original_cents = _cents(match) if match else None
+        elif price_cents and _AMOUNT_OFF.search(promo):
+            # "Save $20" / "$20 off" on top of the sale price
+            match = _AMOUNT.search(promo)
+            original_cents = price_cents + _cents(match) if match else None
+
+    discount_pct = None
+    percent = _PERCENT.search(promo) or _PERCENT.search(price)
+    if percent:
+        discount_pct = Decimal(percent.group(1) or percent.group(2)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    elif original_cents and price_cents is not None and original_cents > price_cents:
+        discount_pct = (Decimal(original_cents - price_cents) * 100 / original_cents).quantize(
+            Decimal('0.01'), ROUND_HALF_UP)
+
+    if currency is None and price_cents is not None:
+        _, currency = parse_price(promo)
+    return {
+        'price_cents': price_cents,
+        'original_price_cents': original_cents,
+        'discount_pct': discount_pct,
+        'currency': currency or ('USD' if price_cents is not None else None),
+    }
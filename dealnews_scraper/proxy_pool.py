@@ -0,0 +1,217 @@
+"""
+Proxy pool with health scoring and circuit breaking for ProxyMiddleware.
+
+The proxy configuration (PROXY_LIST or the PROXY_HOST/PROXY_PORT gateway,
+plus PROXY_USER/PROXY_PASS) is parsed once. Every proxy keeps an EWMA of its
+latency and success rate; proxies are picked at random weighted by that
+score. Repeated failures or a soft ban (captcha page, listing without deal
+cards, a burst of 403s) open the proxy's circuit for a cooldown that doubles
+on every consecutive trip. After the cooldown one trial request is let
+through (half-open); success closes the circuit again.
+"""
+import os
+import time
+import random
+from collections import deque
+from urllib.parse import urlparse
+
+# Lower-cased body markers of challenge / block pages
+BAN_MARKERS = (
+    b'captcha',
+    b'cf-chl-',
+    b'are you a robot',
+    b'access denied',
+    b'unusual traffic',
+)
+# Every DealNews listing page renders its deals as .content-card elements
+CARD_MARKER = b'content-card'
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def proxy_key(proxy_url):
+    """host:port of a proxy URL, without credentials (safe for logs and stats)"""
+    parsed = urlparse(proxy_url)
+    return f'{parsed.hostname}:{parsed.port or 80}'
+
+
+def detect_soft_ban(request, response):
+    """Reason string if a response looks like a block rather than real content"""
+    if response.status == 403:
+        return '403'
+    if response.status != 200:
+        return None
+    head = response.body[:20000].lower()
+    if any(marker in head for marker in BAN_MARKERS) and CARD_MARKER not in response.body:
+        return 'captcha'
+    if request.meta.get('url_type') == 'listing' and CARD_MARKER not in response.body:
+        return 'empty_listing'
+    return None
+
+
+class ProxyState:
+    """Health of one proxy endpoint"""
+
+    def __init__(self, url):
+        self.url = url
+        self.key = proxy_key(url)
+        self.latency = None
+        self.score = 1.0
+        self.failures = 0
+        self.trips = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.trial_pending = False
+        self.recent_403 = deque()
+
+    def weight(self):
+        # Favour proxies that succeed and answer quickly; never fully zero
+        latency = self.latency if self.latency is not None else 1.0
+        return max(self.score, 0.05) ** 2 / (1.0 + latency)
+
+
+class ProxyPool:
+    """Weighted, circuit-breaking selection over the configured proxies"""
+
+    def __init__(self, proxies, alpha=0.2, failure_threshold=5, cooldown=60.0,
+                 max_cooldown=1800.0, ban_403_burst=3, ban_403_window=60.0, stats=None):
+        self.proxies = [ProxyState(url) for url in proxies]
+        self.by_key = {proxy.key: proxy for proxy in self.proxies}
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.ban_403_burst = ban_403_burst
+        self.ban_403_window = ban_403_window
+        self.stats = stats
+
+    @classmethod
+    def from_env(cls, settings, logger=None):
+        """Build the pool from PROXY_* env vars; empty if proxies are off or unconfigured"""
+        if os.getenv('DISABLE_PROXY', '').lower() in ('1', 'true', 'yes'):
+            return cls([])
+        user = os.getenv('PROXY_USER')
+        password = os.getenv('PROXY_PASS')
+
+        entries = []
+        raw_list = os.getenv('PROXY_LIST', '').strip()
+        if raw_list:
+            for line in raw_list.replace('\r', '\n').replace(',', '\n').split('\n'):
+                line = line.strip()
+                if line:
+                    entries.append(line if line.startswith(('http://', 'https://')) else f'http://{line}')
+        else:
+            host = os.getenv('PROXY_HOST', 'p.webshare.io')
+            port = os.getenv('PROXY_PORT', '80')
+            entries.append(f'http://{host}:{port}')
+
+        proxies = []
+        for entry in entries:
+            parsed = urlparse(entry)
+            if parsed.username:
+                proxies.append(entry)
+            elif user and password:
+                proxies.append(f'{parsed.scheme}://{user}:{password}@{parsed.hostname}:{parsed.port or 80}')
+        if not proxies and logger:
+            logger.warning("Proxy credentials not found - running without proxy")
+
+        return cls(
+            proxies,
+            alpha=settings.getfloat('PROXY_EWMA_ALPHA', 0.2),
+            failure_threshold=settings.getint('PROXY_FAILURE_THRESHOLD', 5),
+            cooldown=settings.getfloat('PROXY_COOLDOWN', 60.0),
+            max_cooldown=settings.getfloat('PROXY_MAX_COOLDOWN', 1800.0),
+            ban_403_burst=settings.getint('PROXY_BAN_403_BURST', 3),
+            ban_403_window=settings.getfloat('PROXY_BAN_403_WINDOW', 60.0),
+        )
+
+    def __bool__(self):
+        return bool(self.proxies)
+
+    def _available(self, now):
+        available = []
+        for proxy in self.proxies:
+            if proxy.state == OPEN and proxy.open_until <= now:
+                # Cooldown over: allow one trial request
+                proxy.state = HALF_OPEN
+                self._publish(proxy)
+            if proxy.state == CLOSED or (proxy.state == HALF_OPEN and not proxy.trial_pending):
+                available.append(proxy)
+        return available
+
+    def choose(self, exclude=None):
+        """Pick a proxy URL by weighted score, avoiding open circuits and `exclude`"""
+        if not self.proxies:
+            return None
+        now = time.time()
+        candidates = self._available(now)
+        if exclude and len(candidates) > 1:
+            candidates = [proxy for proxy in candidates if proxy.key != exclude] or candidates
+        if not candidates:
+            # Every circuit is open: use the one closest to the end of its cooldown
+            self._inc('proxy_pool/all_open')
+            return min(self.proxies, key=lambda proxy: proxy.open_until if proxy.state == OPEN else now).url
+        proxy = random.choices(candidates, weights=[proxy.weight() for proxy in candidates])[0]
+        if proxy.state == HALF_OPEN:
+            proxy.trial_pending = True
+        return proxy.url
+
+    def record_success(self, key, latency=None):
+        proxy = self.by_key.get(key)
+        if proxy is None:
+            return
+        if latency is not None:
+            proxy.latency = latency if proxy.latency is None else self.alpha * latency + (1 - self.alpha) * proxy.latency
+        proxy.score = self.alpha + (1 - self.alpha) * proxy.score
+        proxy.failures = 0
+        proxy.trial_pending = False
+        if proxy.state == HALF_OPEN:
+            proxy.state = CLOSED
+            proxy.trips = 0
+            self._inc('proxy_pool/circuit_closed')
+        self._publish(proxy)
+
+    def record_failure(self, key, reason):
+        proxy = self.by_key.get(key)
+        if proxy is None:
+            return
+        now = time.time()
+        proxy.score = (1 - self.alpha) * proxy.score
+        proxy.failures += 1
+        proxy.trial_pending = False
+        self._inc(f'proxy_pool/{proxy.key}/failures/{reason}')
+
+        banned = reason in ('captcha', 'empty_listing')
+        if reason == '403':
+            proxy.recent_403.append(now)
+            while proxy.recent_403 and proxy.recent_403[0] < now - self.ban_403_window:
+                proxy.recent_403.popleft()
+            banned = len(proxy.recent_403) >= self.ban_403_burst
+
+        if banned or proxy.state == HALF_OPEN or proxy.failures >= self.failure_threshold:
+            self._trip(proxy, now, reason)
+        self._publish(proxy)
+
+    def _trip(self, proxy, now, reason):
+        proxy.trips += 1
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** (proxy.trips - 1))
+        proxy.state = OPEN
+        proxy.open_until = now + cooldown
+        proxy.failures = 0
+        proxy.recent_403.clear()
+        self._inc('proxy_pool/circuit_opened')
+        self._inc(f'proxy_pool/{proxy.key}/circuit_opened/{reason}')
+
+    def _inc(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(key)
+
+    def _publish(self, proxy):
+        if self.stats is None:
+            return
+        prefix = f'proxy_pool/{proxy.key}'
+        self.stats.set_value(f'{prefix}/score', round(proxy.score, 4))
+        self.stats.set_value(f'{prefix}/state', proxy.state)
+        if proxy.latency is not None:
+            self.stats.set_value(f'{prefix}/latency_ms', int(proxy.latency * 1000))
+        self.stats.set_value('proxy_pool/open_circuits', sum(p.state == OPEN for p in self.proxies))
@@ -0,0 +1,144 @@
+"""
+Retries with backoff and a crawl-wide budget.
+
+BackoffRetryMiddleware replaces Scrapy's RetryMiddleware. A retry is only
+issued while the request is below its RETRY_TIMES limit and the run is below
+its retry budget (RETRY_BUDGET_MIN plus RETRY_BUDGET_RATIO of all responses
+and download errors so far). The retry is not returned straight to the
+downloader: the failed attempt is dropped and the new request is handed to
+the engine after a jittered exponential backoff (or the server's Retry-After,
+if longer) via reactor.callLater, so waiting never holds a download slot or
+blocks the reactor. Give-ups are logged and counted under retry/gave_up/.
+"""
+import time
+import random
+import logging
+from email.utils import parsedate_to_datetime
+
+from twisted.internet import reactor
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.downloadermiddlewares.retry import RetryMiddleware, get_retry_request
+from scrapy.utils.response import response_status_message
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None"""
+    if not value:
+        return None
+    value = value.decode('latin-1') if isinstance(value, bytes) else value
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+    """RetryMiddleware with per-run budget and non-blocking jittered backoff"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 2.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 120.0)
+        self.retry_after_max = settings.getfloat('RETRY_AFTER_MAX', 300.0)
+        self.budget_min = settings.getint('RETRY_BUDGET_MIN', 50)
+        self.budget_ratio = settings.getfloat('RETRY_BUDGET_RATIO', 0.2)
+        self.attempts = 0
+        self.retries = 0
+        self.pending = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = super().from_crawler(crawler)
+        # Scrapy 2.11's RetryMiddleware.from_crawler returns cls(settings) without it
+        middleware.crawler = crawler
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_response(self, request, response, spider):
+        self.attempts += 1
+        if request.meta.get('dont_retry', False):
+            return response
+        # Soft bans are flagged by ProxyMiddleware on otherwise normal responses
+        reason = request.meta.pop('soft_ban', None)
+        if reason is None and response.status in self.retry_http_codes:
+            reason = response_status_message(response.status)
+        if reason is None:
+            return response
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if self._schedule_retry(request, reason, retry_after):
+            raise IgnoreRequest(f"Retry scheduled for {request.url} ({reason})")
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.attempts += 1
+        if not isinstance(exception, self.exceptions_to_retry) or request.meta.get('dont_retry', False):
+            return None
+        if self._schedule_retry(request, exception):
+            raise IgnoreRequest(f"Retry scheduled for {request.url} ({type(exception).__name__})")
+        return None
+
+    def _budget(self):
+        return self.budget_min + int(self.budget_ratio * self.attempts)
+
+    def _give_up(self, request, reason, why):
+        stats = self.crawler.stats
+        stats.inc_value('retry/gave_up')
+        stats.inc_value(f'retry/gave_up/{why}')
+        logger.warning(f"Gave up retrying {request.url} ({why}): {reason}")
+
+    def _schedule_retry(self, request, reason, retry_after=None):
+        """Queue a delayed retry; False if the request or the run is out of budget"""
+        if self.retries >= self._budget():
+            self._give_up(request, reason, 'run_budget')
+            return False
+        retry_request = get_retry_request(
+            request,
+            spider=self.crawler.spider,
+            reason=reason,
+            max_retry_times=request.meta.get('max_retry_times', self.max_retry_times),
+            priority_adjust=request.meta.get('priority_adjust', self.priority_adjust),
+        )
+        if retry_request is None:
+            self._give_up(request, reason, 'max_retries')
+            return False
+        self.retries += 1
+
+        # Equal jitter: half the exponential step fixed, half random
+        step = min(self.backoff_max, self.backoff_base * 2 ** (retry_request.meta['retry_times'] - 1))
+        delay = step / 2 + random.uniform(0, step / 2)
+        if retry_after is not None and min(retry_after, self.retry_after_max) > delay:
+            delay = min(retry_after, self.retry_after_max)
+            self.crawler.stats.inc_value('retry/retry_after_honoured')
+
+        stats = self.crawler.stats
+        stats.inc_value('retry/delayed')
+        stats.inc_value('retry/backoff_seconds', round(delay, 3))
+        stats.max_value('retry/max_backoff_seconds', round(delay, 3))
+        self.pending[id(retry_request)] = reactor.callLater(delay, self._release, retry_request)
+        return True
+
+    def _release(self, request):
+        self.pending.pop(id(request), None)
+        self.crawler.engine.crawl(request)
+
+    def spider_idle(self, spider):
+        # Keep the crawl open while backed-off retries are still waiting
+        if self.pending:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for call in self.pending.values():
+            if call.active():
+                call.cancel()
+                self.crawler.stats.inc_value('retry/gave_up')
+                self.crawler.stats.inc_value('retry/gave_up/shutdown')
+        self.pending.clear()
+        self.crawler.stats.set_value('retry/budget_used', self.retries)
+        self.crawler.stats.set_value('retry/budget_limit', self._budget())
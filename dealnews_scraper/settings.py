@@ -8,7 +8,9 @@ NEWSPIDER_MODULE = 'dealnews_scraper.spiders'
 ROBOTSTXT_OBEY = False
 # Increase delay to reduce rate limiting and play nice with the target site
 DOWNLOAD_DELAY = 3
-AUTOTHROTTLE_ENABLED = True
+# AutoThrottle would overwrite the per-proxy slot delays set by
+# ProxyThrottleMiddleware; re-enable it if PROXY_THROTTLE_ENABLED is False
+AUTOTHROTTLE_ENABLED = False
 AUTOTHROTTLE_START_DELAY = 5
 AUTOTHROTTLE_MAX_DELAY = 30
 AUTOTHROTTLE_TARGET_CONCURRENCY = 0.5
@@ -19,16 +21,67 @@ RANDOMIZE_DOWNLOAD_DELAY = True
 RETRY_ENABLED = True
 RETRY_TIMES = 6
 DOWNLOAD_TIMEOUT = 45
-CONCURRENT_REQUESTS = 8
+# Global ceiling only; each proxy slot is limited by the throttle below
+CONCURRENT_REQUESTS = 32
 CONCURRENT_REQUESTS_PER_DOMAIN = 4
 
+# Per-proxy adaptive throttle: every proxy endpoint gets its own download
+# slot whose delay/concurrency grow while it is healthy and back off on
+# 429s, ban statuses and errors (latency in seconds)
+PROXY_THROTTLE_ENABLED = True
+PROXY_THROTTLE_START_DELAY = 3
+PROXY_THROTTLE_MIN_DELAY = 0.5
+PROXY_THROTTLE_MAX_DELAY = 30
+PROXY_THROTTLE_START_CONCURRENCY = 1
+PROXY_THROTTLE_MAX_CONCURRENCY = 4
+PROXY_THROTTLE_TARGET_LATENCY = 5.0
+
+# Proxy health: EWMA smoothing, consecutive failures before a proxy's circuit
+# opens, base/max cooldown (seconds, doubles per consecutive trip) and the
+# number of 403s within the window that counts as a ban
+PROXY_EWMA_ALPHA = 0.2
+PROXY_FAILURE_THRESHOLD = 5
+PROXY_COOLDOWN = 60
+PROXY_MAX_COOLDOWN = 1800
+PROXY_BAN_403_BURST = 3
+PROXY_BAN_403_WINDOW = 60
+
+# Listing pages followed per section (page=2 is depth 1)
+PAGINATION_MAX_DEPTH = 5
+
+# Persistent request fingerprints: a request is skipped if it was fetched
+# less than its url_type's window (seconds) ago; 0 = only dedup within a run
+DUPEFILTER_CLASS = 'dealnews_scraper.dupefilters.PersistentDupeFilter'
+DUPEFILTER_STORE = 'exports/request_fingerprints.sqlite'
+DUPEFILTER_REVISIT_WINDOWS = {
+    'listing': 0,
+    'deal': 3 * 24 * 3600,
+    'default': 0,
+}
+
+# Shared multi-node queue (enabled by run.py when SHARED_QUEUE_URL is set):
+# seconds a claimed request stays leased before other nodes may take it
+SHARED_QUEUE_VISIBILITY_TIMEOUT = 300
+
+# Known-deal index preloaded at spider open: 0 keeps an exact hash set,
+# a rate such as 0.001 uses a Bloom filter with that false-positive rate
+KNOWN_DEALS_BLOOM_FP_RATE = 0.0
+
 DOWNLOADER_MIDDLEWARES = {
     # Use custom user-agent rotation inside ProxyMiddleware
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
+    # Acks shared-queue requests that never reach the downloader (no-op without SHARED_QUEUE_URL)
+    'dealnews_scraper.distributed.SharedQueueAckMiddleware': 50,
+    # Conditional GET / validator cache (only active with INCREMENTAL_CRAWL=true)
+    'dealnews_scraper.middlewares.ConditionalGetMiddleware': 400,
+    # Budgeted, backed-off retries; sees responses after ProxyMiddleware scored them
+    'dealnews_scraper.retry.BackoffRetryMiddleware': 405,
     'dealnews_scraper.middlewares.ProxyMiddleware': 410,
+    # Per-proxy download slots; must run after ProxyMiddleware picks the proxy
+    'dealnews_scraper.throttle.ProxyThrottleMiddleware': 415,
     # Ensure HttpProxyMiddleware is enabled so request.meta['proxy'] is respected
     'scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware': 420,
-    'scrapy.downloadermiddlewares.retry.RetryMiddleware': 550,
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
 }
 
 # Set a user agent to avoid being blocked
@@ -39,12 +92,29 @@ HTTPERROR_ALLOWED_CODES = [429]
 RETRY_HTTP_CODES = [500, 503, 504, 400, 403, 404, 408, 429]
 RETRY_PRIORITY_ADJUST = -1
 
+# Retry backoff (seconds): attempt n waits about RETRY_BACKOFF_BASE * 2**(n-1),
+# jittered and capped; a longer Retry-After is honoured up to RETRY_AFTER_MAX.
+# Retries per run are capped at RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO * attempts
+RETRY_BACKOFF_BASE = 2
+RETRY_BACKOFF_MAX = 120
+RETRY_AFTER_MAX = 300
+RETRY_BUDGET_MIN = 50
+RETRY_BUDGET_RATIO = 0.2
+
 ITEM_PIPELINES = {
-    'dealnews_scraper.pipelines.MySQLPipeline': 300,
+    'dealnews_scraper.pipelines.StoragePipeline': 300,
 }
 
 FEED_EXPORT_ENCODING = 'utf-8'
 
+# Items written to the feeds; full page bodies (DealPageItem) only go to the `pages` table
+FEED_ITEM_CLASSES = [
+    'dealnews_scraper.items.DealnewsItem',
+    'dealnews_scraper.items.DealImageItem',
+    'dealnews_scraper.items.DealCategoryItem',
+    'dealnews_scraper.items.RelatedDealItem',
+]
+
 # Export settings for JSON and CSV
 FEEDS = {
     'exports/deals.json': {
@@ -52,10 +122,12 @@ FEEDS = {
         'encoding': 'utf8',
         'store_empty': False,
         'indent': 2,
+        'item_classes': FEED_ITEM_CLASSES,
     },
     'exports/deals.csv': {
         'format': 'csv',
         'encoding': 'utf8',
         'store_empty': False,
+        'item_classes': FEED_ITEM_CLASSES,
     }
 }
@@ -0,0 +1,67 @@
+"""
+Frontier sharding for multi-process crawls (run.py --workers N).
+
+Every worker process gets the same SHARD_COUNT and its own SHARD_ID, and
+only crawls the requests its shard owns; PersistentDupeFilter drops the
+others as they are discovered (and the spider skips foreign start URLs).
+
+  section  A listing section (frontier.section_key), its next pages and the
+           deal pages linked from them belong to hash(section) % SHARD_COUNT.
+  hash     Every worker walks the listing pages to discover deals; a deal
+           page belongs to hash(url) % SHARD_COUNT, and the items of a
+           listing page are only emitted by the worker its URL hashes to.
+  start_url  Start URLs are partitioned by run.py; nothing is filtered.
+"""
+import hashlib
+
+from w3lib.url import canonicalize_url
+
+from dealnews_scraper.frontier import section_key
+
+SHARD_MODES = ('start_url', 'hash', 'section')
+
+
+def shard_of(key, shard_count):
+    """Stable across runs and processes (unlike hash()), so a key always lands on the same shard"""
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % shard_count
+
+
+class FrontierShard:
+    """Which requests and listing pages one worker of a sharded crawl is responsible for"""
+
+    def __init__(self, shard_id=0, shard_count=1, shard_by='start_url'):
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown SHARD_BY {shard_by!r}; expected one of {', '.join(SHARD_MODES)}")
+        self.shard_id = shard_id
+        self.shard_count = max(shard_count, 1)
+        self.shard_by = shard_by
+        self.enabled = self.shard_count > 1 and shard_by != 'start_url'
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            shard_id=settings.getint('SHARD_ID', 0),
+            shard_count=settings.getint('SHARD_COUNT', 1),
+            shard_by=settings.get('SHARD_BY', 'start_url'),
+        )
+
+    def _mine(self, key):
+        return shard_of(key, self.shard_count) == self.shard_id
+
+    def owns(self, request):
+        """Whether this worker should download the request"""
+        if not self.enabled:
+            return True
+        if self.shard_by == 'section':
+            # Next pages carry their section, deal pages the section they were found in
+            section = request.meta.get('pagination_section') or request.meta.get('listing_section')
+            return self._mine(section or section_key(request.url))
+        if request.meta.get('url_type') == 'listing':
+            return True
+        return self._mine(canonicalize_url(request.url))
+
+    def stores(self, response):
+        """Whether this worker emits the items of a listing page it parsed"""
+        if not self.enabled or self.shard_by == 'section':
+            return True
+        return self._mine(canonicalize_url(response.url))
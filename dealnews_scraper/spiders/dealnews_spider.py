@@ -1,9 +1,11 @@
 import scrapy
-import re
-import time
-from dealnews_scraper.items import DealnewsItem, DealImageItem, DealCategoryItem, RelatedDealItem
-from urllib.parse import urljoin, urlparse, parse_qs
-from datetime import datetime
+import hashlib
+from dealnews_scraper.items import DealnewsItem, DealImageItem, DealCategoryItem, RelatedDealItem, DealPageItem
+from dealnews_scraper.extractors import CardExtractor
+from dealnews_scraper.frontier import PaginationFrontier
+from dealnews_scraper.known_deals import KnownDealIndex
+from dealnews_scraper.sharding import FrontierShard
+from dealnews_scraper.timestamps import response_time, resolve_published, format_timestamp
 
 class DealnewsSpider(scrapy.Spider):
     name = "dealnews"
@@ -13,18 +15,71 @@ class DealnewsSpider(scrapy.Spider):
         "https://www.dealnews.com/online-stores/"
     ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Selectors are compiled once per spider and reused for every card
+        self.card_extractor = CardExtractor()
+        self.frontier = PaginationFrontier()
+        self.known_deals = KnownDealIndex()
+        self.shard = FrontierShard()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.frontier = PaginationFrontier.from_crawler(crawler)
+        spider.shard = FrontierShard.from_settings(crawler.settings)
+        crawler.signals.connect(spider.spider_opened, signal=scrapy.signals.spider_opened)
+        return spider
+
+    def start_requests(self):
+        for url in self.start_urls:
+            # start_request lets a shared scheduler seed each start URL only once
+            request = scrapy.Request(url, dont_filter=True, meta={'url_type': 'listing', 'start_request': True})
+            # dont_filter bypasses the dupefilter, so foreign shards are skipped here
+            if self.shard.owns(request):
+                yield request
+
+    def spider_opened(self, spider):
+        self.frontier.stats = self.crawler.stats
+        self.load_known_deals()
+
+    def load_known_deals(self):
+        """Bulk-load known deal URLs/dealids from the storage backend once instead of querying it per deal"""
+        self.known_deals = KnownDealIndex.preload(
+            bloom_fp_rate=self.settings.getfloat('KNOWN_DEALS_BLOOM_FP_RATE', 0.0),
+            logger=self.logger
+        )
+        self.crawler.stats.set_value('known_deals/loaded', self.known_deals.count)
+
+    def remember_deal(self, deal):
+        """Record an emitted deal so later pages treat it as known"""
+        self.known_deals.add(deal.get('url', ''), deal.get('dealid', ''))
+
+    def inc_stat(self, key):
+        if getattr(self, 'crawler', None):
+            self.crawler.stats.inc_value(key)
+
     def parse(self, response):
         self.logger.info(f"Parsing page: {response.url}")
         
         # Extract deals from current page
         deals = self.extract_deals(response)
         
+        # Store the full page once; deals reference it by hash
+        page_hash = self.page_hash(response)
+        # With SHARD_BY=hash every worker walks the listings but only one stores each page
+        store = self.shard.stores(response)
+        if deals and store:
+            yield self.create_page_item(response, page_hash)
+        
         for deal in deals:
             # Create main deal item
-            yield self.create_item(deal, response.text)
+            if store:
+                yield self.create_item(deal, page_hash)
+            self.remember_deal(deal)
             
             # Create image items if images found
-            if deal.get('images'):
+            if store and deal.get('images'):
                 for image_url in deal['images']:
                     image_item = DealImageItem()
                     image_item['dealid'] = deal.get('dealid', '')
@@ -32,7 +87,7 @@ class DealnewsSpider(scrapy.Spider):
                     yield image_item
             
             # Create category items if categories found
-            if deal.get('categories'):
+            if store and deal.get('categories'):
                 for category in deal['categories']:
                     category_item = DealCategoryItem()
                     category_item['dealid'] = deal.get('dealid', '')
@@ -48,21 +103,35 @@ class DealnewsSpider(scrapy.Spider):
                     related_item = RelatedDealItem()
                     related_item['dealid'] = deal.get('dealid', '')
                     related_item['relatedurl'] = related_url
-                    yield related_item
+                    if store:
+                        yield related_item
+                    
+                    # Known deals are never downloaded again
+                    if self.known_deals.contains_url(related_url):
+                        self.inc_stat('known_deals/requests_skipped')
+                        continue
                     
                     # Request the related deal page to parse full deal data
                     yield scrapy.Request(
                         url=related_url,
                         callback=self.parse_related_deal,
-                        meta={'original_dealid': deal.get('dealid', '')},
-                        dont_filter=True
+                        # Deduplicated across runs (and across shards) by PersistentDupeFilter
+                        meta={'original_dealid': deal.get('dealid', ''), 'url_type': 'deal',
+                              'listing_section': self.frontier.section_for(response)}
                     )
 
         # Handle pagination and infinite scroll
-        self.handle_pagination(response)
+        yield from self.handle_pagination(response, deals)
 
-    def handle_pagination(self, response):
+    def handle_pagination(self, response, deals):
         """Handle pagination and infinite scroll for DealNews"""
+        # Stop following a section once a page brings no new deal IDs
+        new_deals = self.frontier.record_deals(response, [deal.get('dealid', '') for deal in deals])
+        if not new_deals:
+            self.logger.info(f"No new deals on {response.url}; not following further pages")
+            return
+        
+        links = []
         # Look for "Load More" or "Show More" buttons
         load_more_selectors = [
             'button[class*="load"]',
@@ -81,34 +150,45 @@ class DealnewsSpider(scrapy.Spider):
                 # Try to find the URL for loading more content
                 href = load_more_btn.css('::attr(href)').get()
                 if href:
-                    yield response.follow(href, self.parse)
+                    links.append(href)
                     break
                 
                 # If it's a button, try to find data attributes
                 data_url = load_more_btn.css('::attr(data-url)').get()
                 if data_url:
-                    yield response.follow(data_url, self.parse)
+                    links.append(data_url)
                     break
         
-        # Also look for traditional pagination links
+        # Also look for traditional pagination links (bounded and deduplicated by the frontier)
         pagination_links = response.css('.pagination a::attr(href), .pager a::attr(href)').getall()
-        for link in pagination_links[:2]:  # Limit to 2 pages to avoid infinite loops
-            if link and 'page=' in link:
-                yield response.follow(link, self.parse)
+        links.extend(link for link in pagination_links if link and 'page=' in link)
+        
+        for link in links:
+            request = self.frontier.follow(response, link, self.parse)
+            if request:
+                yield request
 
     def extract_deals(self, response):
         deals = []
         
         # Use the correct DealNews selector based on actual HTML structure
-        deal_elements = response.css('.content-card')
+        deal_elements = self.card_extractor.select_cards(response)
         
         if deal_elements:
             self.logger.info(f"Found {len(deal_elements)} content cards")
+            # JSON-LD on the page is parsed once and shared by all cards
+            page_data = self.card_extractor.page_data(response)
+            # Relative "N hrs ago" ages are resolved against the server's Date header
+            rendered_at = response_time(response)
             
             # Process each element
             for element in deal_elements:
-                deal = self.extract_deal_from_element(element, response)
+                deal = self.extract_deal_from_element(element, response, page_data)
                 if deal and self.is_valid_deal(deal):
+                    self.record_field_sources(deal)
+                    deal['published_at'] = resolve_published(deal.get('published', ''), rendered_at)
+                    if deal.get('published'):
+                        self.inc_stat('published_at/resolved' if deal['published_at'] else 'published_at/unresolved')
                     deals.append(deal)
         
         self.logger.info(f"Total deals extracted: {len(deals)}")
@@ -122,213 +202,17 @@ class DealnewsSpider(scrapy.Spider):
             (deal.get('price') or deal.get('deal') or deal.get('store'))
         )
 
-    def extract_deal_from_element(self, element, response):
-        deal = {}
-        
-        # Extract deal ID from data attributes (based on HTML analysis)
-        deal['dealid'] = element.css('::attr(data-content-id)').get() or ''
-        
-        # Extract URL from data attributes or links
-        url = element.css('::attr(data-offer-url)').get()
-        if not url:
-            # Fallback to link href
-            url = element.css('a::attr(href)').get()
-        
-        if url and not url.startswith('#') and len(url) > 10:
-            deal['url'] = urljoin(response.url, url)
-            # Extract recid from URL parameters if present
-            parsed_url = urlparse(deal['url'])
-            query_params = parse_qs(parsed_url.query)
-            deal['recid'] = query_params.get('recid', [''])[0]
-        else:
-            deal['url'] = ''
-            deal['recid'] = ''
-        
-        # Extract title using correct DealNews selector
-        title = element.css('.title::text').get()
-        if title and len(title.strip()) > 5:
-            deal['title'] = title.strip()
-        else:
-            # Fallback to title attribute
-            title = element.css('.title::attr(title)').get()
-            if title and len(title.strip()) > 5:
-                deal['title'] = title.strip()
-            else:
-                deal['title'] = ''
-        
-        # Extract price - look for $ signs in text content
-        all_text = element.css('::text').getall()
-        for text in all_text:
-            text = text.strip()
-            if '$' in text and any(char.isdigit() for char in text) and len(text) < 20:
-                deal['price'] = text
-                break
-        else:
-            deal['price'] = ''
-        
-        # Extract promo/coupon code - look for percentage or discount text
-        all_text = element.css('::text').getall()
-        for text in all_text:
-            text = text.strip()
-            if ('%' in text or 'off' in text.lower() or 'save' in text.lower()) and len(text) < 50:
-                deal['promo'] = text
-                break
-        else:
-            deal['promo'] = ''
-        
-        # Extract store from published date text (e.g., "Amazon · 16 hrs ago")
-        all_text = element.css('::text').getall()
-        store = ''
-        for text in all_text:
-            text = text.strip()
-            if '·' in text and ('hrs ago' in text or 'days ago' in text or 'mins ago' in text):
-                # Extract store name before the "·" symbol
-                store = text.split('·')[0].strip()
-                break
-        
-        # Fallback to data-store attribute if no store found in text
-        if not store:
-            store_id = element.css('::attr(data-store)').get()
-            if store_id:
-                # Map store ID to store name
-                store_mapping = {
-                    '313': 'Amazon',
-                    '1': 'Walmart', 
-                    '2': 'Target',
-                    '3': 'Best Buy',
-                    '4': 'eBay',
-                    '5': 'Home Depot',
-                    '6': 'Macy\'s',
-                    '7': 'Nike',
-                    '8': 'adidas',
-                    '9': 'REI',
-                    '10': 'Dick\'s Sporting Goods'
-                }
-                store = store_mapping.get(store_id, f'Store_{store_id}')
-        
-        deal['store'] = store.strip() if store else ''
-        
-        # Extract deal description from snippet or use title as fallback
-        deal_text = element.css('.snippet::text').get()
-        if deal_text and len(deal_text.strip()) > 10:
-            deal['deal'] = deal_text.strip()
-        else:
-            # Fallback to title if no snippet available
-            deal['deal'] = deal.get('title', '')
-        
-        # Extract deal plus (additional info) - use callout text
-        dealplus = element.css('.callout::text').get()
-        deal['dealplus'] = dealplus.strip() if dealplus else ''
-        
-        # Extract deal link - use the main link
-        deallink = element.css('a::attr(href)').get()
-        if deallink and not deallink.startswith('#') and len(deallink) > 10:
-            deal['deallink'] = urljoin(response.url, deallink)
-        else:
-            deal['deallink'] = deal.get('url', '')
-        
-        # Extract deal text (button text) - use CTA button text
-        dealtext = element.css('.btn-cta::text').get()
-        deal['dealtext'] = dealtext.strip() if dealtext else ''
-        
-        # Extract deal hover text - use aria-label
-        dealhover = element.css('a::attr(aria-label)').get()
-        deal['dealhover'] = dealhover.strip() if dealhover else ''
-        
-        # Extract published date - look for time patterns in text
-        all_text = element.css('::text').getall()
-        for text in all_text:
-            text = text.strip()
-            if 'hrs ago' in text or 'days ago' in text or 'mins ago' in text:
-                deal['published'] = text
-                break
-        else:
-            deal['published'] = ''
-        
-        # Extract popularity - look for "Popularity: X/5" pattern
-        for text in all_text:
-            text = text.strip()
-            if 'Popularity:' in text:
-                deal['popularity'] = text
-                break
-        else:
-            deal['popularity'] = ''
-        
-        # Extract staff pick flag - check for staff pick badge
-        staffpick = element.css('.badges .icon[href="#ic-staff-pick"]').get()
-        deal['staffpick'] = 'Yes' if staffpick else 'No'
-        
-        # Extract detail/description - use snippet as detail
-        detail = element.css('.snippet::text').get()
-        deal['detail'] = detail.strip() if detail else ''
-        
-        # Extract images
-        img_url = element.css('img::attr(src)').get()
-        if img_url and not img_url.startswith('data:') and len(img_url) > 10:
-            deal['images'] = [urljoin(response.url, img_url)]
-        else:
-            deal['images'] = []
-        
-        # Extract categories from chips
-        categories = []
-        chip_links = element.css('.chip::attr(href)').getall()
-        chip_titles = element.css('.chip::attr(title)').getall()
-        for i, link in enumerate(chip_links):
-            if link and i < len(chip_titles):
-                categories.append({
-                    'name': chip_titles[i].strip() if i < len(chip_titles) else '',
-                    'url': urljoin(response.url, link),
-                    'title': chip_titles[i].strip() if i < len(chip_titles) else ''
-                })
-        deal['categories'] = categories
-        
-        # Extract related deals - not available in current structure
-        deal['related_deals'] = []
-        
-        # Set defaults for missing fields
-        deal.setdefault('dealid', '')
-        deal.setdefault('recid', '')
-        deal.setdefault('url', '')
-        deal.setdefault('title', '')
-        deal.setdefault('price', '')
-        deal.setdefault('promo', '')
-        # Extract category from breadcrumb - get the last breadcrumb item (actual category)
-        breadcrumb_links = element.css('.breadcrumb a::text').getall()
-        category = ''
-        if breadcrumb_links:
-            # Get the last breadcrumb item which is usually the category
-            category = breadcrumb_links[-1].strip()
-        
-        # Fallback to data-category attribute if no category found in breadcrumb
-        if not category:
-            category_id = element.css('::attr(data-category)').get()
-            if category_id:
-                # Map category ID to category name
-                category_mapping = {
-                    '196': 'Home & Garden',
-                    '280': 'Clothing & Accessories',
-                    '202': 'Clothing & Accessories', 
-                    '1': 'Electronics',
-                    '2': 'Clothing',
-                    '3': 'Computers',
-                    '4': 'Health & Beauty',
-                    '5': 'Sports & Outdoors'
-                }
-                category = category_mapping.get(category_id, f'Category_{category_id}')
-        
-        deal.setdefault('category', category.strip() if category else 'general')
-        deal.setdefault('store', '')
-        deal.setdefault('deal', '')
-        deal.setdefault('dealplus', '')
-        deal.setdefault('deallink', '')
-        deal.setdefault('dealtext', '')
-        deal.setdefault('dealhover', '')
-        deal.setdefault('published', '')
-        deal.setdefault('popularity', '')
-        deal.setdefault('staffpick', '')
-        deal.setdefault('detail', '')
-        
-        return deal
+    def extract_deal_from_element(self, element, response, page_data=None):
+        """Extract one deal dict from a `.content-card` using the compiled extractor"""
+        return self.card_extractor.extract(element, response.url, page_data)
+
+    def record_field_sources(self, deal):
+        """Count which extraction tier supplied each field (extract/source/<field>/<tier>)"""
+        sources = deal.get('field_sources', {})
+        for field, tier in sources.items():
+            self.inc_stat(f'extract/source/{field}/{tier or "missing"}')
+        if sources and all(tier in ('jsonld', 'data_attr') for tier in sources.values()):
+            self.inc_stat('extract/text_pass_skipped')
 
     def extract_category_from_url(self, url):
         """Extract category from URL - updated for current DealNews structure"""
@@ -355,7 +239,31 @@ class DealnewsSpider(scrapy.Spider):
         else:
             return 'general'
 
-    def create_item(self, deal, raw_html):
+    def page_hash(self, response):
+        """Content address of a page body (SHA-1 hex)"""
+        return hashlib.sha1(response.body).hexdigest()
+
+    # Fields whose change makes a stored deal stale. Relative ages ("3 hrs ago")
+    # and the card HTML that contains them change on every crawl, so they are left out.
+    CONTENT_HASH_FIELDS = (
+        'title', 'price', 'promo', 'category', 'store', 'deal', 'dealplus',
+        'deallink', 'dealtext', 'dealhover', 'popularity', 'staffpick', 'detail',
+    )
+
+    def content_hash(self, deal):
+        """SHA-1 hex of the whitespace-normalized content fields of a deal"""
+        normalized = '\x1f'.join(' '.join(str(deal.get(field) or '').split()) for field in self.CONTENT_HASH_FIELDS)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def create_page_item(self, response, page_hash):
+        """Create a DealPageItem holding the full page body"""
+        page_item = DealPageItem()
+        page_item['page_hash'] = page_hash
+        page_item['url'] = response.url
+        page_item['body'] = response.text
+        return page_item
+
+    def create_item(self, deal, page_hash=''):
         """Create a DealnewsItem from extracted deal data"""
         item = DealnewsItem()
         
@@ -367,17 +275,22 @@ class DealnewsSpider(scrapy.Spider):
         item['price'] = deal.get('price', '')
         item['promo'] = deal.get('promo', '')
         item['category'] = deal.get('category', 'general')
+        item['category_ref'] = deal.get('category_ref', '')
         item['store'] = deal.get('store', '')
+        item['store_ref'] = deal.get('store_ref', '')
         item['deal'] = deal.get('deal', '')
         item['dealplus'] = deal.get('dealplus', '')
         item['deallink'] = deal.get('deallink', '')
         item['dealtext'] = deal.get('dealtext', '')
         item['dealhover'] = deal.get('dealhover', '')
         item['published'] = deal.get('published', '')
+        item['published_at'] = format_timestamp(deal.get('published_at'))
         item['popularity'] = deal.get('popularity', '')
         item['staffpick'] = deal.get('staffpick', '')
         item['detail'] = deal.get('detail', '')
-        item['raw_html'] = raw_html[:10000] if raw_html else ''  # Limit HTML size
+        item['raw_html'] = deal.get('raw_html', '')  # Card outerHTML only
+        item['page_hash'] = page_hash
+        item['content_hash'] = self.content_hash(deal)
         
         return item
 
@@ -387,14 +300,21 @@ class DealnewsSpider(scrapy.Spider):
         
         # Extract deal data from the related deal page
         deals = self.extract_deals(response)
+        page_hash = self.page_hash(response)
+        page_stored = False
         
         for deal in deals:
             # Only process if this is a new deal (not already in database)
-            if self.is_new_deal(deal.get('url', '')):
+            if self.is_new_deal(deal.get('url', ''), deal.get('dealid', '')):
                 self.logger.info(f"New related deal found: {deal.get('url', '')}")
                 
+                if not page_stored:
+                    yield self.create_page_item(response, page_hash)
+                    page_stored = True
+                
                 # Create main deal item
-                yield self.create_item(deal, response.text)
+                yield self.create_item(deal, page_hash)
+                self.remember_deal(deal)
                 
                 # Create image items if images found
                 if deal.get('images'):
@@ -416,44 +336,11 @@ class DealnewsSpider(scrapy.Spider):
             else:
                 self.logger.info(f"Related deal already exists: {deal.get('url', '')}")
 
-    def is_new_deal(self, deal_url):
-        """Check if deal URL already exists in database"""
+    def is_new_deal(self, deal_url, dealid=''):
+        """Check the preloaded known-deal index for a deal URL (and dealid)"""
         if not deal_url:
             return False
-            
-        try:
-            import mysql.connector
-            import os
-            from dotenv import load_dotenv
-            
-            # Load environment variables
-            load_dotenv()
-            
-            # Database connection parameters
-            config = {
-                'host': os.getenv('MYSQL_HOST', 'localhost'),
-                'port': int(os.getenv('MYSQL_PORT', 3306)),
-                'user': os.getenv('MYSQL_USER', 'root'),
-                'password': os.getenv('MYSQL_PASSWORD', 'root'),
-                'database': os.getenv('MYSQL_DATABASE', 'dealnews'),
-                'autocommit': True
-            }
-            
-            # Connect to database
-            connection = mysql.connector.connect(**config)
-            cursor = connection.cursor()
-            
-            # Check if URL exists
-            cursor.execute("SELECT COUNT(*) FROM deals WHERE url = %s", (deal_url,))
-            count = cursor.fetchone()[0]
-            
-            cursor.close()
-            connection.close()
-            
-            # Return True if new (count == 0), False if exists (count > 0)
-            return count == 0
-            
-        except Exception as e:
-            self.logger.warning(f"Database check failed for {deal_url}: {e}")
-            # If database check fails, assume it's new to be safe
-            return True
+        if self.known_deals.contains_url(deal_url) or self.known_deals.contains_dealid(dealid):
+            self.inc_stat('known_deals/hits')
+            return False
+        return True
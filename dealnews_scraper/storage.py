@@ -0,0 +1,631 @@
+"""
+Storage backends behind StoragePipeline.
+
+Chosen with STORAGE_BACKEND:
+    mysql     MySQL server (default): pooled connections, versioned migrations
+    sqlite    Embedded SQLite file (SQLITE_PATH, default exports/dealnews.sqlite),
+              for single-node and test runs without a server
+
+Both hold the same logical schema: deals upserted on their URL behind a
+content-hash guard, pages stored once per hash, child rows unique per deal,
+store/category dimension keys and the price history. The pipeline buffers
+rows per table (see batching.py) and hands each batch to the backend, which
+classifies the deals, resolves dimension keys and writes the batch, the
+history points included, in one transaction.
+
+A backend provides:
+    name                   stats prefix ('mysql' / 'sqlite')
+    Error                  exception raised when the store is unreachable
+    connect()              open the store; Error disables the pipeline
+    prepare()              bring the schema up to date, warm caches
+    table_buffers()        TableBuffers for WriteBehind, parents before children
+    write_batch(writes, batch) -> (affected rows per table, seconds, deal counts);
+                           leaves `batch` holding the rows written (unchanged
+                           deals dropped); may run in a writer thread
+    stats()                {stats key: value} published when the spider closes
+    close()
+    count_deals()          number of stored deals      (for the spider's known-deal
+    iter_deals(batch_size) every stored (url, dealid)   index; no connect() needed)
+
+The maintenance CLIs (backfill, compaction, history, migrations, bulk) work on
+the MySQL database only.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from decimal import Decimal
+from urllib.request import pathname2url
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from dealnews_scraper import history, migrations
+from dealnews_scraper.batching import TableBuffer
+from dealnews_scraper.db import get_manager
+from dealnews_scraper.dimensions import DIMENSION_TABLES, DimensionResolver
+
+# Column order of the rows queued for the deals table
+DEAL_COLUMNS = (
+    'dealid', 'recid', 'url', 'title', 'price', 'price_cents', 'original_price_cents',
+    'discount_pct', 'currency', 'promo', 'category', 'category_id', 'store', 'store_id',
+    'deal', 'dealplus', 'deallink', 'dealtext', 'dealhover', 'published', 'published_at',
+    'popularity', 'staffpick', 'detail', 'raw_html', 'page_hash', 'content_hash',
+)
+
+# Column order of the rows queued per table
+TABLE_COLUMNS = {
+    'deals': DEAL_COLUMNS,
+    'pages': ('page_hash', 'url', 'body_zlib', 'body_size'),
+    'deal_images': ('dealid', 'imageurl'),
+    'deal_categories': ('dealid', 'category_id', 'category_name', 'category_url', 'category_title'),
+    'related_deals': ('dealid', 'relatedurl'),
+}
+
+# Deal columns an upsert leaves alone: the key, and the first publish time
+UPSERT_KEPT = ('url', 'published', 'published_at', 'content_hash')
+
+# Upsert: an existing row is rewritten only when its content hash differs. The first
+# published/published_at are kept; content_hash is assigned last so the IF()s above
+# it still compare against the stored value. Columns are qualified so the clause
+# also works for INSERT ... SELECT from a staging table (see bulk.py).
+DEAL_UPSERT = " ON DUPLICATE KEY UPDATE " + ", ".join(
+    [f"deals.{column} = IF(deals.content_hash <=> VALUES(content_hash), deals.{column}, VALUES({column}))"
+     for column in DEAL_COLUMNS if column not in UPSERT_KEPT]
+    + ["deals.content_hash = VALUES(content_hash)"]
+)
+
+# Surrogate key slots filled at flush time: {table: ((row index, dimension table), ...)}
+KEY_SLOTS = {
+    'deals': ((DEAL_COLUMNS.index('category_id'), 'categories'), (DEAL_COLUMNS.index('store_id'), 'stores')),
+    'deal_categories': ((1, 'categories'),),
+}
+
+TRACKED_COLUMNS = tuple(DEAL_COLUMNS.index(column) for column in ('price', 'promo', 'popularity'))
+
+# Transaction conflicts with another writer: the whole batch is retried after a backoff
+LOCK_ERRNOS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+def new_deal_counts():
+    return {'new': 0, 'changed': 0, 'unchanged': 0, 'price_points': 0}
+
+
+def classify_deals(batch, stored, counts):
+    """Count new/changed/unchanged deals and drop unchanged ones from the batch.
+
+    `stored` maps casefolded URL -> (content_hash, id, price, promo, popularity)
+    of the batch's deals already in the store. Returns [(deal id or None if
+    new, row)] for deals whose price, promo or popularity differs from the
+    stored row. The upserts still compare hashes themselves, so a row changed
+    by another writer in between is never overwritten with stale content.
+    """
+    hash_index = DEAL_COLUMNS.index('content_hash')
+    rows = batch['deals']
+    latest = latest_deals(rows)
+    counts['unchanged'] += len(rows) - len(latest)
+    fresh = []
+    observations = []
+    for key, row in latest.items():
+        tracked = history.tracked_values(*(row[index] for index in TRACKED_COLUMNS))
+        if key not in stored:
+            counts['new'] += 1
+            observations.append((None, row))
+        elif row[hash_index] and stored[key][0] == row[hash_index]:
+            counts['unchanged'] += 1
+            continue
+        else:
+            counts['changed'] += 1
+            if history.tracked_values(*stored[key][2:]) != tracked:
+                observations.append((stored[key][1], row))
+        fresh.append(row)
+    if fresh:
+        batch['deals'] = fresh
+    else:
+        del batch['deals']
+    return observations
+
+
+def latest_deals(rows):
+    """Last row per URL, matched like the (case-insensitive) URL key"""
+    url_index = DEAL_COLUMNS.index('url')
+    latest = {}
+    for row in rows:
+        latest[row[url_index].casefold()] = row
+    return latest
+
+
+def history_points(observations, ids):
+    """deal_price_history rows for the observations; `ids` maps casefolded URL -> id of new deals"""
+    url_index = DEAL_COLUMNS.index('url')
+    observed_at = history.now()
+    points = []
+    for deal_id, row in observations:
+        deal_id = deal_id or ids.get(row[url_index].casefold())
+        if deal_id is not None:
+            points.append(history.history_row(deal_id, observed_at, *(row[index] for index in TRACKED_COLUMNS)))
+    return points
+
+
+def resolve_keys(resolvers, cursor, batch):
+    """Replace (name, source_id) placeholders with dimension keys, one lookup per batch"""
+    for table, slots in KEY_SLOTS.items():
+        rows = batch.get(table)
+        if not rows:
+            continue
+        for index, dimension in slots:
+            pending = [row[index] for row in rows if isinstance(row[index], tuple)]
+            if not pending:
+                continue
+            keys = resolvers[dimension].resolve_many(cursor, pending)
+            rows = [
+                row[:index] + (keys.get((row[index][0] or '').strip()[:100]),) + row[index + 1:]
+                if isinstance(row[index], tuple) else row
+                for row in rows
+            ]
+        batch[table] = rows
+
+
+def dimension_resolvers(resolver_class=DimensionResolver):
+    cache_size = int(os.getenv('DIMENSION_CACHE_SIZE', '10000'))
+    return {table: resolver_class(table, maxsize=cache_size) for table in DIMENSION_TABLES}
+
+
+def dimension_stats(resolvers):
+    stats = {}
+    for resolver in resolvers.values():
+        for key, value in resolver.stats().items():
+            stats[f'dimensions/{resolver.table}/{key}'] = value
+        logging.info(f"Dimension cache {resolver.table}: {resolver.stats()}")
+    return stats
+
+
+class MySQLStorage:
+    """MySQL server through the process-wide connection pool (see db.py)"""
+
+    name = 'mysql'
+    Error = mysql.connector.Error
+
+    def __init__(self):
+        self.db = get_manager()
+        self.conn = None
+        self.resolvers = dimension_resolvers()
+        # Writer threads share the resolvers
+        self.dimension_lock = threading.Lock()
+        self.lock_retries = int(os.getenv('MYSQL_LOCK_RETRIES', '3'))
+        self.lock_backoff = float(os.getenv('MYSQL_LOCK_BACKOFF', '0.5'))
+        self.lock_retried = 0
+        self.retry_lock = threading.Lock()
+
+    def describe(self):
+        settings = self.db.settings
+        return f"MySQL {settings['host']}:{settings['port']} as {settings['user']} to database {settings['database']}"
+
+    def connect(self):
+        self.conn = self.db.acquire()
+
+    def prepare(self):
+        # Schema changes are versioned migrations, applied once per database
+        applied = migrations.migrate(self.conn)
+        if applied:
+            logging.info(f"Applied schema migrations: {', '.join(map(str, applied))}")
+        cursor = self.conn.cursor()
+        for resolver in self.resolvers.values():
+            resolver.preload(cursor)
+        cursor.close()
+        self.conn.commit()
+        # Schema work is done; writes check connections out per batch
+        self.conn.close()
+        self.conn = None
+
+    def table_buffers(self):
+        # Deals are upserted on the UNIQUE url_hash key (see DEAL_UPSERT); IGNORE keeps
+        # one bad row from failing the whole batch. Child rows already stored for a
+        # deal are skipped on their (dealid, URL hash) keys (see compaction.py).
+        return [
+            TableBuffer('deals', DEAL_COLUMNS, verb='INSERT IGNORE', suffix=DEAL_UPSERT),
+        ] + [
+            TableBuffer(table, TABLE_COLUMNS[table], verb='INSERT IGNORE')
+            for table in ('pages', 'deal_images', 'deal_categories', 'related_deals')
+        ]
+
+    def write_batch(self, writes, batch):
+        def attempt(conn):
+            # Classification drops rows and counts deals, so each attempt
+            # starts from the original rows with fresh counters
+            rows = dict(batch)
+            return rows, self._write_with(conn, writes, rows, new_deal_counts())
+
+        for retry in range(self.lock_retries + 1):
+            try:
+                # The pool reconnects and retries once if the server went away
+                written, result = self.db.run(attempt)
+                break
+            except mysql.connector.Error as err:
+                # Deadlocks and lock wait timeouts roll the batch back; anything else fails it
+                if err.errno not in LOCK_ERRNOS or retry == self.lock_retries:
+                    raise
+                delay = self.lock_backoff * 2 ** retry * random.uniform(0.5, 1.5)
+                logging.warning(f"MySQL lock conflict writing a batch ({err}), retrying in {delay:.2f}s")
+                with self.retry_lock:
+                    self.lock_retried += 1
+                time.sleep(delay)
+        batch.clear()
+        batch.update(written)
+        return result
+
+    def _write_with(self, conn, writes, batch, deal_counts):
+        cursor = conn.cursor()
+        observations = []
+        try:
+            if batch.get('deals'):
+                # One indexed lookup per batch
+                urls = [row[DEAL_COLUMNS.index('url')] for row in latest_deals(batch['deals']).values()]
+                cursor.execute(
+                    f"SELECT url, content_hash, id, price, promo, popularity FROM deals "
+                    f"WHERE url_hash IN ({', '.join([migrations.URL_HASH] * len(urls))})",
+                    urls
+                )
+                stored = {row[0].casefold(): row[1:] for row in cursor.fetchall()}
+                observations = classify_deals(batch, stored, deal_counts)
+            with self.dimension_lock:
+                resolve_keys(self.resolvers, cursor, batch)
+        finally:
+            cursor.close()
+
+        def record_history(cursor):
+            deal_counts['price_points'] = history.record_points(cursor, history_points(
+                observations, self._new_deal_ids(cursor, observations)))
+
+        affected, seconds = writes.write(conn, batch, after=record_history if observations else None)
+        return affected, seconds, deal_counts
+
+    def _new_deal_ids(self, cursor, observations):
+        """Surrogate ids of the deals inserted by this batch"""
+        new_urls = [row[DEAL_COLUMNS.index('url')] for deal_id, row in observations if deal_id is None]
+        if not new_urls:
+            return {}
+        cursor.execute(
+            f"SELECT url, id FROM deals WHERE url_hash IN ({', '.join([migrations.URL_HASH] * len(new_urls))})",
+            new_urls
+        )
+        return {url.casefold(): deal_id for url, deal_id in cursor.fetchall()}
+
+    def stats(self):
+        pool = self.db.stats()
+        logging.info(f"MySQL pool: {pool}")
+        stats = {f'mysql/pool/{key}': value for key, value in pool.items()}
+        stats['mysql/batch/lock_retries'] = self.lock_retried
+        stats.update(dimension_stats(self.resolvers))
+        return stats
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def count_deals(self):
+        def count(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM deals")
+            total = cursor.fetchone()[0]
+            cursor.close()
+            return total
+
+        return self.db.run(count)
+
+    def iter_deals(self, batch_size=10000):
+        conn = self.db.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT url, dealid FROM deals")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+            cursor.close()
+        finally:
+            conn.close()
+
+
+class SQLiteDimensionResolver(DimensionResolver):
+    """DimensionResolver for the SQLite schema (qmark parameters, ON CONFLICT upserts)"""
+
+    def preload(self, cursor):
+        cursor.execute(f"SELECT name, id FROM {self.table} ORDER BY id DESC LIMIT ?", (self.maxsize,))
+        for name, key in reversed(cursor.fetchall()):
+            self._remember(name, key)
+
+    def _store(self, cursor, rows):
+        cursor.execute(
+            f"INSERT INTO {self.table} (name, source_id) VALUES {', '.join(['(?, ?)'] * len(rows))} "
+            f"ON CONFLICT (name) DO UPDATE SET source_id = COALESCE(source_id, excluded.source_id)",
+            [value for row in rows for value in row]
+        )
+        cursor.execute(
+            f"SELECT name, id FROM {self.table} WHERE name IN ({', '.join(['?'] * len(rows))})",
+            [name for name, _ in rows]
+        )
+        return {name.casefold(): key for name, key in cursor.fetchall()}
+
+
+# Bumped (with PRAGMA user_version) whenever SQLITE_SCHEMA changes
+SQLITE_SCHEMA_VERSION = 1
+
+# Same tables and columns as the MySQL migrations. URLs and names compare
+# case-insensitively like the MySQL collation; TEXT keys need no hash columns.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    id INTEGER PRIMARY KEY,
+    dealid TEXT,
+    recid TEXT,
+    url TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    title TEXT,
+    price TEXT,
+    price_cents INTEGER,
+    original_price_cents INTEGER,
+    discount_pct NUMERIC,
+    currency TEXT,
+    promo TEXT,
+    category TEXT,
+    category_id INTEGER,
+    store TEXT,
+    store_id INTEGER,
+    deal TEXT,
+    dealplus TEXT,
+    deallink TEXT,
+    dealtext TEXT,
+    dealhover TEXT,
+    published TEXT,
+    published_at TEXT,
+    popularity TEXT,
+    staffpick TEXT,
+    detail TEXT,
+    raw_html TEXT,
+    page_hash TEXT,
+    content_hash TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_deals_dealid ON deals (dealid);
+CREATE INDEX IF NOT EXISTS idx_deals_category ON deals (category);
+CREATE INDEX IF NOT EXISTS idx_deals_store ON deals (store);
+CREATE INDEX IF NOT EXISTS idx_deals_created_at ON deals (created_at);
+CREATE INDEX IF NOT EXISTS idx_deals_page_hash ON deals (page_hash);
+CREATE INDEX IF NOT EXISTS idx_deals_category_id_price ON deals (category_id, price_cents);
+CREATE INDEX IF NOT EXISTS idx_deals_store_id_discount ON deals (store_id, discount_pct);
+CREATE INDEX IF NOT EXISTS idx_deals_published_at ON deals (published_at);
+
+CREATE TABLE IF NOT EXISTS pages (
+    page_hash TEXT PRIMARY KEY,
+    url TEXT,
+    body_zlib BLOB,
+    body_size INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS deal_images (
+    id INTEGER PRIMARY KEY,
+    dealid TEXT,
+    imageurl TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (dealid, imageurl)
+);
+CREATE TABLE IF NOT EXISTS deal_categories (
+    id INTEGER PRIMARY KEY,
+    dealid TEXT,
+    category_id INTEGER,
+    category_name TEXT,
+    category_url TEXT,
+    category_title TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (dealid, category_url)
+);
+CREATE INDEX IF NOT EXISTS idx_deal_categories_category_id ON deal_categories (category_id);
+CREATE TABLE IF NOT EXISTS related_deals (
+    id INTEGER PRIMARY KEY,
+    dealid TEXT,
+    relatedurl TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (dealid, relatedurl)
+);
+
+CREATE TABLE IF NOT EXISTS stores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    source_id TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_stores_source_id ON stores (source_id);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    source_id TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_categories_source_id ON categories (source_id);
+
+CREATE TABLE IF NOT EXISTS deal_price_history (
+    deal_id INTEGER NOT NULL,
+    observed_at TEXT NOT NULL,
+    price_cents INTEGER,
+    original_price_cents INTEGER,
+    discount_pct NUMERIC,
+    popularity INTEGER,
+    promo_crc INTEGER,
+    PRIMARY KEY (deal_id, observed_at)
+) WITHOUT ROWID;
+"""
+
+
+def sqlite_value(value):
+    """Bind Decimals and datetimes the way the MySQL driver stores them"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return value
+
+
+class SQLiteStorage:
+    """Embedded SQLite file in WAL mode; batches are written one transaction at a time"""
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SQLITE_PATH', 'exports/dealnews.sqlite')
+        self.db = None
+        self.resolvers = dimension_resolvers(SQLiteDimensionResolver)
+        # One connection, shared by the writer threads one batch at a time
+        self.lock = threading.Lock()
+        self.transactions = 0
+
+    def describe(self):
+        return f"SQLite {self.path}"
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; each batch is one explicit BEGIN IMMEDIATE ... COMMIT
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints rather than every commit (safe with WAL)
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+    def prepare(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version < SQLITE_SCHEMA_VERSION:
+            logging.info(f"Creating SQLite schema version {SQLITE_SCHEMA_VERSION} in {self.path}")
+            self.db.executescript(SQLITE_SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+        cursor = self.db.cursor()
+        for resolver in self.resolvers.values():
+            resolver.preload(cursor)
+        cursor.close()
+
+    def table_buffers(self):
+        upsert = (
+            " ON CONFLICT (url) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in DEAL_COLUMNS if column not in UPSERT_KEPT)
+            + ", content_hash = excluded.content_hash, updated_at = CURRENT_TIMESTAMP"
+            + " WHERE deals.content_hash IS NOT excluded.content_hash"
+        )
+        return [
+            TableBuffer('deals', DEAL_COLUMNS, suffix=upsert, placeholder='?'),
+        ] + [
+            TableBuffer(table, TABLE_COLUMNS[table], verb='INSERT OR IGNORE', placeholder='?')
+            for table in ('pages', 'deal_images', 'deal_categories', 'related_deals')
+        ]
+
+    def write_batch(self, writes, batch):
+        deal_counts = new_deal_counts()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                observations = []
+                if batch.get('deals'):
+                    urls = [row[DEAL_COLUMNS.index('url')] for row in latest_deals(batch['deals']).values()]
+                    stored = {row[0].casefold(): row[1:] for row in self.db.execute(
+                        f"SELECT url, content_hash, id, price, promo, popularity FROM deals "
+                        f"WHERE url IN ({', '.join(['?'] * len(urls))})",
+                        urls
+                    )}
+                    observations = classify_deals(batch, stored, deal_counts)
+                cursor = self.db.cursor()
+                resolve_keys(self.resolvers, cursor, batch)
+                cursor.close()
+                for table, rows in batch.items():
+                    batch[table] = [tuple(sqlite_value(value) for value in row) for row in rows]
+            except Exception:
+                self.db.rollback()
+                raise
+
+            def record_history(cursor):
+                points = history_points(observations, self._new_deal_ids(cursor, observations))
+                if points:
+                    cursor.executemany(
+                        f"INSERT OR IGNORE INTO deal_price_history ({', '.join(history.HISTORY_COLUMNS)}) "
+                        f"VALUES ({', '.join(['?'] * len(history.HISTORY_COLUMNS))})",
+                        [tuple(sqlite_value(value) for value in point) for point in points]
+                    )
+                    deal_counts['price_points'] = cursor.rowcount
+
+            # WriteBehind.write finds the transaction open and commits it
+            affected, seconds = writes.write(self.db, batch, after=record_history if observations else None)
+            self.transactions += 1
+        return affected, seconds, deal_counts
+
+    def _new_deal_ids(self, cursor, observations):
+        new_urls = [row[DEAL_COLUMNS.index('url')] for deal_id, row in observations if deal_id is None]
+        if not new_urls:
+            return {}
+        cursor.execute(f"SELECT url, id FROM deals WHERE url IN ({', '.join(['?'] * len(new_urls))})", new_urls)
+        return {url.casefold(): deal_id for url, deal_id in cursor.fetchall()}
+
+    def stats(self):
+        stats = {'sqlite/transactions': self.transactions}
+        # Main file plus the not yet checkpointed WAL
+        size = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path))
+        stats['sqlite/file_mb'] = round(size / 1024 / 1024, 2)
+        stats.update(dimension_stats(self.resolvers))
+        return stats
+
+    def close(self):
+        if self.db is not None:
+            # Fold the WAL back into the main file so it can be copied on its own
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.db.close()
+            self.db = None
+
+    def _reader(self):
+        """Read-only connection of its own; a missing file raises instead of being created"""
+        uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=30)
+
+    def count_deals(self):
+        db = self._reader()
+        try:
+            return db.execute("SELECT COUNT(*) FROM deals").fetchone()[0]
+        finally:
+            db.close()
+
+    def iter_deals(self, batch_size=10000):
+        db = self._reader()
+        try:
+            cursor = db.execute("SELECT url, dealid FROM deals")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db.close()
+
+
+BACKENDS = {
+    'mysql': MySQLStorage,
+    'sqlite': SQLiteStorage,
+}
+
+
+def storage_backend(name=None):
+    """The backend named by STORAGE_BACKEND (default mysql)"""
+    name = (name or os.getenv('STORAGE_BACKEND', 'mysql')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def require_mysql():
+    """Stop a MySQL-only command when the run is configured for another backend"""
+    name = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+    if name != 'mysql':
+        sys.exit(f"❌ This command works on the MySQL database only (STORAGE_BACKEND={name}); "
+                 f"unset STORAGE_BACKEND to run it against MySQL")
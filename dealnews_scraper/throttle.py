@@ -0,0 +1,148 @@
+"""
+Per-proxy adaptive throttling.
+
+ProxyThrottleMiddleware puts every proxy endpoint in its own downloader slot
+(request.meta['download_slot']) and runs an AIMD controller per slot: while a
+proxy answers quickly and cleanly its delay shrinks and its concurrency grows;
+a 429, a ban-like status or a network error halves concurrency and doubles
+the delay. Total throughput therefore scales with the size of PROXY_LIST
+instead of one global DOWNLOAD_DELAY.
+"""
+from urllib.parse import urlparse
+
+from scrapy.exceptions import NotConfigured
+
+# Statuses that mean "slow down" rather than "page missing"
+BACKOFF_STATUSES = {403, 408, 429, 500, 502, 503, 504}
+
+
+def slot_key(request):
+    """Downloader slot for a request: its proxy host:port, or 'direct'"""
+    proxy = request.meta.get('proxy')
+    if not proxy:
+        return 'direct'
+    parsed = urlparse(proxy)
+    return f'proxy:{parsed.hostname}:{parsed.port or 80}'
+
+
+class ProxyHealth:
+    """EWMA latency, 429 rate and error rate plus the slot's current limits"""
+
+    def __init__(self, delay, concurrency, alpha):
+        self.delay = delay
+        self.concurrency = concurrency
+        self.alpha = alpha
+        self.latency = None
+        self.rate_429 = 0.0
+        self.error_rate = 0.0
+        self.successes = 0
+
+    def observe(self, latency=None, throttled=False, error=False):
+        a = self.alpha
+        if latency is not None:
+            self.latency = latency if self.latency is None else a * latency + (1 - a) * self.latency
+        self.rate_429 = a * throttled + (1 - a) * self.rate_429
+        self.error_rate = a * error + (1 - a) * self.error_rate
+
+
+class ProxyThrottleMiddleware:
+    """Downloader middleware giving each proxy its own adaptive slot"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PROXY_THROTTLE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.start_delay = settings.getfloat('PROXY_THROTTLE_START_DELAY', settings.getfloat('DOWNLOAD_DELAY'))
+        self.min_delay = settings.getfloat('PROXY_THROTTLE_MIN_DELAY', 0.5)
+        self.max_delay = settings.getfloat('PROXY_THROTTLE_MAX_DELAY', 30.0)
+        self.start_concurrency = settings.getint('PROXY_THROTTLE_START_CONCURRENCY', 1)
+        self.max_concurrency = settings.getint('PROXY_THROTTLE_MAX_CONCURRENCY', 4)
+        self.target_latency = settings.getfloat('PROXY_THROTTLE_TARGET_LATENCY', 5.0)
+        self.alpha = settings.getfloat('PROXY_THROTTLE_EWMA_ALPHA', 0.2)
+        self.health = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _health(self, key):
+        if key not in self.health:
+            self.health[key] = ProxyHealth(self.start_delay, self.start_concurrency, self.alpha)
+        return self.health[key]
+
+    def process_request(self, request, spider):
+        # Runs after ProxyMiddleware has chosen the proxy
+        key = slot_key(request)
+        request.meta['download_slot'] = key
+        request.meta['throttle_slot'] = key
+        self._apply(key, self._health(key))
+        return None
+
+    def process_response(self, request, response, spider):
+        key = request.meta.get('throttle_slot')
+        if key is None:
+            return response
+        health = self._health(key)
+        latency = request.meta.get('download_latency')
+        if response.status in BACKOFF_STATUSES:
+            health.observe(latency, throttled=response.status == 429, error=response.status != 429)
+            self._back_off(health, response)
+        else:
+            health.observe(latency)
+            self._speed_up(health)
+        self._apply(key, health)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        key = request.meta.get('throttle_slot')
+        if key is not None:
+            health = self._health(key)
+            health.observe(error=True)
+            self._back_off(health)
+            self._apply(key, health)
+        return None
+
+    def _back_off(self, health, response=None):
+        """Multiplicative decrease: halve concurrency, double (or Retry-After) the delay"""
+        health.successes = 0
+        health.concurrency = max(1, health.concurrency // 2)
+        delay = health.delay * 2
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.strip().isdigit():
+            delay = max(delay, float(retry_after.strip()))
+        health.delay = min(self.max_delay, max(self.min_delay, delay))
+
+    def _speed_up(self, health):
+        """Additive increase once a full window of clean, fast responses came back"""
+        health.successes += 1
+        if health.successes < health.concurrency * 4:
+            return
+        health.successes = 0
+        if health.latency is not None and health.latency > self.target_latency:
+            # Healthy but slow: ease the delay up instead of adding load
+            health.delay = min(self.max_delay, health.delay * 1.25)
+            return
+        if health.rate_429 < 0.05 and health.error_rate < 0.1:
+            health.delay = max(self.min_delay, health.delay * 0.8)
+            health.concurrency = min(self.max_concurrency, health.concurrency + 1)
+
+    def _apply(self, key, health):
+        """Push the controller's limits onto the Scrapy downloader slot"""
+        engine = getattr(self.crawler, 'engine', None)
+        if engine is not None:
+            downloader = engine.downloader
+            # Seeds slots created (or re-created after idle GC) from now on
+            downloader.per_slot_settings[key] = {'concurrency': health.concurrency, 'delay': health.delay}
+            slot = downloader.slots.get(key)
+            if slot is not None:
+                slot.delay = health.delay
+                slot.concurrency = health.concurrency
+        stats = self.crawler.stats
+        prefix = f'proxy_throttle/{key}'
+        stats.set_value(f'{prefix}/delay', round(health.delay, 3))
+        stats.set_value(f'{prefix}/concurrency', health.concurrency)
+        stats.set_value(f'{prefix}/rate_429', round(health.rate_429, 4))
+        stats.set_value(f'{prefix}/error_rate', round(health.error_rate, 4))
+        if health.latency is not None:
+            stats.set_value(f'{prefix}/latency_ms', int(health.latency * 1000))
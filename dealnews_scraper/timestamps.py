@@ -0,0 +1,72 @@
+"""
+Resolve DealNews "published" strings to absolute UTC timestamps.
+
+Cards show relative ages such as "16 hrs ago" or "Amazon · 3 days ago".
+These are resolved against the response's Date header (the server's clock
+when the page was rendered), falling back to the local fetch time, and
+stored as naive UTC datetimes.
+
+Precision: DealNews truncates ages to whole units, so a resolved time is
+at most one unit later than the real one (up to 1 minute for "mins ago",
+1 hour for "hrs ago", 1 day for "days ago"). Absolute values (ISO 8601
+from JSON-LD or data attributes) are kept to the second.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+_RELATIVE = re.compile(
+    r'(\d+|an?|one)\s*(sec|second|min|minute|hr|hour|day|wk|week|mo|month)s?\.?\s+ago',
+    re.IGNORECASE
+)
+_UNITS = {
+    'sec': timedelta(seconds=1), 'second': timedelta(seconds=1),
+    'min': timedelta(minutes=1), 'minute': timedelta(minutes=1),
+    'hr': timedelta(hours=1), 'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'wk': timedelta(weeks=1), 'week': timedelta(weeks=1),
+    'mo': timedelta(days=30), 'month': timedelta(days=30),
+}
+
+
+def _to_utc(value):
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def response_time(response):
+    """When the page was rendered: the Date header, else now (naive UTC)"""
+    date = response.headers.get('Date')
+    if date:
+        try:
+            return _to_utc(parsedate_to_datetime(date.decode('latin-1')))
+        except (TypeError, ValueError):
+            pass
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def resolve_published(text, reference):
+    """Absolute UTC datetime for a published string, or None if it cannot be read"""
+    if not text:
+        return None
+    text = text.strip()
+    match = _RELATIVE.search(text)
+    if match:
+        count = match.group(1).lower()
+        count = 1 if count in ('a', 'an', 'one') else int(count)
+        return (reference - count * _UNITS[match.group(2).lower()]).replace(microsecond=0)
+    lowered = text.lower()
+    if 'just now' in lowered:
+        return reference.replace(microsecond=0)
+    if 'yesterday' in lowered:
+        return (reference - timedelta(days=1)).replace(microsecond=0)
+    try:
+        return _to_utc(datetime.fromisoformat(text.replace('Z', '+00:00'))).replace(microsecond=0)
+    except ValueError:
+        return None
+
+
+def format_timestamp(value):
+    """MySQL DATETIME literal ('' for None), as stored in items and feeds"""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
@@ -11,7 +11,11 @@ This script runs the DealNews scraper with all client requirements:
 """
 import sys
 import os
+import json
+import time
 import logging
+import argparse
+import multiprocessing
 from dotenv import load_dotenv
 
 # Add the project directory to the Python path
@@ -37,6 +41,7 @@ except Exception as e:
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 from dealnews_scraper.spiders.dealnews_spider import DealnewsSpider
+from dealnews_scraper.sharding import SHARD_MODES
 
 def validate_environment():
     """Validate environment variables and dependencies"""
@@ -119,23 +124,13 @@ def test_mysql_connection():
     
     try:
         import mysql.connector
+        from dealnews_scraper.db import get_manager
         
-        mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-        mysql_port = int(os.getenv('MYSQL_PORT', '3306'))
-        mysql_user = os.getenv('MYSQL_USER', 'root')
-        mysql_password = os.getenv('MYSQL_PASSWORD', 'root')
-        mysql_database = os.getenv('MYSQL_DATABASE', 'dealnews')
+        db = get_manager()
+        print(f"🔗 Connecting to {db.settings['host']}:{db.settings['port']} as {db.settings['user']} ({db.driver} driver)...")
         
-        print(f"🔗 Connecting to {mysql_host}:{mysql_port} as {mysql_user}...")
-        
-        conn = mysql.connector.connect(
-            host=mysql_host,
-            port=mysql_port,
-            user=mysql_user,
-            password=mysql_password,
-            database=mysql_database,
-            connection_timeout=10
-        )
+        # Checked out of the shared pool the pipeline uses later in this process
+        conn = db.acquire()
         
         # Test basic query
         cursor = conn.cursor()
@@ -157,7 +152,24 @@ def test_mysql_connection():
         print(f"❌ Unexpected error testing MySQL: {e}")
         return False
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="DealNews Scraper")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes; >1 runs a sharded crawl")
+    parser.add_argument('--shard-by', choices=SHARD_MODES, default='start_url',
+                        help="Partition start URLs round-robin, or split the discovered frontier "
+                             "by stable URL hash or by listing section")
+    parser.add_argument('--max-restarts', type=int, default=2,
+                        help="Times a dead worker's shard is reassigned before giving up")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Spool items to TSV and LOAD DATA them into MySQL when the crawl ends")
+    parser.add_argument('--storage', choices=('mysql', 'sqlite'),
+                        help="Storage backend (default: STORAGE_BACKEND or mysql); sqlite needs no server")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("🚀 DealNews Scraper - Starting Environment Check")
     print("=" * 50)
     
@@ -171,9 +183,19 @@ def main():
         print("\n❌ Dependency check failed. Exiting.")
         sys.exit(1)
     
+    if args.storage:
+        # Read by build_settings and the pipeline here and in worker processes
+        os.environ['STORAGE_BACKEND'] = args.storage
+    use_sqlite = os.getenv('STORAGE_BACKEND', 'mysql').lower() == 'sqlite'
+    if use_sqlite and args.bulk:
+        print("\n❌ --bulk loads into MySQL and cannot be combined with the sqlite backend. Exiting.")
+        sys.exit(1)
+    
     # Step 3: Test MySQL connection
     mysql_enabled = os.getenv('DISABLE_MYSQL', '').lower() not in ('1', 'true', 'yes')
-    if mysql_enabled:
+    if use_sqlite:
+        print(f"💾 SQLite storage: {os.getenv('SQLITE_PATH', 'exports/dealnews.sqlite')} (no MySQL needed)")
+    elif mysql_enabled:
         if not test_mysql_connection():
             print("\n❌ MySQL connection test failed. Exiting.")
             print("💡 Tip: Set DISABLE_MYSQL=true in .env to run without database")
@@ -182,16 +204,65 @@ def main():
     print("\n✅ All checks passed! Starting scraper...")
     print("=" * 50)
     
-    # Set up minimal logging (only to file, not console)
+    if args.bulk:
+        # Read by build_settings here and in worker processes
+        os.environ['BULK_LOAD'] = 'true'
+        print("📦 Bulk load mode: items are loaded into MySQL when the crawl finishes")
+    
+    if args.workers > 1:
+        run_sharded(args.workers, args.shard_by, args.max_restarts)
+        return
+    
+    logger = configure_logging("dealnews_scraper.log")
+    settings = build_settings(logger)
+    
+    # Create and run crawler
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(DealnewsSpider)
+    process.crawl(crawler)
+    
+    print("🚀 DealNews Scraper Starting...")
+    print("📊 Extracting deals from DealNews.com...")
+    if os.getenv('STORAGE_BACKEND', 'mysql').lower() == 'sqlite':
+        print("💾 Saving data to SQLite database...")
+    else:
+        print("💾 Saving data to MySQL database...")
+    print("📁 Exporting data to JSON file...")
+    
+    process.start()
+    
+    if report_dead_letters([crawler.stats.get_stats()]):
+        sys.exit(1)
+    print("✅ DealNews Scraper Completed Successfully!")
+    print("📈 Data extracted and saved to database")
+    print("📄 Check exports/deals.json for scraped data")
+    print("🗄️  Access database via Adminer at http://localhost:8080")
+
+def report_dead_letters(stats_list):
+    """Print where batches the database rejected were kept (one stats dict per crawl); True if any were"""
+    rows = sum(value for stats in stats_list for key, value in stats.items() if key.endswith('/batch/dead_letter_rows'))
+    if not rows:
+        return False
+    directories = sorted({value for stats in stats_list for key, value in stats.items()
+                          if key.endswith('/batch/dead_letter_dir')})
+    print(f"❌ {rows} rows could not be written to the database and were kept in: {', '.join(directories)}")
+    if any(key == 'mysql/batch/dead_letter_rows' for stats in stats_list for key in stats):
+        print("💡 Replay them with: python -m dealnews_scraper.bulk load <directory>")
+    return True
+
+def configure_logging(log_file):
+    """Set up minimal logging (only to file, not console)"""
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s [%(name)s] %(levelname)s: %(message)s',
         handlers=[
-            logging.FileHandler("dealnews_scraper.log"),
+            logging.FileHandler(log_file),
         ]
     )
-    logger = logging.getLogger(__name__)
-    
+    return logging.getLogger(__name__)
+
+def build_settings(logger):
+    """Project settings with proxy, MySQL and feed configuration applied"""
     # Get project settings
     settings = get_project_settings()
     
@@ -209,38 +280,38 @@ def main():
         logger.info("Proxy disabled for local testing")
         os.environ['DISABLE_PROXY'] = 'true'
     
-    # Configure MySQL
+    # Configure storage: an embedded SQLite file needs no connection checks
     mysql_enabled = os.getenv('DISABLE_MYSQL', '').lower() not in ('1', 'true', 'yes')
-    if not mysql_enabled:
+    if os.getenv('STORAGE_BACKEND', 'mysql').lower() == 'sqlite':
+        settings.set('ITEM_PIPELINES', {
+            'dealnews_scraper.pipelines.StoragePipeline': 300,
+        })
+        logger.info(f"Using SQLite storage: {os.getenv('SQLITE_PATH', 'exports/dealnews.sqlite')}")
+    elif not mysql_enabled:
         settings.set('ITEM_PIPELINES', {})
         logger.info("MySQL pipeline disabled")
     else:
-        # Make sure MySQL pipeline is enabled
-        settings.set('ITEM_PIPELINES', {
-            'dealnews_scraper.pipelines.MySQLPipeline': 300,
-        })
-        logger.info("Using MySQL pipeline")
+        # Make sure MySQL pipeline is enabled (bulk loading for replays/imports)
+        if os.getenv('BULK_LOAD', 'false').lower() in ('1', 'true', 'yes'):
+            settings.set('ITEM_PIPELINES', {
+                'dealnews_scraper.bulk.BulkLoadPipeline': 300,
+            })
+            logger.info("Using bulk load pipeline")
+        else:
+            settings.set('ITEM_PIPELINES', {
+                'dealnews_scraper.pipelines.StoragePipeline': 300,
+            })
+            logger.info("Using MySQL pipeline")
         
         # Verify MySQL settings
-        mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-        mysql_port = os.getenv('MYSQL_PORT', '3307')
-        mysql_user = os.getenv('MYSQL_USER', 'root')
-        mysql_password = os.getenv('MYSQL_PASSWORD', 'root')
-        mysql_database = os.getenv('MYSQL_DATABASE', 'dealnews')
-        logger.info(f"MySQL settings: {mysql_host}:{mysql_port}, user: {mysql_user}, db: {mysql_database}")
+        from dealnews_scraper.db import get_manager, mysql_settings
+        mysql_config = mysql_settings()
+        logger.info(f"MySQL settings: {mysql_config['host']}:{mysql_config['port']}, "
+                    f"user: {mysql_config['user']}, db: {mysql_config['database']}")
         
-        # Check if MySQL is running
+        # Check if MySQL is running (a pooled connection, handed back right away)
         try:
-            import mysql.connector
-            conn = mysql.connector.connect(
-                host=mysql_host,
-                port=int(mysql_port),
-                user=mysql_user,
-                password=mysql_password,
-                database=mysql_database,
-                connection_timeout=5
-            )
-            conn.close()
+            get_manager().acquire().close()
             logger.info("MySQL connection test successful")
         except Exception as e:
             logger.error(f"MySQL connection test failed: {e}")
@@ -251,12 +322,9 @@ def main():
             settings.set('FEED_URI', 'exports/deals.json')
             mysql_enabled = False
         
-        # Ensure MySQL environment variables are set
-        os.environ['MYSQL_HOST'] = mysql_host
-        os.environ['MYSQL_PORT'] = mysql_port
-        os.environ['MYSQL_USER'] = mysql_user
-        os.environ['MYSQL_PASSWORD'] = mysql_password
-        os.environ['MYSQL_DATABASE'] = mysql_database
+        # Ensure MySQL environment variables are set (worker processes inherit them)
+        for key, value in mysql_config.items():
+            os.environ[f'MYSQL_{key.upper()}'] = str(value)
     
     # Set up JSON feed exporter (always export to JSON for debugging)
     os.makedirs('exports', exist_ok=True)
@@ -265,28 +333,198 @@ def main():
             'format': 'json',
             'encoding': 'utf8',
             'indent': 2,
+            'item_classes': settings.getlist('FEED_ITEM_CLASSES'),
         },
     })
     
+    # Shared frontier for several scraper nodes (redis://... or a SQLite file path)
+    shared_queue_url = os.getenv('SHARED_QUEUE_URL')
+    if shared_queue_url:
+        settings.set('SCHEDULER', 'dealnews_scraper.distributed.SharedScheduler')
+        settings.set('SHARED_QUEUE_URL', shared_queue_url)
+        if os.getenv('SHARED_CRAWL_ID'):
+            settings.set('SHARED_CRAWL_ID', os.getenv('SHARED_CRAWL_ID'))
+        logger.info(f"Using shared crawl queue: {shared_queue_url}")
+    
     # Suppress Scrapy console output
     settings.set('LOG_LEVEL', 'ERROR')
     settings.set('LOG_ENABLED', False)
     
-    # Create and run crawler
+    return settings
+
+SHARDS_DIR = os.path.join('exports', 'shards')
+
+def shard_start_urls(urls, shard_count, shard_by):
+    """Start URLs of each shard: partitioned round-robin with start_url (empty shards are
+    dropped), otherwise all of them for every shard, whose dupefilter splits the frontier"""
+    if shard_by != 'start_url':
+        return [list(urls) for _ in range(shard_count)]
+    shards = [[] for _ in range(shard_count)]
+    for position, url in enumerate(urls):
+        shards[position % shard_count].append(url)
+    return [shard for shard in shards if shard]
+
+def run_worker(shard_id, attempt, start_urls, shard_count=1, shard_by='start_url'):
+    """Crawl one shard in its own process, reactor and pipeline"""
+    logger = configure_logging(f"dealnews_scraper.shard{shard_id}.log")
+    settings = build_settings(logger)
+    # Read by FrontierShard in the dupefilter and the spider
+    settings.set('SHARD_ID', shard_id)
+    settings.set('SHARD_COUNT', shard_count)
+    settings.set('SHARD_BY', shard_by)
+    feed_path = os.path.join(SHARDS_DIR, f"deals.{shard_id}.{attempt}.json")
+    settings.set('FEEDS', {
+        feed_path: {
+            'format': 'json',
+            'encoding': 'utf8',
+            'item_classes': settings.getlist('FEED_ITEM_CLASSES'),
+        },
+    })
+    
     process = CrawlerProcess(settings)
-    process.crawl(DealnewsSpider)
+    crawler = process.create_crawler(DealnewsSpider)
+    process.crawl(crawler, start_urls=start_urls)
+    process.start()
     
-    print("🚀 DealNews Scraper Starting...")
-    print("📊 Extracting deals from DealNews.com...")
-    print("💾 Saving data to MySQL database...")
-    print("📁 Exporting data to JSON file...")
+    stats_path = os.path.join(SHARDS_DIR, f"stats.{shard_id}.{attempt}.json")
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump(crawler.stats.get_stats(), f, default=str)
+
+# Numeric stats that are not counters: peaks, durations (the shards run in
+# parallel) and per-shard gauges and limits keep the highest shard's value
+MAX_STAT_SUFFIXES = ('_max', '/max', '/startup', '_seconds', '/delay', '/concurrency', '/rate_429',
+                     '/error_rate', '/latency_ms', '/score', '/in_use', '/pool_size', '/cached', '/file_mb')
+MAX_STATS = {'known_deals/loaded', 'proxy_pool/open_circuits', 'retry/budget_used', 'retry/budget_limit'}
+
+def recompute_stats(merged):
+    """Averages, ratios and rates from the merged counters (summing or maxing them is meaningless)"""
+    for key in list(merged):
+        if not key.endswith('/batch/flushes') or not merged[key]:
+            continue
+        prefix = key[:-len('/flushes')]
+        rows = merged.get(f'{prefix}/rows', 0)
+        total_ms = merged.get(f'{prefix}/flush_ms_total', 0)
+        merged[f'{prefix}/size_avg'] = round(rows / merged[key], 1)
+        merged[f'{prefix}/flush_ms_avg'] = round(total_ms / merged[key], 3)
+        if total_ms:
+            merged[f'{prefix}/rows_per_sec'] = round(rows / (total_ms / 1000), 1)
+    if merged.get('mysql/pool/queries'):
+        merged['mysql/pool/query_ms_avg'] = round(
+            merged.get('mysql/pool/query_ms_total', 0) / merged['mysql/pool/queries'], 3)
+    if merged.get('dupefilter/checked'):
+        hits = merged.get('dupefilter/run_hits', 0) + merged.get('dupefilter/persistent_hits', 0)
+        merged['dupefilter/hit_ratio'] = round(hits / merged['dupefilter/checked'], 4)
+    bulk_seconds = merged.get('bulk/load_seconds', 0) + merged.get('bulk/merge_seconds', 0)
+    if merged.get('bulk/rows') and bulk_seconds:
+        merged['bulk/rows_per_sec'] = round(merged['bulk/rows'] / bulk_seconds, 1)
+    minutes = merged.get('elapsed_time_seconds', 0) / 60
+    if minutes:
+        merged['responses_per_minute'] = round(merged.get('response_received_count', 0) / minutes, 2)
+        merged['items_per_minute'] = round(merged.get('item_scraped_count', 0) / minutes, 2)
+
+def merge_stats(stats_list):
+    """Combine per-shard stats: counters are summed, peaks/durations/gauges take the maximum,
+    averages and rates are recomputed; other values keep the first shard's"""
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key in MAX_STATS or key.endswith(MAX_STAT_SUFFIXES):
+                    merged[key] = max(merged.get(key, value), value)
+                else:
+                    merged[key] = merged.get(key, 0) + value
+            elif key == 'start_time' and value:
+                # ISO timestamps (json.dump default=str) compare chronologically
+                merged[key] = min(merged.get(key) or value, value)
+            elif key == 'finish_time' and value:
+                merged[key] = max(merged.get(key) or value, value)
+            else:
+                merged.setdefault(key, value)
+    recompute_stats(merged)
+    merged['shards'] = len(stats_list)
+    return merged
+
+def merge_exports(feed_paths, output_path):
+    """Concatenate per-shard JSON feeds into one export"""
+    items = []
+    for path in feed_paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            try:
+                items.extend(json.load(f))
+            except ValueError:
+                print(f"⚠️  Skipping unreadable shard export {path}")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(items, f, indent=2, ensure_ascii=False)
+    return len(items)
+
+def run_sharded(workers, shard_by, max_restarts):
+    """Run one worker process per shard, reassign dead shards, then merge results"""
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    start_urls = DealnewsSpider.start_urls
+    shards = shard_start_urls(start_urls, workers, shard_by)
+    if len(shards) < workers:
+        print(f"⚠️  Only {len(start_urls)} start URLs to partition; use --shard-by hash or section "
+              f"to give all {workers} workers a share of the frontier")
+    print(f"🧩 Sharded crawl: {len(shards)} shard(s) by {shard_by} across up to {workers} workers")
     
-    process.start()
+    # spawn gives every worker a fresh interpreter and its own reactor
+    context = multiprocessing.get_context('spawn')
+    pending = [(shard_id, 0, urls) for shard_id, urls in enumerate(shards)]
+    running = {}
+    completed = {}
+    failed = []
     
+    while pending or running:
+        while pending and len(running) < workers:
+            shard_id, attempt, urls = pending.pop(0)
+            process = context.Process(target=run_worker, args=(shard_id, attempt, urls, len(shards), shard_by),
+                                      name=f"dealnews-shard{shard_id}")
+            process.start()
+            running[shard_id] = (process, attempt, urls)
+            print(f"🚀 Shard {shard_id} (attempt {attempt + 1}) started: {', '.join(urls)}")
+        
+        for shard_id, (process, attempt, urls) in list(running.items()):
+            process.join(timeout=1)
+            if process.is_alive():
+                continue
+            del running[shard_id]
+            if process.exitcode == 0:
+                completed[shard_id] = attempt
+                print(f"✅ Shard {shard_id} finished")
+            elif attempt < max_restarts:
+                print(f"⚠️  Shard {shard_id} worker died (exit code {process.exitcode}); reassigning")
+                pending.append((shard_id, attempt + 1, urls))
+            else:
+                print(f"❌ Shard {shard_id} failed after {attempt + 1} attempts")
+                failed.append(shard_id)
+        time.sleep(0.5)
+    
+    # Only the successful attempt of each shard is merged
+    feed_paths = [os.path.join(SHARDS_DIR, f"deals.{shard_id}.{attempt}.json") for shard_id, attempt in sorted(completed.items())]
+    item_count = merge_exports(feed_paths, os.path.join('exports', 'deals.json'))
+    
+    stats_list = []
+    for shard_id, attempt in sorted(completed.items()):
+        stats_path = os.path.join(SHARDS_DIR, f"stats.{shard_id}.{attempt}.json")
+        if os.path.exists(stats_path):
+            with open(stats_path, encoding='utf-8') as f:
+                stats_list.append(json.load(f))
+    merged = merge_stats(stats_list)
+    merged['failed_shards'] = failed
+    with open(os.path.join('exports', 'crawl_stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(merged, f, indent=2, default=str)
+    
+    print(f"📦 Merged {item_count} items from {len(completed)} shard(s) into exports/deals.json")
+    print(f"📊 Merged stats written to exports/crawl_stats.json "
+          f"({merged.get('downloader/request_count', 0)} requests, {merged.get('item_scraped_count', 0)} items)")
+    lost_rows = report_dead_letters(stats_list)
+    if failed:
+        print(f"❌ Shards failed: {failed}")
+    if failed or lost_rows:
+        sys.exit(1)
     print("✅ DealNews Scraper Completed Successfully!")
-    print("📈 Data extracted and saved to database")
-    print("📄 Check exports/deals.json for scraped data")
-    print("🗄️  Access database via Adminer at http://localhost:8080")
 
 if __name__ == "__main__":
     main()
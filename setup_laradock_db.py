@@ -1,27 +1,25 @@
 #!/usr/bin/env python3
 """
-Setup script to create the DealNews database and table in Laradock MySQL
+Setup script to create the DealNews database and tables in Laradock MySQL
 Run this once before running the scraper
 """
 
 import mysql.connector
-import os
 from dotenv import load_dotenv
 
+from dealnews_scraper.db import mysql_settings
+from dealnews_scraper.migrations import migrate
+
 def setup_database():
-    """Create database and table in Laradock MySQL"""
+    """Create the database in Laradock MySQL and bring its schema up to date"""
     
     # Load environment variables
     load_dotenv()
     
-    # Database connection parameters
-    config = {
-        'host': os.getenv('MYSQL_HOST', 'localhost'),
-        'port': int(os.getenv('MYSQL_PORT', 3306)),
-        'user': os.getenv('MYSQL_USER', 'root'),
-        'password': os.getenv('MYSQL_PASSWORD', 'root'),
-        'autocommit': True
-    }
+    # Database connection parameters (the database itself may not exist yet)
+    config = mysql_settings()
+    database_name = config.pop('database')
+    config['autocommit'] = True
     
     try:
         print("🔗 Connecting to Laradock MySQL...")
@@ -31,48 +29,21 @@ def setup_database():
         print("✅ Connected to Laradock MySQL successfully!")
         
         # Create database
-        database_name = os.getenv('MYSQL_DATABASE', 'dealnews')
         print(f"📊 Creating database '{database_name}'...")
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name}")
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name} "
+                       f"DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
         print(f"✅ Database '{database_name}' created/verified!")
         
         # Use the database
         cursor.execute(f"USE {database_name}")
         
-        # Create table
-        print("📋 Creating deals table...")
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS deals (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            dealid VARCHAR(50) UNIQUE,
-            recid VARCHAR(50),
-            url TEXT,
-            title TEXT,
-            price VARCHAR(100),
-            promo TEXT,
-            category VARCHAR(100),
-            store VARCHAR(100),
-            deal TEXT,
-            dealplus TEXT,
-            deallink TEXT,
-            dealtext TEXT,
-            dealhover TEXT,
-            published VARCHAR(100),
-            popularity VARCHAR(50),
-            staffpick VARCHAR(10),
-            detail TEXT,
-            raw_html LONGTEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            INDEX idx_dealid (dealid),
-            INDEX idx_store (store),
-            INDEX idx_category (category),
-            INDEX idx_created_at (created_at)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-        """
-        
-        cursor.execute(create_table_sql)
-        print("✅ Deals table created/verified!")
+        # Tables come from the same versioned migrations the pipeline runs
+        print("📋 Applying schema migrations...")
+        applied = migrate(connection)
+        if applied:
+            print(f"✅ Applied migrations {', '.join(str(number) for number in applied)}")
+        else:
+            print("✅ Schema is up to date")
         
         # Check if table exists and show structure
         cursor.execute("SHOW TABLES")
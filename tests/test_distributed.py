@@ -0,0 +1,77 @@
+"""
+Shared-queue crawls must close when a claimed request is dropped before it
+reaches the downloader. The crawl runs in a subprocess (one reactor per process).
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CRAWL = textwrap.dedent('''
+    import json
+    import sys
+
+    import scrapy
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.exceptions import IgnoreRequest
+
+
+    class DropEverythingMiddleware:
+        """Like ConditionalGetMiddleware skipping a still-fresh URL"""
+
+        def process_request(self, request, spider):
+            raise IgnoreRequest("fresh")
+
+
+    class OneUrlSpider(scrapy.Spider):
+        name = 'one_url'
+
+        def start_requests(self):
+            yield scrapy.Request('http://127.0.0.1:9/', dont_filter=True, meta={'start_request': True})
+
+        async def start(self):  # Scrapy >= 2.13 no longer calls start_requests by default
+            for request in self.start_requests():
+                yield request
+
+
+    queue_path, dupefilter_path = sys.argv[1:3]
+    process = CrawlerProcess({
+        'SCHEDULER': 'dealnews_scraper.distributed.SharedScheduler',
+        'SHARED_QUEUE_URL': queue_path,
+        'SHARED_CRAWL_ID': 'test',
+        # Without the ack the lease comes back every second and the crawl never closes
+        'SHARED_QUEUE_VISIBILITY_TIMEOUT': 1,
+        'DUPEFILTER_STORE': dupefilter_path,
+        'DOWNLOADER_MIDDLEWARES': {
+            'dealnews_scraper.distributed.SharedQueueAckMiddleware': 50,
+            '__main__.DropEverythingMiddleware': 400,
+        },
+        'LOG_ENABLED': False,
+    })
+    crawler = process.create_crawler(OneUrlSpider)
+    process.crawl(crawler)
+    process.start()
+    print(json.dumps({key: value for key, value in crawler.stats.get_stats().items()
+                      if isinstance(value, (int, str))}))
+''')
+
+
+def test_dropped_leased_request_is_acked_and_spider_closes(tmp_path):
+    queue_path = str(tmp_path / 'queue.sqlite')
+    result = subprocess.run(
+        [sys.executable, '-c', CRAWL, queue_path, str(tmp_path / 'fingerprints.sqlite')],
+        cwd=PROJECT_DIR, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    assert stats['finish_reason'] == 'finished'
+    assert stats['scheduler/dequeued/shared'] == 1
+    assert stats['shared_queue/acked'] == 1
+
+    db = sqlite3.connect(queue_path)
+    assert db.execute("SELECT COUNT(*) FROM queue").fetchone()[0] == 0
+    db.close()
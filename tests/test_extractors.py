@@ -0,0 +1,73 @@
+"""
+Tiered card extraction: JSON-LD first, then data-* attributes, then the
+card's text walk, with deal['field_sources'] naming the tier of each field.
+"""
+import os
+
+from scrapy.http import HtmlResponse
+
+from dealnews_scraper.extractors import DATA_ATTRIBUTE_FIELDS, CardExtractor
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'structured_cards.html')
+
+
+def fixture_response():
+    with open(FIXTURE, 'rb') as f:
+        return HtmlResponse('https://www.dealnews.com/', body=f.read(), encoding='utf-8')
+
+
+def extract_all(page_data=True):
+    extractor = CardExtractor()
+    response = fixture_response()
+    data = extractor.page_data(response) if page_data else None
+    return {deal['dealid']: deal for deal in
+            (extractor.extract(card, response.url, data) for card in extractor.select_cards(response))}
+
+
+def test_page_data_indexes_jsonld_by_url_and_id():
+    index = CardExtractor().page_data(fixture_response())
+    expected = {'price': '$79.99', 'store': 'Home Depot', 'published': '2026-10-15T08:00:00Z'}
+    assert index['url:https://www.dealnews.com/deal/1001/acme-20v-cordless-drill-kit'] == expected
+    assert index['id:1001'] == expected
+
+
+def test_card_attributes_collects_descendant_data_attributes():
+    extractor = CardExtractor()
+    card = extractor.select_cards(fixture_response())[1]
+    attributes = extractor.card_attributes(card)
+    assert attributes['data-content-id'] == '1002'
+    assert attributes['data-price'] == '$24.99'
+    assert attributes['data-published'] == '2026-10-14T12:00:00Z'
+    assert 'data-price' in DATA_ATTRIBUTE_FIELDS['price']
+    assert 'data-published' in DATA_ATTRIBUTE_FIELDS['published']
+
+
+def test_jsonld_wins_and_text_walk_fills_the_rest():
+    deal = extract_all()['1001']
+    # JSON-LD beats the card's own data-price and data-store
+    assert (deal['price'], deal['store'], deal['published']) == ('$79.99', 'Home Depot', '2026-10-15T08:00:00Z')
+    assert (deal['promo'], deal['popularity']) == ('40% off', 'Popularity: 4/5')
+    assert deal['field_sources'] == {
+        'price': 'jsonld', 'promo': 'text', 'store': 'jsonld', 'published': 'jsonld', 'popularity': 'text',
+    }
+
+
+def test_data_attributes_before_text():
+    deal = extract_all()['1002']
+    # data-price beats the "$29.99" text node; the store comes from the byline
+    assert (deal['price'], deal['published']) == ('$24.99', '2026-10-14T12:00:00Z')
+    assert (deal['promo'], deal['store'], deal['popularity']) == ('Save $5', 'Amazon', '')
+    assert deal['field_sources'] == {
+        'price': 'data_attr', 'promo': 'text', 'store': 'text', 'published': 'data_attr', 'popularity': '',
+    }
+
+
+def test_without_page_data_falls_back_to_attributes_and_text():
+    deal = extract_all(page_data=False)['1001']
+    assert deal['price'] == '$99.99'
+    assert deal['published'] == ''
+    # No tier named the store, so the data-store ID map is used
+    assert deal['store'] == 'Home Depot'
+    assert deal['field_sources'] == {
+        'price': 'data_attr', 'promo': 'text', 'store': 'store_id', 'published': '', 'popularity': 'text',
+    }